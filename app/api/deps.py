@@ -1,21 +1,37 @@
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
 
-from app.core.config import settings
 from app.models.user import User, UserRole
 from app.crud import crud_user
+from app.schemas.token import TokenData
+from app.services import security, token_revocation
 
 # Định nghĩa scheme để lấy token từ header, trỏ tới URL đăng nhập của chúng ta
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
 
 
+async def get_request_user(request: Request) -> Optional[User]:
+    """
+    Resolve the user of the request's Bearer token (or None).
+
+    Uses the memoized resolver set by AuthMiddleware, so the token is decoded
+    and the user fetched at most once per request, and only when needed.
+    """
+    auth = getattr(request.state, "auth", None)
+    if auth is None:
+        return None
+    return await auth.resolve()
+
+
 async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> User:
     """
-    Dependency that returns the current user. First tries to read
-    `request.state.user` populated by the AuthMiddleware to avoid duplicate DB
-    lookups. If not present, falls back to decoding the token and fetching
-    the user from the DB (backwards compatible).
+    Dependency that returns the current user. First tries the lazy resolver
+    installed by the AuthMiddleware (memoized per request). If the middleware
+    is not installed, falls back to decoding the token and fetching the user
+    from the DB (backwards compatible).
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,33 +39,74 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    # Prefer middleware-populated user
-    if hasattr(request.state, "user") and request.state.user is not None:
-        return request.state.user
-
-    try:
-        # Giải mã token để lấy payload
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    # Prefer the middleware resolver
+    if getattr(request.state, "auth", None) is not None:
+        user = await get_request_user(request)
+        if user is None:
             raise credentials_exception
-    except JWTError:
+        return user
+
+    claims = _decode_claims(token)
+    if claims is None:
         raise credentials_exception
 
     # Dùng email lấy được để tìm user trong DB
-    user = await crud_user.get_user_by_email(email=email)
-    if user is None:
+    user = await crud_user.get_user_by_email_cached(email=claims.email)
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
 
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def _decode_claims(token: str) -> Optional[TokenData]:
+    try:
+        # Giải mã token để lấy payload
+        claims = security.decode_access_token(token)
+    except JWTError:
+        return None
+    if not claims.email or token_revocation.is_revoked(claims):
+        return None
+    return claims
+
+
+async def get_token_claims(request: Request, token: str = Depends(oauth2_scheme)) -> TokenData:
+    """
+    Dependency returning the verified claims of the access token, without
+    loading the user. Deactivated / demoted / deleted users are rejected
+    through the in-memory revocation set.
+    """
+    auth = getattr(request.state, "auth", None)
+    claims = auth.claims() if auth is not None else _decode_claims(token)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+async def get_current_admin_user(request: Request, claims: TokenData = Depends(get_token_claims)) -> TokenData:
     """
     Dependency để kiểm tra xem người dùng có phải là Admin không.
+
+    Quyền được đọc từ claim `role` của token (không truy vấn DB). Token cũ
+    chưa có claim này thì đọc role từ user như trước.
     """
-    if current_user.role != UserRole.ADMIN:
+    role = claims.role
+    if role is None:
+        user = await get_request_user(request)
+        if user is None:
+            user = await crud_user.get_user_by_email_cached(email=claims.email)
+        if user is None or not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        role = getattr(user.role, "value", user.role)
+    if role != UserRole.ADMIN.value:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return claims
\ No newline at end of file
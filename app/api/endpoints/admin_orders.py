@@ -1,17 +1,46 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Optional
 from beanie import PydanticObjectId
 from app.models.order import Order
-from app.models.product import Product
-from app.models.user import User
 from app.api.deps import get_current_admin_user
+from app.schemas.token import TokenData
+from app.crud import crud_order, crud_product, pagination
 
 router = APIRouter()
 
 
+async def _fill_item_names(order_dicts: List[dict]) -> None:
+    """Fill item names missing from older order snapshots with one batched lookup."""
+    missing = [
+        it.get('product_id')
+        for od in order_dicts for it in (od.get('items') or [])
+        if isinstance(it, dict) and not it.get('name')
+    ]
+    if not missing:
+        return
+    names = await crud_product.resolve_product_names(missing)
+    for od in order_dicts:
+        for it in od.get('items') or []:
+            if isinstance(it, dict) and not it.get('name'):
+                it['name'] = names.get(str(it.get('product_id')))
+
+
 @router.get('/', tags=['Admin Orders'])
-async def list_orders(skip: int = 0, limit: int = 100, admin: User = Depends(get_current_admin_user)):
-    orders = await Order.find_all().skip(skip).limit(limit).to_list()
+async def list_orders(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    admin: TokenData = Depends(get_current_admin_user),
+):
+    """List orders (oldest first).
+
+    The body stays a plain list; the keyset cursor of the next page is sent in
+    the `X-Next-Cursor` header and accepted back as `cursor`.
+    """
+    orders, next_cursor = await pagination.find_page(Order, {}, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     out = []
     for o in orders:
         try:
@@ -23,11 +52,12 @@ async def list_orders(skip: int = 0, limit: int = 100, admin: User = Depends(get
         except Exception:
             od['id'] = None
         out.append(od)
+    await _fill_item_names(out)
     return out
 
 
 @router.get('/{order_id}', tags=['Admin Orders'])
-async def get_order(order_id: str, admin: User = Depends(get_current_admin_user)):
+async def get_order(order_id: str, admin: TokenData = Depends(get_current_admin_user)):
     order = None
     # Try to load by ObjectId first, fall back to direct get by string
     try:
@@ -46,11 +76,12 @@ async def get_order(order_id: str, admin: User = Depends(get_current_admin_user)
         od['id'] = str(order.id)
     except Exception:
         od['id'] = None
+    await _fill_item_names([od])
     return od
 
 
 @router.put('/{order_id}', tags=['Admin Orders'])
-async def update_order_status(order_id: str, payload: dict, admin: User = Depends(get_current_admin_user)):
+async def update_order_status(order_id: str, payload: dict, admin: TokenData = Depends(get_current_admin_user)):
     order = None
     try:
         oid = PydanticObjectId(order_id)
@@ -67,15 +98,16 @@ async def update_order_status(order_id: str, payload: dict, admin: User = Depend
         raise HTTPException(status_code=400, detail='Missing status')
     # Normalize status string
     try:
-        order.status = str(status_val).lower()
+        status_val = str(status_val).lower()
     except Exception:
-        order.status = status_val
-    await order.save()
+        pass
+    # Conditional update: a concurrent cancel / status change cannot apply the rollup delta twice
+    await crud_order.set_order_status(order.id, status_val)
     return { 'ok': True }
 
 
 @router.post('/{order_id}/cancel', tags=['Admin Orders'])
-async def admin_cancel_order(order_id: str, admin: User = Depends(get_current_admin_user)):
+async def admin_cancel_order(order_id: str, admin: TokenData = Depends(get_current_admin_user)):
     order = None
     try:
         oid = PydanticObjectId(order_id)
@@ -90,53 +122,10 @@ async def admin_cancel_order(order_id: str, admin: User = Depends(get_current_ad
     # If already cancelled, return
     if getattr(order, 'status', '').lower() == 'cancelled':
         return { 'ok': True, 'detail': 'Already cancelled' }
-    # Restock items (best-effort)
-    restocked = 0
-    missing_products = []
-    try:
-        for it in getattr(order, 'items', []) or []:
-            pid = None
-            if isinstance(it, dict):
-                pid = it.get('product_id')
-                qty = it.get('quantity', 0)
-            else:
-                pid = getattr(it, 'product_id', None)
-                qty = getattr(it, 'quantity', 0)
-
-            if not pid:
-                continue
-
-            prod = None
-            # Try ObjectId lookup first
-            try:
-                pid_obj = PydanticObjectId(pid)
-                prod = await Product.get(pid_obj)
-            except Exception:
-                prod = None
-
-            # Fallback: try to find a product whose id string matches (best-effort)
-            if not prod:
-                try:
-                    prod = await Product.find_one({'_id': pid})
-                except Exception:
-                    prod = None
-
-            if prod:
-                try:
-                    current = (getattr(prod, 'stock_quantity', 0) or 0)
-                    add = int(qty or 0)
-                    prod.stock_quantity = current + add
-                    await prod.save()
-                    restocked += add
-                except Exception:
-                    # log and continue on save failure
-                    print(f"Failed to restock product {pid}")
-                    continue
-            else:
-                missing_products.append(pid)
-    except Exception as e:
-        print('Error during restock loop:', e)
-
-    order.status = 'cancelled'
-    await order.save()
+    # Restock items and move the order out of the rollup, only if this request
+    # is the one that actually cancels it
+    result = await crud_order.cancel_order(order.id)
+    if result is None:
+        return { 'ok': True, 'detail': 'Already cancelled' }
+    restocked, missing_products = result
     return { 'ok': True, 'restocked': restocked, 'missing_products': missing_products }
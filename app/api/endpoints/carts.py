@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 from app.models.cart import Cart, CartItem
 from app.models.user import User
 from app.api.deps import get_current_user
+from app.crud import crud_product
 
 router = APIRouter()
 
@@ -22,6 +23,13 @@ async def get_my_cart(current_user: User = Depends(get_current_user)):
     c = await Cart.find_one(Cart.user_id == str(current_user.id))
     if not c:
         return Cart(user_id=str(current_user.id), items=[])
+    # Cart items are stored without names; resolve them in one batched lookup
+    missing = [it.product_id for it in c.items if not it.name]
+    if missing:
+        names = await crud_product.resolve_product_names(missing)
+        for it in c.items:
+            if not it.name:
+                it.name = names.get(str(it.product_id))
     return c
 
 
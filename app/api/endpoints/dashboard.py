@@ -1,17 +1,20 @@
 from fastapi import APIRouter, Depends
 from app.schemas.dashboard import DashboardData
-from app.crud import crud_dashboard
+from app.services.dashboard_snapshot import get_dashboard_snapshot
 from app.api.deps import get_current_admin_user
-from app.models.user import User
+from app.schemas.token import TokenData
 
 router = APIRouter()
 
 @router.get("/", response_model=DashboardData)
 async def read_dashboard_data(
     *,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy dữ liệu thống kê cho trang dashboard. (Chỉ dành cho Admin)
+
+    Trả về snapshot gần nhất; snapshot được tính lại ở background khi có
+    thay đổi dữ liệu hoặc quá TTL.
     """
-    return await crud_dashboard.get_dashboard_data()
\ No newline at end of file
+    return await get_dashboard_snapshot()
\ No newline at end of file
@@ -1,18 +1,15 @@
 from fastapi import APIRouter, Request, HTTPException
 from typing import List
 
+from app.core.singleflight import single_flight_stats
+from app.crud import crud_user
+from app.services.security import password_hash_pool
 from app.models.order import Order
 
 router = APIRouter()
 
 
-@router.get("/orders", tags=["Debug"])
-async def debug_list_orders(request: Request):
-    """Return all orders in the database for local debugging only.
-
-    This endpoint is intentionally permissive but restricted to local requests
-    (127.0.0.1 / ::1). Remove it before deploying to production.
-    """
+def _require_local(request: Request) -> None:
     client_host = None
     try:
         client_host = request.client.host
@@ -22,9 +19,40 @@ async def debug_list_orders(request: Request):
     if client_host not in ("127.0.0.1", "::1", "localhost"):
         raise HTTPException(status_code=403, detail="Forbidden")
 
+
+@router.get("/orders", tags=["Debug"])
+async def debug_list_orders(request: Request):
+    """Return all orders in the database for local debugging only.
+
+    This endpoint is intentionally permissive but restricted to local requests
+    (127.0.0.1 / ::1). Remove it before deploying to production.
+    """
+    _require_local(request)
+
     orders = await Order.find_all().to_list()
     try:
         data = [o.dict() for o in orders]
     except Exception:
         data = orders
     return {"count": len(data), "data": data}
+
+
+@router.get("/single-flight", tags=["Debug"])
+async def debug_single_flight(request: Request):
+    """Calls / coalesced calls / in-flight count per single-flight function (local only)."""
+    _require_local(request)
+    return single_flight_stats()
+
+
+@router.get("/user-cache", tags=["Debug"])
+async def debug_user_cache(request: Request):
+    """Hit/miss counters of the auth user cache (local only)."""
+    _require_local(request)
+    return crud_user.user_cache_stats()
+
+
+@router.get("/password-hash-pool", tags=["Debug"])
+async def debug_password_hash_pool(request: Request):
+    """Utilisation of the Argon2 worker pool (local only)."""
+    _require_local(request)
+    return password_hash_pool.stats()
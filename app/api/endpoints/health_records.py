@@ -3,40 +3,52 @@ from beanie import PydanticObjectId
 from typing import List
 
 from app.schemas.health_record import HealthRecordRead, HealthRecordUpdate , HealthRecordCreate
-from app.crud import crud_health_record, crud_pet
+from app.crud import crud_health_record, crud_pet, crud_product
 from app.api.deps import get_current_admin_user
-from app.models.user import User
+from app.schemas.token import TokenData
 from beanie import PydanticObjectId
 from typing import Optional
 
 router = APIRouter()
 
 
-def _convert_used_products(used_products: Optional[list]):
+async def _product_names_for(*records) -> dict:
+    """Resolve names for every product used by the given records in one lookup."""
+    ids = []
+    for record in records:
+        for up in getattr(record, "used_products", None) or []:
+            ids.append(up.get("product_id") if isinstance(up, dict) else getattr(up, "product_id", None))
+    return await crud_product.resolve_product_names(ids)
+
+
+def _convert_used_products(used_products: Optional[list], product_names: Optional[dict] = None):
     """Convert UsedProduct instances or dicts into dicts matching UsedProductSchema.
     Ensure product_id is a PydanticObjectId when possible.
     """
     if not used_products:
         return None
+    product_names = product_names or {}
     out = []
     for up in used_products:
         # up can be app.models.health_record.UsedProduct (pydantic BaseModel) or a dict
         if hasattr(up, "product_id"):
             pid = up.product_id
+            name = product_names.get(str(pid))
             try:
                 pid = PydanticObjectId(str(pid))
             except Exception:
                 # leave as-is if conversion fails
                 pass
-            out.append({"product_id": pid, "quantity": int(up.quantity), "unit_price": float(up.unit_price)})
+            out.append({"product_id": pid, "name": name, "quantity": int(up.quantity), "unit_price": float(up.unit_price)})
         elif isinstance(up, dict):
             # convert product_id to PydanticObjectId if it's present
             pid = up.get("product_id")
+            name = product_names.get(str(pid))
             try:
                 pid = PydanticObjectId(str(pid))
             except Exception:
                 pass
-            out.append({"product_id": pid, "quantity": int(up.get("quantity")), "unit_price": float(up.get("unit_price"))})
+            out.append({"product_id": pid, "name": name, "quantity": int(up.get("quantity")), "unit_price": float(up.get("unit_price"))})
         else:
             out.append(up)
     return out
@@ -60,7 +72,7 @@ async def create_health_record(
     *,
     pet_id: PydanticObjectId,
     record_in: HealthRecordCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Tạo một bản ghi y tế mới cho thú cưng. (Chỉ dành cho Admin)
@@ -73,6 +85,7 @@ async def create_health_record(
         )
     
     new_record = await crud_health_record.create_health_record_for_pet(pet=pet, record_in=record_in)
+    product_names = await _product_names_for(new_record)
     
     # Tạo HealthRecordRead object manually để tránh validation error
     return HealthRecordRead(
@@ -84,7 +97,7 @@ async def create_health_record(
         notes=new_record.notes,
         next_due_date=new_record.next_due_date,
         weight_kg=new_record.weight_kg,
-        used_products=_convert_used_products(new_record.used_products),
+        used_products=_convert_used_products(new_record.used_products, product_names),
         used_services=_convert_used_services(new_record.used_services)
     )
 
@@ -92,12 +105,13 @@ async def create_health_record(
 async def get_health_records_for_pet(
     *,
     pet_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách bản ghi y tế của một thú cưng. (Chỉ dành cho Admin)
     """
     records = await crud_health_record.get_health_records_for_pet(pet_id=pet_id)
+    product_names = await _product_names_for(*records)
     
     response_list = []
     for record in records:
@@ -111,7 +125,7 @@ async def get_health_records_for_pet(
             notes=record.notes,
             next_due_date=record.next_due_date,
             weight_kg=record.weight_kg,
-            used_products=_convert_used_products(record.used_products),
+            used_products=_convert_used_products(record.used_products, product_names),
             used_services=_convert_used_services(record.used_services)
         )
         response_list.append(record_data)
@@ -122,7 +136,7 @@ async def get_health_records_for_pet(
 async def get_health_record_by_id(
     *,
     record_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy chi tiết một bản ghi y tế. (Chỉ dành cho Admin)
@@ -133,6 +147,7 @@ async def get_health_record_by_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Health record with id {record_id} not found",
         )
+    product_names = await _product_names_for(record)
     
     # Tạo HealthRecordRead object manually để tránh validation error
     return HealthRecordRead(
@@ -144,7 +159,7 @@ async def get_health_record_by_id(
         notes=record.notes,
         next_due_date=record.next_due_date,
         weight_kg=record.weight_kg,
-        used_products=_convert_used_products(record.used_products),
+        used_products=_convert_used_products(record.used_products, product_names),
         used_services=_convert_used_services(record.used_services)
     )
 
@@ -153,7 +168,7 @@ async def update_health_record_by_id(
     *,
     record_id: PydanticObjectId,
     record_in: HealthRecordUpdate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Cập nhật một bản ghi y tế. (Chỉ dành cho Admin)
@@ -168,6 +183,7 @@ async def update_health_record_by_id(
     updated_record = await crud_health_record.update_health_record(
         record=existing_record, record_in=record_in
     )
+    product_names = await _product_names_for(updated_record)
 
     # Tạo HealthRecordRead object manually để tránh validation error
     return HealthRecordRead(
@@ -179,7 +195,7 @@ async def update_health_record_by_id(
         notes=updated_record.notes,
         next_due_date=updated_record.next_due_date,
         weight_kg=updated_record.weight_kg,
-        used_products=_convert_used_products(updated_record.used_products),
+        used_products=_convert_used_products(updated_record.used_products, product_names),
         used_services=_convert_used_services(updated_record.used_services)
     )
 
@@ -187,7 +203,7 @@ async def update_health_record_by_id(
 async def delete_health_record_by_id(
     *,
     record_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Xóa một bản ghi y tế. (Chỉ dành cho Admin)
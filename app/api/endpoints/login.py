@@ -3,8 +3,8 @@ from fastapi.security import OAuth2PasswordRequestForm
 from typing import Any
 
 from app.services import security
-from app.crud import crud_user
-from app.schemas.token import Token
+from app.crud import crud_user, crud_refresh_token
+from app.schemas.token import Token, RefreshRequest
 
 router = APIRouter()
 
@@ -19,19 +19,70 @@ async def login_for_access_token(
     user = await crud_user.get_user_by_email(email=form_data.username)
 
     # 2. Nếu user không tồn tại HOẶC mật khẩu sai -> báo lỗi
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    try:
+        # Argon2 runs in the bounded hashing pool, not on the event loop
+        password_ok = bool(user) and await security.verify_password_async(form_data.password, user.hashed_password)
+    except security.PasswordHashBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 3. Nếu xác thực thành công, tạo access token
-    access_token_data = {"sub": user.email}
-    access_token = security.create_access_token(data=access_token_data)
-    
+    if not getattr(user, "is_active", True):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+    # 3. Nếu xác thực thành công, tạo access token + refresh token
     # 4. Trả về token
+    return await _issue_tokens(user)
+
+
+async def _issue_tokens(user, refresh_token: str | None = None) -> dict:
+    # role / active / token version travel in the token (authorization without a DB read)
+    access_token_data = security.user_claims(user)
+    access_token = security.create_access_token(data=access_token_data)
+    if refresh_token is None:
+        refresh_token = await crud_refresh_token.issue(user.email)
     return {
         "access_token": access_token,
         "token_type": "bearer",
-    }
\ No newline at end of file
+        "refresh_token": refresh_token,
+    }
+
+
+@router.post("/login/refresh", response_model=Token)
+async def refresh_access_token(payload: RefreshRequest) -> Any:
+    """
+    Đổi refresh token lấy access token mới (không cần mật khẩu).
+
+    Refresh token chỉ dùng được một lần: response chứa refresh token mới.
+    """
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    rotated = await crud_refresh_token.rotate(payload.refresh_token)
+    if rotated is None:
+        raise invalid
+    email, new_refresh_token = rotated
+    user = await crud_user.get_user_by_email_cached(email=email)
+    if user is None or not getattr(user, "is_active", True):
+        await crud_refresh_token.revoke(new_refresh_token)
+        raise invalid
+    return await _issue_tokens(user, refresh_token=new_refresh_token)
+
+
+@router.post("/login/logout")
+async def logout(payload: RefreshRequest) -> Any:
+    """
+    Thu hồi refresh token (access token hết hạn theo thời gian).
+    """
+    await crud_refresh_token.revoke(payload.refresh_token)
+    return {"ok": True}
\ No newline at end of file
@@ -5,6 +5,10 @@ from beanie import PydanticObjectId
 
 from app.models.product import Product
 from app.models.order import Order, OrderItem, ShippingInfo
+from app.api.deps import get_request_user
+from app.core.timing import timed
+from app.crud import crud_order, crud_revenue_rollup, loaders
+from app.db.database import run_in_transaction
 from fastapi import status
 from pydantic import BaseModel
 from beanie import PydanticObjectId
@@ -23,9 +27,10 @@ class CreateOrderPayload(BaseModel):
 
 
 @router.post("/portal/orders", tags=["Portal Orders"])
+@timed("order.create")
 async def create_order(payload: CreateOrderPayload, request: Request):
-    # Expect authenticated user populated in request.state.user
-    user = getattr(request.state, "user", None)
+    # Authenticated user resolved lazily from the Bearer token
+    user = await get_request_user(request)
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -35,14 +40,20 @@ async def create_order(payload: CreateOrderPayload, request: Request):
     items_snapshot = []
     total = 0.0
 
-    # Validate products and adjust stock
+    product_ids = []
     for it in payload.items:
         try:
-            pid = PydanticObjectId(it.product_id)
+            product_ids.append(PydanticObjectId(it.product_id))
         except Exception:
             raise HTTPException(status_code=400, detail=f"Invalid product id: {it.product_id}")
 
-        product = await Product.get(pid)
+    # All products of the order in one $in query; repeated ids share one instance
+    with timed("order.product_lookup"):
+        products = await loaders.get_many(Product, product_ids)
+
+    # Validate products and adjust stock
+    for it, pid in zip(payload.items, product_ids):
+        product = products.get(str(pid))
         if not product:
             raise HTTPException(status_code=404, detail=f"Product not found: {it.product_id}")
 
@@ -58,7 +69,8 @@ async def create_order(payload: CreateOrderPayload, request: Request):
         # decrement stock for this product and save
         try:
             product.stock_quantity = max(0, product.stock_quantity - it.quantity)
-            await product.save()
+            with timed("order.stock_update"):
+                await product.save()
         except Exception as e:
             # If saving stock fails, log and abort
             print(f"[create_order] failed to save product stock for {product.id}: {e}")
@@ -72,8 +84,13 @@ async def create_order(payload: CreateOrderPayload, request: Request):
         total=total,
     )
 
-    # insert order
-    await order.insert()
+    # insert order and its revenue rollup rows atomically
+    async def _insert(session):
+        await order.insert(session=session)
+        await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.order_deltas(order), session=session)
+
+    with timed("order.insert"):
+        await run_in_transaction(_insert)
     # Log payload for debugging
     try:
         print(f"[create_order] payload_items={len(payload.items)} payload={payload.dict()}")
@@ -96,7 +113,7 @@ async def create_order(payload: CreateOrderPayload, request: Request):
 
 @router.get("/portal/orders", tags=["Portal Orders"])
 async def list_my_orders(request: Request):
-    user = getattr(request.state, "user", None)
+    user = await get_request_user(request)
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -140,7 +157,7 @@ async def cancel_order(order_id: str, request: Request):
     - If order.status == 'pending' -> allow cancellation (restock items and set status 'cancelled').
     - If order.status in ('shipped','confirmed') -> disallow and instruct to contact support.
     """
-    user = getattr(request.state, 'user', None)
+    user = await get_request_user(request)
     if not user:
         raise HTTPException(status_code=401, detail='Unauthorized')
 
@@ -159,25 +176,9 @@ async def cancel_order(order_id: str, request: Request):
         raise HTTPException(status_code=403, detail='Forbidden')
 
     status_val = getattr(order, 'status', '').lower()
-    if status_val == 'pending':
-        # perform restock for each item (best-effort)
-        try:
-            for it in getattr(order, 'items', []) or []:
-                try:
-                    pid = PydanticObjectId(it.get('product_id') if isinstance(it, dict) else it.product_id)
-                    prod = await Product.get(pid)
-                    if prod:
-                        prod.stock_quantity = (getattr(prod, 'stock_quantity', 0) or 0) + (it.get('quantity') if isinstance(it, dict) else it.quantity)
-                        await prod.save()
-                except Exception:
-                    # ignore per-item failures
-                    continue
-        except Exception:
-            pass
-
-        order.status = 'cancelled'
-        await order.save()
+    # Only cancels while still pending (conditional update), so a concurrent
+    # cancel / status change cannot restock or adjust the rollup twice
+    if status_val == 'pending' and await crud_order.cancel_order(order.id, from_status=order.status) is not None:
         return { 'detail': 'Order cancelled' }
-    else:
-        # Disallow cancellation for orders already processed/shipped
-        raise HTTPException(status_code=400, detail='Không thể hủy đơn này. Vui lòng liên hệ CSKH.')
+    # Disallow cancellation for orders already processed/shipped (or cancelled meanwhile)
+    raise HTTPException(status_code=400, detail='Không thể hủy đơn này. Vui lòng liên hệ CSKH.')
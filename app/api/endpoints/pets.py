@@ -10,7 +10,8 @@ from app.crud.crud_pet import (
     delete_pet,
 )
 from app.api.deps import get_current_admin_user
-from app.models.user import User # Cần import User để type hint
+from app.schemas.token import TokenData
+from app.core.search_keys import SEARCH_KEYS_FIELD
 from beanie import PydanticObjectId
 from app.schemas.health_record import HealthRecordCreate, HealthRecordRead
 from app.crud import crud_health_record
@@ -18,7 +19,7 @@ router = APIRouter()
 
 
 @router.post('/cleanup', summary='Cleanup placeholder values in pets (admin only)')
-async def cleanup_pets_placeholders(current_admin: User = Depends(get_current_admin_user)):
+async def cleanup_pets_placeholders(current_admin: TokenData = Depends(get_current_admin_user)):
     """Admin-only utility to replace literal 'string' placeholders in pet documents."""
     from app.crud.crud_pet import cleanup_placeholder_strings
     result = await cleanup_placeholder_strings()
@@ -28,7 +29,7 @@ async def cleanup_pets_placeholders(current_admin: User = Depends(get_current_ad
 async def create_new_pet(
     *,
     pet_in: PetCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Tạo một hồ sơ thú cưng mới. (Chỉ dành cho Admin)
@@ -46,17 +47,21 @@ async def read_all_pets(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None, # <-- Thêm tham số search vào đây
-    current_admin: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = None,
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách tất cả thú cưng với phân trang và tìm kiếm. (Admin only)
+
+    Truyền `next_cursor` của trang trước vào `cursor` để phân trang keyset
+    (không phụ thuộc độ sâu trang); `skip` vẫn dùng được như cũ.
     """
-    pets, total = await crud_pet.get_all_pets_with_count(skip=skip, limit=limit, search=search)
+    pets, total, next_cursor = await crud_pet.get_all_pets_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     
     # Convert to dicts and set string id for frontend compatibility
     data = []
     for pet in pets:
-        pet_dict = pet.dict()
+        pet_dict = pet.dict(exclude={SEARCH_KEYS_FIELD})
         pet_dict["id"] = str(pet.id)
         data.append(pet_dict)
     
@@ -64,7 +69,8 @@ async def read_all_pets(
         "data": data,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 #Hàm lấy pet theo ID
@@ -72,7 +78,7 @@ async def read_all_pets(
 async def read_pet_by_id(
     *,
     pet_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy thông tin chi tiết của một thú cưng bằng ID. (Chỉ dành cho Admin)
@@ -96,7 +102,7 @@ async def update_pet_by_id(
     *,
     pet_id: PydanticObjectId,
     pet_in: PetUpdate, # Dữ liệu cập nhật từ request body
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Cập nhật thông tin một thú cưng. (Chỉ dành cho Admin)
@@ -121,7 +127,7 @@ async def update_pet_by_id(
 async def delete_pet_by_id(
     *,
     pet_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Xóa một hồ sơ thú cưng. (Chỉ dành cho Admin)
@@ -148,7 +154,7 @@ async def create_new_health_record(
     *,
     pet_id: PydanticObjectId,
     record_in: HealthRecordCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     pet = await crud_pet.get_pet_by_id(pet_id=pet_id)
     if not pet:
@@ -168,7 +174,7 @@ async def create_new_health_record(
 async def read_health_records(
     *,
     pet_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     pet = await crud_pet.get_pet_by_id(pet_id=pet_id)
     if not pet:
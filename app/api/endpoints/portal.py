@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List
 from beanie import PydanticObjectId
 
 from app.api.deps import get_current_user
+from app.core.search_keys import SEARCH_KEYS_FIELD
 from app.models.user import User
 from app.schemas.pet import PetCreate, PetRead
 from app.schemas.scheduled_event import ScheduledEventCreate, ScheduledEventRead
@@ -10,7 +11,7 @@ from app.models.pet import Pet
 from app.models.scheduled_event import ScheduledEvent
 
 # CRUD helpers
-from app.crud import crud_pet, crud_scheduled_event, crud_health_record, crud_product, crud_service
+from app.crud import crud_pet, crud_scheduled_event, crud_health_record, crud_product, crud_service, loaders
 from app.schemas.product import ProductRead
 from app.schemas.service import ServiceRead
 from app.schemas.pet import PetUpdate
@@ -109,7 +110,7 @@ async def create_event_for_my_pet(pet_id: PydanticObjectId, event_in: ScheduledE
             pet_ref = getattr(event, 'pet', None)
             pet_id_val = getattr(pet_ref, 'id', None) or getattr(pet_ref, '_id', None)
             if pet_id_val:
-                pet = await Pet.get(pet_id_val)
+                pet = await loaders.get(Pet, pet_id_val)
         except Exception:
             pet = None
 
@@ -123,17 +124,30 @@ async def create_event_for_my_pet(pet_id: PydanticObjectId, event_in: ScheduledE
 
 
 @router.get("/scheduled-events", response_model=List[ScheduledEventRead])
-async def get_my_scheduled_events(current_user: User = Depends(get_current_user)):
-    """Return scheduled events for all pets owned by current user."""
-    events = await crud_scheduled_event.get_events_for_owner(owner_email=current_user.email)
+async def get_my_scheduled_events(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None
+):
+    """Return scheduled events for all pets owned by current user, ordered by time.
+
+    The body stays a plain list; the cursor of the next page is sent in the
+    `X-Next-Cursor` header and accepted back as `cursor`.
+    """
+    events, next_cursor = await crud_scheduled_event.get_events_for_owner(
+        owner_email=current_user.email, skip=skip, limit=limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    # pet_name / owner_name are copied onto the events, no pet lookup needed
     out = []
     for e in events:
-        pet = await e.pet.fetch()
+        pet_id = crud_pet.pet_id_of(e)
         d = e.dict()
         d["id"] = str(e.id)
-        d["pet_id"] = str(e.pet.ref.id) if hasattr(e.pet, 'ref') else (str(e.pet.id) if hasattr(e.pet, 'id') else None)
-        d["pet_name"] = pet.name if pet else None
-        d["owner_name"] = pet.owner_name if pet else None
+        d["pet_id"] = str(pet_id) if pet_id else None
         # include optional linked catalog ids in listing
         d["service_id"] = str(getattr(e, 'service_id', None)) if getattr(e, 'service_id', None) else None
         d["product_id"] = str(getattr(e, 'product_id', None)) if getattr(e, 'product_id', None) else None
@@ -168,9 +182,8 @@ async def delete_my_scheduled_event(event_id: PydanticObjectId, current_user: Us
     if not pet_id_val:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Event has no pet reference')
 
-    # Verify ownership
-    pet = await crud_pet.get_pet_by_id_for_owner(pet_id=str(pet_id_val), owner_email=current_user.email)
-    if not pet:
+    # Verify ownership (projection-only check, the pet itself is not needed)
+    if not await crud_pet.owns_pet(pet_id_val, current_user.email):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Event not found')
 
     # Enforce Lai cancellation rule: allow if >24 hours away
@@ -194,28 +207,34 @@ async def delete_my_scheduled_event(event_id: PydanticObjectId, current_user: Us
         # If anything goes wrong when parsing dates, be conservative and disallow
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Không thể hủy sự kiện này hiện tại. Vui lòng liên hệ hỗ trợ.')
 
-    await event.delete()
+    await crud_scheduled_event.delete_event(event=event)
     return None
 
 
 @router.get("/pets/{pet_id}/health-records")
-async def get_my_pet_health_records(pet_id: PydanticObjectId, current_user: User = Depends(get_current_user)):
-    """Return health records for a pet owned by the current user, serialized to JSON-safe dicts."""
-    records = await crud_health_record.get_health_records_for_pet_owner(pet_id=pet_id, owner_email=current_user.email)
+async def get_my_pet_health_records(
+    pet_id: PydanticObjectId,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None
+):
+    """Return health records for a pet owned by the current user, serialized to JSON-safe dicts.
+
+    Ordered by date; the next page's cursor is sent in the `X-Next-Cursor` header.
+    """
+    records, next_cursor = await crud_health_record.get_health_records_for_pet_owner(
+        pet_id=pet_id, owner_email=current_user.email, skip=skip, limit=limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    product_names = await _product_names_for(*records)
     out = []
     for r in records:
         # Determine pet id reliably from a Link or embedded document
-        try:
-            rec_pet = getattr(r, 'pet', None)
-            pet_id_val = None
-            if rec_pet is not None:
-                if hasattr(rec_pet, 'ref'):
-                    pet_id_val = getattr(rec_pet.ref, 'id', None)
-                else:
-                    pet_id_val = getattr(rec_pet, 'id', None) or getattr(rec_pet, '_id', None)
-            pet_id_str = str(pet_id_val) if pet_id_val else str(pet_id)
-        except Exception:
-            pet_id_str = str(pet_id)
+        pet_id_val = crud_pet.pet_id_of(r)
+        pet_id_str = str(pet_id_val) if pet_id_val else str(pet_id)
 
         # Build a JSON-serializable dict similar to HealthRecordRead
         rec = {
@@ -227,22 +246,32 @@ async def get_my_pet_health_records(pet_id: PydanticObjectId, current_user: User
             'notes': getattr(r, 'notes', None),
             'next_due_date': getattr(r, 'next_due_date', None),
             'weight_kg': getattr(r, 'weight_kg', None),
-            'used_products': _convert_used_products(getattr(r, 'used_products', None)),
+            'used_products': _convert_used_products(getattr(r, 'used_products', None), product_names),
             'used_services': _convert_used_services(getattr(r, 'used_services', None)),
         }
         out.append(rec)
     return out
 
 
-def _convert_used_products(used_products: list | None):
+async def _product_names_for(*records) -> dict:
+    """Resolve names for every product used by the given records in one lookup."""
+    ids = []
+    for record in records:
+        for up in getattr(record, "used_products", None) or []:
+            ids.append(up.get("product_id") if isinstance(up, dict) else getattr(up, "product_id", None))
+    return await crud_product.resolve_product_names(ids)
+
+
+def _convert_used_products(used_products: list | None, product_names: dict | None = None):
     if not used_products:
         return None
+    product_names = product_names or {}
     out = []
     for up in used_products:
         if hasattr(up, "product_id"):
-            out.append({"product_id": up.product_id, "quantity": int(up.quantity), "unit_price": float(up.unit_price)})
+            out.append({"product_id": up.product_id, "name": product_names.get(str(up.product_id)), "quantity": int(up.quantity), "unit_price": float(up.unit_price)})
         elif isinstance(up, dict):
-            out.append({"product_id": up.get("product_id"), "quantity": int(up.get("quantity")), "unit_price": float(up.get("unit_price"))})
+            out.append({"product_id": up.get("product_id"), "name": product_names.get(str(up.get("product_id"))), "quantity": int(up.get("quantity")), "unit_price": float(up.get("unit_price"))})
         else:
             out.append(up)
     return out
@@ -278,6 +307,7 @@ async def create_health_record_for_my_pet(
     except ValueError as e:
         # propagate meaningful errors (e.g., insufficient stock)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    product_names = await _product_names_for(new_record)
 
     return HealthRecordRead(
         id=new_record.id,
@@ -288,7 +318,7 @@ async def create_health_record_for_my_pet(
         notes=new_record.notes,
         next_due_date=new_record.next_due_date,
         weight_kg=new_record.weight_kg,
-        used_products=_convert_used_products(new_record.used_products),
+        used_products=_convert_used_products(new_record.used_products, product_names),
         used_services=_convert_used_services(new_record.used_services)
     )
 
@@ -300,8 +330,7 @@ async def get_my_pet_health_record_by_id(
     current_user: User = Depends(get_current_user)
 ):
     # Verify ownership
-    pet = await crud_pet.get_pet_by_id_for_owner(pet_id=str(pet_id), owner_email=current_user.email)
-    if not pet:
+    if not await crud_pet.owns_pet(pet_id, current_user.email):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet not found")
 
     record = await crud_health_record.get_health_record_by_id(record_id=record_id)
@@ -312,6 +341,7 @@ async def get_my_pet_health_record_by_id(
     rec_pet_id = getattr(record.pet, 'ref', None).id if hasattr(record.pet, 'ref') else getattr(record.pet, 'id', None)
     if str(rec_pet_id) != str(pet_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Health record not found")
+    product_names = await _product_names_for(record)
 
     return HealthRecordRead(
         id=record.id,
@@ -322,7 +352,7 @@ async def get_my_pet_health_record_by_id(
         notes=record.notes,
         next_due_date=record.next_due_date,
         weight_kg=record.weight_kg,
-        used_products=_convert_used_products(record.used_products),
+        used_products=_convert_used_products(record.used_products, product_names),
         used_services=_convert_used_services(record.used_services)
     )
 
@@ -340,11 +370,11 @@ async def update_my_health_record(
     # verify ownership via pet
     pet_ref = getattr(existing, 'pet', None)
     pet_id_val = getattr(pet_ref, 'ref', None).id if hasattr(pet_ref, 'ref') else getattr(pet_ref, 'id', None)
-    pet = await crud_pet.get_pet_by_id_for_owner(pet_id=str(pet_id_val), owner_email=current_user.email)
-    if not pet:
+    if not await crud_pet.owns_pet(pet_id_val, current_user.email):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Health record not found")
 
     updated = await crud_health_record.update_health_record(record=existing, record_in=record_in)
+    product_names = await _product_names_for(updated)
 
     return HealthRecordRead(
         id=updated.id,
@@ -355,7 +385,7 @@ async def update_my_health_record(
         notes=updated.notes,
         next_due_date=updated.next_due_date,
         weight_kg=updated.weight_kg,
-        used_products=_convert_used_products(updated.used_products),
+        used_products=_convert_used_products(updated.used_products, product_names),
         used_services=_convert_used_services(updated.used_services)
     )
 
@@ -369,8 +399,7 @@ async def delete_my_health_record(record_id: PydanticObjectId, current_user: Use
     # verify owner
     pet_ref = getattr(existing, 'pet', None)
     pet_id_val = getattr(pet_ref, 'ref', None).id if hasattr(pet_ref, 'ref') else getattr(pet_ref, 'id', None)
-    pet = await crud_pet.get_pet_by_id_for_owner(pet_id=str(pet_id_val), owner_email=current_user.email)
-    if not pet:
+    if not await crud_pet.owns_pet(pet_id_val, current_user.email):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Health record not found")
 
     await crud_health_record.delete_health_record(record=existing)
@@ -384,15 +413,16 @@ async def portal_read_products_paginated(
     skip: int = 0,
     limit: int = 20,
     search: str | None = None,
+    cursor: str | None = None,
     current_user: User = Depends(get_current_user)
 ):
-    products, total = await crud_product.get_all_products_with_count(skip=skip, limit=limit, search=search)
+    products, total, next_cursor = await crud_product.get_all_products_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     data = []
     for p in products:
-        pd = p.dict()
+        pd = p.dict(exclude={SEARCH_KEYS_FIELD})
         pd['id'] = str(p.id)
         data.append(pd)
-    return { 'data': data, 'total': total, 'skip': skip, 'limit': limit }
+    return { 'data': data, 'total': total, 'skip': skip, 'limit': limit, 'next_cursor': next_cursor }
 
 
 @router.get('/products/{product_id}', response_model=ProductRead)
@@ -412,15 +442,16 @@ async def portal_read_services_paginated(
     skip: int = 0,
     limit: int = 20,
     search: str | None = None,
+    cursor: str | None = None,
     current_user: User = Depends(get_current_user)
 ):
-    services, total = await crud_service.get_all_services_with_count(skip=skip, limit=limit, search=search)
+    services, total, next_cursor = await crud_service.get_all_services_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     data = []
     for s in services:
-        sd = s.dict()
+        sd = s.dict(exclude={SEARCH_KEYS_FIELD})
         sd['id'] = str(s.id)
         data.append(sd)
-    return { 'data': data, 'total': total, 'skip': skip, 'limit': limit }
+    return { 'data': data, 'total': total, 'skip': skip, 'limit': limit, 'next_cursor': next_cursor }
 
 
 @router.get('/services/{service_id}', response_model=ServiceRead)
@@ -5,9 +5,10 @@ from beanie import PydanticObjectId
 from app.schemas.product import ProductCreate, ProductUpdate, ProductRead
 from app.crud import crud_product
 from app.api.deps import get_current_admin_user # <-- Dùng "người gác cổng" Admin
-from app.models.user import User
+from app.schemas.token import TokenData
 from app.models.product import Product
 from app.core.config import settings
+from app.core.search_keys import SEARCH_KEYS_FIELD
 
 router = APIRouter()
 
@@ -15,7 +16,7 @@ router = APIRouter()
 async def create_new_product(
     *,
     product_in: ProductCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     product = await crud_product.create_product(product_in=product_in)
     # Return dict with string id for frontend compatibility
@@ -27,7 +28,7 @@ async def create_new_product(
 async def read_products(
     skip: int = 0,
     limit: int = 100,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     return await crud_product.get_multi_products(skip=skip, limit=limit)
 
@@ -37,17 +38,20 @@ async def read_products_paginated(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    current_admin: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = None,
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách sản phẩm với phân trang và tìm kiếm.
+
+    `cursor` = `next_cursor` của trang trước (phân trang keyset).
     """
-    products, total = await crud_product.get_all_products_with_count(skip=skip, limit=limit, search=search)
+    products, total, next_cursor = await crud_product.get_all_products_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     
     # Convert to dicts and set string id for frontend compatibility
     data = []
     for product in products:
-        product_dict = product.dict()
+        product_dict = product.dict(exclude={SEARCH_KEYS_FIELD})
         product_dict["id"] = str(product.id)
         data.append(product_dict)
     
@@ -55,13 +59,14 @@ async def read_products_paginated(
         "data": data,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @router.get('/low-stock', response_model=List[dict])
 async def read_low_stock_products(
     threshold: int = None,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """Return products with stock <= threshold (admin-only). If threshold is None, use app config default."""
     thr = threshold if threshold is not None else settings.LOW_STOCK_THRESHOLD
@@ -72,7 +77,7 @@ async def read_low_stock_products(
 @router.get("/{product_id}", response_model=ProductRead)
 async def read_product_by_id(
     product_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     product = await crud_product.get_product(product_id=product_id)
     if not product:
@@ -87,7 +92,7 @@ async def update_product_by_id(
     *,
     product_id: PydanticObjectId,
     product_in: ProductUpdate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Cập nhật thông tin một sản phẩm. (Chỉ dành cho Admin)
@@ -111,7 +116,7 @@ async def update_product_by_id(
 async def delete_product_by_id(
     *,
     product_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Xóa một sản phẩm. (Chỉ dành cho Admin)
@@ -5,17 +5,35 @@ from beanie import PydanticObjectId
 from app.schemas.scheduled_event import ScheduledEventCreate, ScheduledEventRead, ScheduledEventPaginatedResponse
 from app.crud import crud_scheduled_event, crud_pet
 from app.api.deps import get_current_admin_user
-from app.models.user import User
+from app.schemas.token import TokenData
 from app.models.scheduled_event import ScheduledEvent
 
 router = APIRouter()
 
+
+def _event_row(event: ScheduledEvent, pets: dict) -> dict:
+    """Response row of an event; `pets` comes from `crud_pet.get_pets_for`."""
+    pet_id = crud_pet.pet_id_of(event)
+    pet = pets.get(str(pet_id)) if pet_id else None
+    return {
+        "id": event.id,
+        "pet_id": pet_id,
+        "pet_name": pet.get("name") if pet else "Unknown Pet",
+        "owner_name": pet.get("owner_name") if pet else "Unknown Owner",
+        "title": event.title,
+        "event_datetime": event.event_datetime,
+        "event_type": event.event_type,
+        "description": event.description,
+        "is_completed": event.is_completed
+    }
+
+
 @router.post("/for-pet/{pet_id}", response_model=ScheduledEventRead, status_code=status.HTTP_201_CREATED)
 async def create_event(
     *,
     pet_id: PydanticObjectId,
     event_in: ScheduledEventCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Tạo một sự kiện mới cho một thú cưng cụ thể. (Chỉ dành cho Admin)
@@ -48,35 +66,26 @@ async def get_upcoming(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    current_admin: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = None,
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách các sự kiện sắp diễn ra. (Chỉ dành cho Admin)
+
+    `cursor` = `next_cursor` của trang trước (phân trang keyset).
     """
-    events, total = await crud_scheduled_event.get_upcoming_events_with_count(skip=skip, limit=limit, search=search)
+    events, total, next_cursor = await crud_scheduled_event.get_upcoming_events_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     
-    response_list = []
-    for event in events:
-        # Lấy thông tin pet để include tên và chủ sở hữu
-        pet = await event.pet.fetch()
-        event_data = {
-            "id": event.id,
-            "pet_id": event.pet.ref.id,
-            "pet_name": pet.name if pet else "Unknown Pet",
-            "owner_name": pet.owner_name if pet else "Unknown Owner",
-            "title": event.title,
-            "event_datetime": event.event_datetime,
-            "event_type": event.event_type,
-            "description": event.description,
-            "is_completed": event.is_completed
-        }
-        response_list.append(event_data)
+    # Pet của cả trang được tải bằng một truy vấn $in (không fetch từng event)
+    pets = await crud_pet.get_pets_for(events)
+    response_list = [_event_row(event, pets) for event in events]
     
     return {
         "data": response_list,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -86,34 +95,25 @@ async def get_history(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    current_admin: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = None,
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách các sự kiện đã diễn ra (chỉ event_datetime < now). (Chỉ dành cho Admin)
+
+    `cursor` = `next_cursor` của trang trước (phân trang keyset).
     """
-    events, total = await crud_scheduled_event.get_past_events_with_count(skip=skip, limit=limit, search=search)
+    events, total, next_cursor = await crud_scheduled_event.get_past_events_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
 
-    response_list = []
-    for event in events:
-        pet = await event.pet.fetch()
-        event_data = {
-            "id": event.id,
-            "pet_id": event.pet.ref.id,
-            "pet_name": pet.name if pet else "Unknown Pet",
-            "owner_name": pet.owner_name if pet else "Unknown Owner",
-            "title": event.title,
-            "event_datetime": event.event_datetime,
-            "event_type": event.event_type,
-            "description": event.description,
-            "is_completed": event.is_completed
-        }
-        response_list.append(event_data)
+    pets = await crud_pet.get_pets_for(events)
+    response_list = [_event_row(event, pets) for event in events]
 
     return {
         "data": response_list,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @router.put("/{event_id}", response_model=ScheduledEventRead)
@@ -121,7 +121,7 @@ async def update_event(
     *,
     event_id: PydanticObjectId,
     event_in: ScheduledEventCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Cập nhật một sự kiện. (Chỉ dành cho Admin)
@@ -134,31 +134,17 @@ async def update_event(
         )
     
     # Cập nhật các field
-    for field, value in event_in.dict().items():
-        setattr(event, field, value)
-    
-    await event.save()
+    event = await crud_scheduled_event.update_event(event=event, event_in=event_in)
     
-    # Lấy thông tin pet để include tên và chủ sở hữu
-    pet = await event.pet.fetch()
-    response_data = {
-        "id": event.id,
-        "pet_id": event.pet.ref.id,
-        "pet_name": pet.name if pet else "Unknown Pet",
-        "owner_name": pet.owner_name if pet else "Unknown Owner",
-        "title": event.title,
-        "event_datetime": event.event_datetime,
-        "event_type": event.event_type,
-        "description": event.description,
-        "is_completed": event.is_completed
-    }
-    return response_data
+    # Lấy tên pet và chủ sở hữu (chỉ các trường cần thiết)
+    pets = await crud_pet.get_pets_for([event])
+    return _event_row(event, pets)
 
 @router.delete("/{event_id}")
 async def delete_event(
     *,
     event_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Xóa một sự kiện. (Chỉ dành cho Admin)
@@ -170,5 +156,5 @@ async def delete_event(
             detail=f"Event with id {event_id} not found",
         )
     
-    await event.delete()
+    await crud_scheduled_event.delete_event(event=event)
     return {"message": "Event deleted successfully"}
\ No newline at end of file
@@ -6,14 +6,15 @@ from beanie import PydanticObjectId
 from app.schemas.service import ServiceCreate, ServiceUpdate, ServiceRead
 from app.crud import crud_service
 from app.api.deps import get_current_admin_user
-from app.models.user import User
+from app.schemas.token import TokenData
+from app.core.search_keys import SEARCH_KEYS_FIELD
 
 router = APIRouter()
 
 @router.post("", response_model=ServiceRead, status_code=status.HTTP_201_CREATED)
 async def create_new_service(
     service_in: ServiceCreate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     service = await crud_service.create_service(service_in=service_in)
     # Return dict with string id for frontend compatibility
@@ -25,7 +26,7 @@ async def create_new_service(
 async def read_services(
     skip: int = 0,
     limit: int = 100,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     return await crud_service.get_multi_services(skip=skip, limit=limit)
 
@@ -35,17 +36,20 @@ async def read_services_paginated(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    current_admin: User = Depends(get_current_admin_user)
+    cursor: Optional[str] = None,
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     """
     Lấy danh sách dịch vụ với phân trang và tìm kiếm.
+
+    `cursor` = `next_cursor` của trang trước (phân trang keyset).
     """
-    services, total = await crud_service.get_all_services_with_count(skip=skip, limit=limit, search=search)
+    services, total, next_cursor = await crud_service.get_all_services_with_count(skip=skip, limit=limit, search=search, cursor=cursor)
     
     # Convert to dicts and set string id for frontend compatibility
     data = []
     for service in services:
-        service_dict = service.dict()
+        service_dict = service.dict(exclude={SEARCH_KEYS_FIELD})
         service_dict["id"] = str(service.id)
         data.append(service_dict)
     
@@ -53,13 +57,14 @@ async def read_services_paginated(
         "data": data,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @router.get("/{service_id}", response_model=ServiceRead)
 async def read_service_by_id(
     service_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     service = await crud_service.get_service(service_id=service_id)
     if not service:
@@ -73,7 +78,7 @@ async def read_service_by_id(
 async def update_existing_service(
     service_id: PydanticObjectId,
     service_in: ServiceUpdate,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     service = await crud_service.get_service(service_id=service_id)
     if not service:
@@ -87,7 +92,7 @@ async def update_existing_service(
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_existing_service(
     service_id: PydanticObjectId,
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: TokenData = Depends(get_current_admin_user)
 ):
     service = await crud_service.get_service(service_id=service_id)
     if not service:
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from typing import List, Optional
 from app.schemas.user import UserCreate, UserRead, UserUpdate, AdminUserUpdate  # Schemas từ thư mục schemas
 from app.models.user import User                   # Model từ thư mục models
 from app.crud import crud_user                     # CRUD functions từ thư mục crud
+from app.crud import crud_refresh_token, loaders, pagination
 from app.api.deps import get_current_user, get_current_admin_user # Dependency từ file deps
-from app.services.security import get_password_hash
+from app.schemas.token import TokenData
+from app.services.security import get_password_hash_async
+from app.services import token_revocation
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import DuplicateKeyError
 from beanie import PydanticObjectId
@@ -42,12 +45,20 @@ async def update_users_me(
     # Update fields if provided
     if user_in.full_name is not None:
         current_user.full_name = user_in.full_name
-    if user_in.password:
-        current_user.hashed_password = get_password_hash(user_in.password)
+    password_changed = bool(user_in.password)
+    if password_changed:
+        current_user.hashed_password = await get_password_hash_async(user_in.password)
+        # sessions opened with the old password (incl. this one) must sign in again
+        crud_user.bump_token_version(current_user)
     if getattr(user_in, 'avatar_url', None) is not None:
         current_user.avatar_url = user_in.avatar_url
+    current_user.search_keys = crud_user.user_search_keys(current_user)
 
     await current_user.save()
+    crud_user.invalidate_user(current_user.email)
+    if password_changed:
+        token_revocation.note_user(current_user)
+        await crud_refresh_token.revoke_user(current_user.email)
 
     return current_user
 
@@ -56,48 +67,76 @@ async def update_users_me(
 
 
 @router.get("/", response_model=List[UserRead])
-async def list_users(skip: int = 0, limit: int = 50, search: Optional[str] = None, current_user: User = Depends(get_current_admin_user)):
-    """List users for admin (paginated)."""
-    if search:
-        q = {"$or": [{"email": {"$regex": search, "$options": "i"}}, {"full_name": {"$regex": search, "$options": "i"}}]}
-        users = await User.find(q).skip(skip).limit(limit).to_list()
-    else:
-        users = await User.find_all().skip(skip).limit(limit).to_list()
+async def list_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    current_user: TokenData = Depends(get_current_admin_user),
+):
+    """List users for admin (oldest first).
+
+    The body stays a plain list; the keyset cursor of the next page is sent in
+    the `X-Next-Cursor` header and accepted back as `cursor`.
+    """
+    # email / full_name word prefixes, case- and diacritic-insensitive (indexed search_keys)
+    q = crud_user.search_users_filter(search) if search else {}
+    users, next_cursor = await pagination.find_page(User, q, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     return users
 
 
 @router.get("/{user_id}", response_model=UserRead)
-async def get_user_by_id(user_id: PydanticObjectId, current_user: User = Depends(get_current_admin_user)):
-    u = await User.get(user_id)
+async def get_user_by_id(user_id: PydanticObjectId, current_user: TokenData = Depends(get_current_admin_user)):
+    u = await loaders.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     return u
 
 
 @router.put("/{user_id}", response_model=UserRead)
-async def admin_update_user(user_id: PydanticObjectId, user_in: AdminUserUpdate, current_user: User = Depends(get_current_admin_user)):
-    u = await User.get(user_id)
+async def admin_update_user(user_id: PydanticObjectId, user_in: AdminUserUpdate, current_user: TokenData = Depends(get_current_admin_user)):
+    u = await loaders.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     data = user_in.dict(exclude_unset=True)
     if 'full_name' in data:
         u.full_name = data['full_name']
-    if 'password' in data and data.get('password'):
-        u.hashed_password = get_password_hash(data['password'])
+    password_changed = bool(data.get('password'))
+    if password_changed:
+        u.hashed_password = await get_password_hash_async(data['password'])
     if 'avatar_url' in data:
         u.avatar_url = data.get('avatar_url')
+    claims_before = (u.role, u.is_active)
     if 'role' in data and data.get('role') is not None:
         u.role = data.get('role')
     if 'is_active' in data and data.get('is_active') is not None:
         u.is_active = data.get('is_active')
+    # tokens carry role / active claims; a new password ends the old sessions too
+    revoke_sessions = password_changed or (u.role, u.is_active) != claims_before
+    if revoke_sessions:
+        crud_user.bump_token_version(u)
+    u.search_keys = crud_user.user_search_keys(u)
     await u.save()
+    # role / is_active / password changes must apply to the next request
+    crud_user.invalidate_user(u.email)
+    token_revocation.note_user(u)
+    if revoke_sessions:
+        # refresh tokens would otherwise mint access tokens with the new version
+        await crud_refresh_token.revoke_user(u.email)
     return u
 
 
 @router.delete("/{user_id}")
-async def admin_delete_user(user_id: PydanticObjectId, current_user: User = Depends(get_current_admin_user)):
-    u = await User.get(user_id)
+async def admin_delete_user(user_id: PydanticObjectId, current_user: TokenData = Depends(get_current_admin_user)):
+    u = await loaders.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     await u.delete()
+    loaders.forget(User, u.id)
+    crud_user.invalidate_user(u.email)
+    await token_revocation.revoke_deleted_user(u.email)
+    await crud_refresh_token.revoke_user(u.email)
     return {"ok": True}
\ No newline at end of file
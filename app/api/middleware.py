@@ -1,39 +1,149 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from jose import jwt, JWTError
-from fastapi import status
+import asyncio
+from typing import Optional
 
+from starlette.datastructures import MutableHeaders
+from jose import JWTError
+
+from app.core import dataloader, timing
 from app.core.config import settings
 from app.crud import crud_user
+from app.models.user import User
+from app.schemas.token import TokenData
+from app.services import security, token_revocation
+
+
+class LazyUser:
+    """
+    Memoized resolver of the user behind a bearer token.
+
+    Nothing is decoded or fetched until `claims()` / `resolve()` is called;
+    concurrent awaits within the same request share one lookup.
+    """
+
+    _UNSET = object()
+
+    def __init__(self, token: Optional[str]):
+        self.token = token
+        self._claims = self._UNSET
+        self._task: Optional[asyncio.Future] = None
+
+    def claims(self) -> Optional[TokenData]:
+        """Verified, non-revoked token claims (no DB access), or None."""
+        if self._claims is self._UNSET:
+            claims = None
+            if self.token:
+                try:
+                    claims = security.decode_access_token(self.token)
+                except JWTError:
+                    # invalid token -> no claims
+                    claims = None
+            if claims is not None and (not claims.email or token_revocation.is_revoked(claims)):
+                claims = None
+            self._claims = claims
+        return self._claims
+
+    def resolve(self) -> "asyncio.Future[Optional[User]]":
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._load())
+        return self._task
+
+    async def _load(self) -> Optional[User]:
+        claims = self.claims()
+        if claims is None:
+            return None
+        try:
+            with timing.timed("auth.user"):
+                user = await crud_user.get_user_by_email_cached(email=claims.email)
+        except Exception:
+            return None
+        if user is not None and not getattr(user, "is_active", True):
+            return None
+        return user
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization":
+            auth = value.decode("latin-1")
+            if auth.lower().startswith("bearer "):
+                return auth.split(" ", 1)[1].strip() or None
+            return None
+    return None
+
+
+class AuthMiddleware:
+    """
+    Raw ASGI middleware that only extracts the Bearer token and stores a
+    `LazyUser` as `request.state.auth`.
+
+    The JWT is decoded and the user loaded only when a route asks for it
+    (`app.api.deps.get_current_user` / `get_request_user`), so static files,
+    `/meta` and other anonymous routes never touch the `users` collection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            scope.setdefault("state", {})["auth"] = LazyUser(_bearer_token(scope))
+        await self.app(scope, receive, send)
+
+
+class TimingMiddleware:
+    """
+    Collects `timing.timed` stages for each HTTP request, adds them as a
+    `Server-Timing` header and logs requests slower than
+    `settings.SLOW_REQUEST_BUDGET_MS`.
+
+    Plain ASGI middleware so the header can be set on the response start
+    message, including for streaming responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = timing.start_request()
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                value = timings.header_value(total_ms=timings.elapsed_ms())
+                MutableHeaders(scope=message).append("Server-Timing", value)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            total_ms = timings.elapsed_ms()
+            budget = settings.SLOW_REQUEST_BUDGET_MS
+            if budget and total_ms > budget:
+                print(
+                    f"[slow request] {scope.get('method')} {scope.get('path')} "
+                    f"{total_ms:.1f}ms > {budget}ms: {timings.summary() or 'no stages'}"
+                )
+
+
+class DataLoaderMiddleware:
+    """
+    Opens a fresh set of request-scoped loaders (app.core.dataloader) for
+    every HTTP request, so documents fetched by id through app.crud.loaders
+    are loaded once per request and never shared between requests.
+    """
 
+    def __init__(self, app):
+        self.app = app
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware that decodes a Bearer token (if present) and populates
-    `request.state.user` with the corresponding User object or None.
-
-    This allows route handlers and dependencies to reuse the already-fetched
-    user and avoid duplicate DB lookups.
-    """
-
-    async def dispatch(self, request: Request, call_next):
-        request.state.user = None
-        auth: str | None = request.headers.get("authorization")
-        if auth and auth.lower().startswith("bearer "):
-            token = auth.split(" ", 1)[1].strip()
-            try:
-                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                email: str | None = payload.get("sub")
-                if email:
-                    # fetch user from DB and attach to request.state
-                    try:
-                        user = await crud_user.get_user_by_email(email=email)
-                        request.state.user = user
-                    except Exception:
-                        request.state.user = None
-            except JWTError:
-                # invalid token -> leave user as None
-                request.state.user = None
-
-        response = await call_next(request)
-        return response
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = dataloader.start_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            dataloader.end_request(token)
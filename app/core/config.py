@@ -6,6 +6,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    # Lifetime of refresh tokens (rotated on every /login/refresh)
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
     # Thêm các biến mail
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
@@ -21,6 +23,23 @@ class Settings(BaseSettings):
     CANCEL_WINDOW_HOURS: int = 24
     # Customer support phone number shown in cancellation guidance
     SUPPORT_PHONE: str | None = None
+    # Dashboard snapshot is recomputed in the background once older than this
+    DASHBOARD_SNAPSHOT_TTL_SECONDS: int = 60
+    # Max number of product id -> name entries kept in memory
+    PRODUCT_NAME_CACHE_SIZE: int = 2048
+    # Requests slower than this are logged with their stage timings (0 = off)
+    SLOW_REQUEST_BUDGET_MS: int = 0
+    # Authenticated users are cached in memory (LRU) for this long
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: int = 60
+    # How often the token revocation set is reloaded from MongoDB
+    TOKEN_REVOCATION_REFRESH_SECONDS: int = 30
+    # Argon2 runs in a bounded thread pool; beyond workers + queue -> 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+    # Totals of filtered list endpoints are reused for this long
+    LIST_COUNT_CACHE_TTL_SECONDS: int = 10
 
     class Config:
         env_file = ".env"
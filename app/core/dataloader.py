@@ -0,0 +1,105 @@
+"""Batching, memoizing loaders scoped to one request.
+
+    loader = DataLoader(fetch_many)     # fetch_many(keys) -> {key: value}
+    pet, other = await asyncio.gather(loader.load(a), loader.load(b))
+
+`load` calls made in the same event-loop iteration are collected and
+answered by one `fetch_many` call; values are memoized, so loading a key
+again returns the same object (an identity map). Keys `fetch_many` does not
+return load as None.
+
+`DataLoaderMiddleware` (app.api.middleware) opens a fresh registry for every
+HTTP request; `request_loader(name, fetch_many)` returns that request's
+loader for `name`, or None outside a request (scheduler jobs, scripts), in
+which case callers fetch directly. Nothing is shared between requests.
+"""
+import asyncio
+from contextvars import ContextVar, Token
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+FetchMany = Callable[[List[Hashable]], Awaitable[Dict[Hashable, object]]]
+
+
+class DataLoader:
+    def __init__(self, fetch_many: FetchMany, max_batch_size: int = 1000):
+        self.fetch_many = fetch_many
+        self.max_batch_size = max_batch_size
+        self._values: Dict[Hashable, object] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self.batches = 0
+
+    async def load(self, key: Hashable):
+        if key in self._values:
+            return self._values[key]
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if not self._queue:
+                # Dispatch after the current iteration so sibling loads join the batch
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, object]:
+        keys = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(key) for key in keys))
+        return dict(zip(keys, values))
+
+    def prime(self, key: Hashable, value) -> None:
+        """Remember a value obtained elsewhere (e.g. a document just inserted)."""
+        self._values[key] = value
+
+    def clear(self, key: Hashable) -> None:
+        self._values.pop(key, None)
+
+    def _dispatch(self) -> None:
+        queue, self._queue = self._queue, []
+        for start in range(0, len(queue), self.max_batch_size):
+            asyncio.ensure_future(self._run_batch(queue[start:start + self.max_batch_size]))
+
+    async def _run_batch(self, keys: List[Hashable]) -> None:
+        self.batches += 1
+        try:
+            found = await self.fetch_many(keys)
+        except Exception as e:
+            # Errors reach every waiter of the batch and are not memoized
+            for key in keys:
+                future = self._pending.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            value = found.get(key)
+            self._values[key] = value
+            future = self._pending.pop(key)
+            if not future.done():
+                future.set_result(value)
+
+
+_current: ContextVar[Optional[Dict[Hashable, DataLoader]]] = ContextVar("request_loaders", default=None)
+
+
+def start_request() -> Token:
+    return _current.set({})
+
+
+def end_request(token: Token) -> None:
+    _current.reset(token)
+
+
+def detach() -> None:
+    """Stop using the surrounding request's loaders (for background tasks spawned from it)."""
+    _current.set(None)
+
+
+def request_loader(name: Hashable, fetch_many: FetchMany) -> Optional[DataLoader]:
+    registry = _current.get()
+    if registry is None:
+        return None
+    loader = registry.get(name)
+    if loader is None:
+        loader = registry[name] = DataLoader(fetch_many)
+    return loader
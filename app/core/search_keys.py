@@ -0,0 +1,68 @@
+"""Prefix search keys.
+
+Searchable text fields are stored as a list of normalized keys on the
+document itself (`search_keys`, backed by a multikey index), e.g. a pet
+with owner_name "Tran Binh" and species "Dog" gets
+
+    ["o:b", "o:bi", "o:bin", "o:binh", "o:t", "o:tr", "o:tra", "o:tran",
+     "s:d", "s:do", "s:dog"]
+
+Words are folded first (lowercase, Vietnamese diacritics removed, see
+app.core.text), so "nguyen" finds "Nguyễn". Each key is
+`<namespace>:<prefix of a word>`; the namespace says which
+field the word came from, so one index serves searches over different
+field sets. A search term is split into words the same way and every word
+must be an exact key in one of the searched namespaces, which MongoDB
+answers from the index instead of scanning with `$regex`.
+
+Matching is by word prefix ("bin" finds "Tran Binh", "inh" does not).
+Words longer than MAX_PREFIX_LENGTH are indexed (and searched) by their
+first MAX_PREFIX_LENGTH characters.
+"""
+import re
+from typing import Dict, Iterable, List, Optional
+
+from app.core.text import fold
+
+SEARCH_KEYS_FIELD = "search_keys"
+MAX_PREFIX_LENGTH = 20
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text: Optional[str]) -> List[str]:
+    """Folded words of `text` (see app.core.text.fold), for both stored keys and searches."""
+    return _WORD.findall(fold(text))
+
+
+def build_keys(fields: Dict[str, Optional[str]]) -> List[str]:
+    """Search keys for {namespace: field value}; sorted and without duplicates."""
+    keys = set()
+    for namespace, value in fields.items():
+        for word in words(value):
+            for end in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                keys.add(f"{namespace}:{word[:end]}")
+    return sorted(keys)
+
+
+def document_keys(doc, fields: Dict[str, str]) -> List[str]:
+    """Search keys of a model instance or raw document for {namespace: field name}."""
+    get = doc.get if isinstance(doc, dict) else (lambda name: getattr(doc, name, None))
+    return build_keys({namespace: get(field) for namespace, field in fields.items()})
+
+
+def search_filter(search: Optional[str], namespaces: Iterable[str], field: str = SEARCH_KEYS_FIELD) -> dict:
+    """Query matching documents where every word of `search` prefixes a word in one of `namespaces`.
+
+    Returns {} when `search` has no words (nothing to filter on).
+    """
+    namespaces = list(namespaces)
+    clauses = []
+    for word in dict.fromkeys(words(search)):
+        keys = [f"{namespace}:{word[:MAX_PREFIX_LENGTH]}" for namespace in namespaces]
+        clauses.append({field: keys[0] if len(keys) == 1 else {"$in": keys}})
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
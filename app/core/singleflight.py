@@ -0,0 +1,95 @@
+"""Single-flight coalescing for async functions.
+
+    @single_flight()
+    async def compute_revenue_report(start_date=None, end_date=None, group_by=None): ...
+
+While a call is in flight, identical calls (same function, same arguments
+after binding defaults) await the same task instead of starting their own.
+The result is not cached: once the call finishes, the next call runs again.
+"""
+import asyncio
+import functools
+import inspect
+from datetime import date, datetime
+from typing import Callable, Dict, Hashable, Optional
+
+
+def _normalize(value) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_normalize(v) for v in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.shared += 1
+        # shield: a caller that disconnects must not cancel the work others wait on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._inflight)}
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(key: Optional[Callable[..., Hashable]] = None):
+    """Decorator coalescing concurrent identical calls of an async function.
+
+    `key(*args, **kwargs)` may be given to choose the coalescing key; by default
+    all arguments are bound to the signature (defaults applied) and normalized,
+    so `f(1)` and `f(x=1)` share a flight.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        group = _groups.setdefault(name, SingleFlight(name))
+        signature = inspect.signature(fn)
+
+        def make_key(args, kwargs) -> Hashable:
+            if key is not None:
+                return key(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return _normalize(bound.arguments)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await group.do(make_key(args, kwargs), fn, *args, **kwargs)
+
+        wrapper.single_flight = group
+        return wrapper
+
+    return decorator
+
+
+def single_flight_stats() -> Dict[str, dict]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,25 @@
+"""Text normalization shared by search and lookups.
+
+Vietnamese names are written with diacritics ("Nguyễn", "Đặng") but are
+often searched without them ("nguyen", "dang"). `fold` maps both to the
+same plain lowercase form so stored keys and search terms compare equal.
+"""
+import unicodedata
+from typing import Optional
+
+# đ/Đ are letters of their own in Unicode, not "d + combining mark"
+_EXTRA_FOLDS = str.maketrans({"đ": "d", "Đ": "D"})
+
+
+def strip_diacritics(text: str) -> str:
+    """Remove accents and tone marks: "Nguyễn Đức" -> "Nguyen Duc"."""
+    decomposed = unicodedata.normalize("NFD", text.translate(_EXTRA_FOLDS))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return unicodedata.normalize("NFC", stripped)
+
+
+def fold(text: Optional[str]) -> str:
+    """Case- and diacritic-insensitive form of `text` ("" for None)."""
+    if not text:
+        return ""
+    return strip_diacritics(unicodedata.normalize("NFKC", str(text))).casefold()
@@ -0,0 +1,110 @@
+"""Per-request stage timings.
+
+`TimingMiddleware` (app.api.middleware) opens a `RequestTimings` for every
+HTTP request; code anywhere below it records stages with `timed`:
+
+    with timed("orders.insert"):
+        ...
+
+    @timed("dashboard.compute")
+    async def compute_dashboard_data(): ...
+
+Stages are reported in the `Server-Timing` response header. Outside a request
+(scheduler jobs, scripts) `timed` is a no-op apart from the clock reads.
+"""
+import functools
+import inspect
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_NON_TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # name -> [total ms, calls]; insertion order is kept for the header
+        self.stages: Dict[str, list] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += duration_ms
+        stage[1] += 1
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header_value(self, total_ms: Optional[float] = None) -> str:
+        parts = [f"{_NON_TOKEN.sub('_', name)};dur={ms:.1f}" for name, (ms, _) in self.stages.items()]
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name}={ms:.1f}ms" + (f" x{calls}" if calls > 1 else "")
+            for name, (ms, calls) in self.stages.items()
+        )
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def detach() -> None:
+    """Stop recording into the surrounding request (for background tasks spawned from it)."""
+    _current.set(None)
+
+
+def record(name: str, duration_ms: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, duration_ms)
+
+
+async def timed_await(name: str, awaitable):
+    """Await `awaitable` as a named stage (handy inside asyncio.gather)."""
+    with timed(name):
+        return await awaitable
+
+
+class timed:
+    """Context manager / decorator recording the duration of a stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, (time.perf_counter() - self._started) * 1000)
+        return False
+
+    def __call__(self, fn):
+        name = self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
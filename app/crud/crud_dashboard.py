@@ -1,7 +1,11 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List
-import motor.motor_asyncio
-from app.core.config import settings
+from app.core.search_keys import SEARCH_KEYS_FIELD
+from app.core.singleflight import single_flight
+from app.core.timing import timed, timed_await
+from app.crud import crud_dashboard_counter as counters
+from app.db.database import get_collection
 from app.models.pet import Pet
 from app.models.scheduled_event import ScheduledEvent
 from app.models.health_record import HealthRecord, RecordType
@@ -9,190 +13,148 @@ from app.models.service import Service
 from app.schemas.dashboard import DashboardData
 
 
-def _get_motor_collection(model):
-    """Return a motor collection for a Beanie Document model.
+async def _run_facet(model, facets: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    """Run a single `$facet` aggregation over the model's collection.
 
-    Tries model.get_motor_collection(), then model.get_collection(),
-    otherwise falls back to creating an AsyncIOMotorClient and returning
-    the collection by the model Settings.name.
+    Returns the facet document (one list of results per facet name). An empty
+    collection still yields a document with empty lists.
     """
-    # Prefer built-in helper if available
-    if hasattr(model, "get_motor_collection"):
-        return model.get_motor_collection()
-    if hasattr(model, "get_collection"):
-        return model.get_collection()
-
-    # Fallback: create a motor client and use the collection name from model.Settings
-    coll_name = None
-    try:
-        coll_name = model.Settings.name
-    except Exception:
-        # last resort: use lowercased class name
-        coll_name = model.__name__.lower() + "s"
+    coll = get_collection(model)
+    result = await coll.aggregate([{"$facet": facets}]).to_list(length=1)
+    if not result:
+        return {name: [] for name in facets}
+    return result[0]
 
-    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
-    return client[settings.DATABASE_NAME][coll_name]
 
-async def get_dashboard_data() -> DashboardData:
-    """
-    Truy vấn và tính toán các số liệu nâng cao cho dashboard.
-    """
-    try:
-        now = datetime.now(timezone.utc)
-        in_24_hours = now + timedelta(days=1)
-        in_30_days = now + timedelta(days=30)
-        last_30_days = now - timedelta(days=30)
-        last_7_days = now - timedelta(days=7)
-
-        total_pets_count = await Pet.find_all().count()
-        upcoming_events_count = await ScheduledEvent.find(
-            ScheduledEvent.is_completed == False,
-            ScheduledEvent.event_datetime >= now,
-            ScheduledEvent.event_datetime <= in_24_hours
-        ).count()
-        total_health_records_count = await HealthRecord.find_all().count()
-        due_vaccinations = await HealthRecord.find(
-            HealthRecord.record_type == RecordType.VACCINATION,
-            HealthRecord.next_due_date >= now,
-            HealthRecord.next_due_date <= in_30_days
-        ).count()
-
-        print(f"Basic stats - Pets: {total_pets_count}, Events: {upcoming_events_count}, Health: {total_health_records_count}, Vaccinations: {due_vaccinations}")
-
-        # --- THỐNG KÊ THEO LOÀI ---
-        species_pipeline = [
-            {"$group": {"_id": "$species", "count": {"$sum": 1}}}
-        ]
-
-        motor_collection = _get_motor_collection(Pet)
-        species_result_cursor = motor_collection.aggregate(species_pipeline)
-        species_result = await species_result_cursor.to_list(length=None)
-        pets_by_species_dict = {item["_id"]: item["count"] for item in species_result if item["_id"]}
-        print(f"Pets by species: {pets_by_species_dict}")
+def _facet_count(rows: List[dict]) -> int:
+    """Read the value produced by a `{"$count": "count"}` facet."""
+    return int(rows[0]["count"]) if rows else 0
 
-        # --- THÚ CƯNG MỚI NHẤT ---
-        latest_pets_list = await Pet.find_all().sort(-Pet.id).limit(5).to_list()
-        latest_pets_dicts = []
-        for pet in latest_pets_list:
-            pet_dict = pet.dict()
-            pet_dict["id"] = str(pet.id)
-            latest_pets_dicts.append(pet_dict)
-        print(f"Latest pets count: {len(latest_pets_dicts)}")
-        revenue_by_date = {}
-        try:
-            # Đơn giản hóa: chỉ tính tổng cost từ health records
-            revenue_pipeline = [
-                {"$match": {"date": {"$gte": last_7_days, "$lte": now}}},
-                {"$group": {
-                    "_id": {
-                        "$dateToString": {"format": "%Y-%m-%d", "date": "$date"}
-                    },
-                    "total": {"$sum": "$total_cost"}
-                }},
-                {"$sort": {"_id": 1}}
-            ]
-
-            health_motor_collection = _get_motor_collection(HealthRecord)
-            revenue_result = await health_motor_collection.aggregate(revenue_pipeline).to_list(length=None)
-            revenue_by_date = {item["_id"]: item["total"] for item in revenue_result}
-            print(f"Revenue data: {revenue_by_date}")
-        except Exception as e:
-            print(f"Error in revenue aggregation: {e}")
-            revenue_by_date = {}
-
-        # --- PHÂN BỐ DỊCH VỤ ĐƯỢC SỬ DỤNG ---
-        services_usage = {}
-        try:
-            # Kiểm tra sample record để debug
-            sample_record = await HealthRecord.find_one()
-            print(f"Sample health record: {sample_record}")
-            if sample_record:
-                print(f"Used services: {getattr(sample_record, 'used_services', 'NOT FOUND')}")
-                print(f"Used products: {getattr(sample_record, 'used_products', 'NOT FOUND')}")
-
-            # Thử aggregation đơn giản hơn
-            services_pipeline = [
-                {"$match": {"used_services": {"$exists": True, "$ne": []}}},
-                {"$unwind": "$used_services"},
-                {"$group": {"_id": "$used_services.name", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 10}
-            ]
-
-            services_result = await health_motor_collection.aggregate(services_pipeline).to_list(length=None)
-            services_usage = {item["_id"]: item["count"] for item in services_result if item["_id"]}
-            print(f"Services usage data: {services_usage}")
-        except Exception as e:
-            print(f"Error in services aggregation: {e}")
-            services_usage = {}
-
-        # --- THỐNG KÊ SỨC KHỎE THEO LOẠI ---
-        health_stats = {}
-        try:
-            health_stats_pipeline = [
-                {"$group": {"_id": "$record_type", "count": {"$sum": 1}}}
-            ]
-
-            health_stats_result = await health_motor_collection.aggregate(health_stats_pipeline).to_list(length=None)
-            health_stats = {item["_id"]: item["count"] for item in health_stats_result}
-            print(f"Health stats: {health_stats}")
-        except Exception as e:
-            print(f"Error in health stats aggregation: {e}")
-            health_stats = {}
 
+def _pet_facets() -> Dict[str, List[dict]]:
+    return {
+        "total": [{"$count": "count"}],
+        # --- THÚ CƯNG MỚI NHẤT ---
+        "latest": [
+            {"$sort": {"_id": -1}},
+            {"$limit": 5},
+            {"$project": {SEARCH_KEYS_FIELD: 0}}
+        ],
+    }
+
+
+def _health_record_facets(now: datetime) -> Dict[str, List[dict]]:
+    in_30_days = now + timedelta(days=30)
+    last_7_days = now - timedelta(days=7)
+    return {
+        "total": [{"$count": "count"}],
+        "due_vaccinations": [
+            {"$match": {
+                "record_type": RecordType.VACCINATION.value,
+                "next_due_date": {"$gte": now, "$lte": in_30_days}
+            }},
+            {"$count": "count"}
+        ],
+        "revenue_by_date": [
+            {"$match": {"date": {"$gte": last_7_days, "$lte": now}}},
+            {"$group": {
+                "_id": {
+                    "$dateToString": {"format": "%Y-%m-%d", "date": "$date"}
+                },
+                "total": {"$sum": "$total_cost"}
+            }},
+            {"$sort": {"_id": 1}}
+        ],
+    }
+
+
+def _event_facets(now: datetime) -> Dict[str, List[dict]]:
+    in_24_hours = now + timedelta(days=1)
+    last_30_days = now - timedelta(days=30)
+    return {
+        "upcoming": [
+            {"$match": {
+                "is_completed": False,
+                "event_datetime": {"$gte": now, "$lte": in_24_hours}
+            }},
+            {"$count": "count"}
+        ],
         # --- LỊCH HẸN THEO THÁNG ---
-        events_by_month = {}
-        try:
-            events_pipeline = [
-                {"$match": {"event_datetime": {"$gte": last_30_days, "$lte": now}}},
-                {"$group": {
-                    "_id": {
-                        "$dateToString": {"format": "%Y-%m", "date": "$event_datetime"}
-                    },
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"_id": 1}}
-            ]
-
-            events_motor_collection = _get_motor_collection(ScheduledEvent)
-            events_result = await events_motor_collection.aggregate(events_pipeline).to_list(length=None)
-            events_by_month = {item["_id"]: item["count"] for item in events_result}
-            print(f"Events by month: {events_by_month}")
-        except Exception as e:
-            print(f"Error in events aggregation: {e}")
-            events_by_month = {}
-
-        # --- THỐNG KÊ TRẠNG THÁI THÚ CƯNG ---
-        pet_status_stats = {}
-        try:
-            pet_status_pipeline = [
-                {"$match": {"status": {"$ne": None}}},  # Filter out null status
-                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-            ]
-
-            pet_status_result = await motor_collection.aggregate(pet_status_pipeline).to_list(length=None)
-            pet_status_stats = {item["_id"]: item["count"] for item in pet_status_result if item["_id"] is not None}
-            print(f"Pet status stats: {pet_status_stats}")
-        except Exception as e:
-            print(f"Error in pet status aggregation: {e}")
-            pet_status_stats = {}
-
-        dashboard_data = DashboardData(
-            total_pets=total_pets_count,
-            upcoming_events_count=upcoming_events_count,
-            total_health_records=total_health_records_count,
-            due_vaccinations_count=due_vaccinations,
-            pets_by_species=pets_by_species_dict,
-            latest_pets=latest_pets_dicts,
-            revenue_by_date=revenue_by_date,
-            services_usage=services_usage,
-            health_stats=health_stats,
-            events_by_month=events_by_month,
-            pet_status_stats=pet_status_stats
-        )
-
-        return dashboard_data
+        "events_by_month": [
+            {"$match": {"event_datetime": {"$gte": last_30_days, "$lte": now}}},
+            {"$group": {
+                "_id": {
+                    "$dateToString": {"format": "%Y-%m", "date": "$event_datetime"}
+                },
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ],
+    }
+
+
+def _top_n(counts: Dict[str, int], n: int) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:n])
+
+
+def _latest_pet_dicts(docs: List[dict]) -> List[dict]:
+    """Shape raw pet documents like the pets endpoint does: string id, no search_keys."""
+    latest = []
+    for doc in docs:
+        pet = Pet.model_validate(doc)
+        pet_dict = pet.dict(exclude={SEARCH_KEYS_FIELD})
+        pet_dict["id"] = str(pet.id)
+        latest.append(pet_dict)
+    return latest
+
+
+@single_flight()
+@timed("dashboard.compute")
+async def compute_dashboard_data() -> DashboardData:
+    """
+    Truy vấn và tính toán các số liệu nâng cao cho dashboard.
 
+    Mỗi collection (Pet, HealthRecord, ScheduledEvent) được thống kê bằng một
+    pipeline `$facet` duy nhất; các phân bố (loài, loại bản ghi, dịch
+    vụ) được đọc từ collection counters. Tất cả chạy song song. Lỗi được
+    ném ra cho caller (xem `get_dashboard_data` cho phiên bản an toàn).
+    """
+    now = datetime.now(timezone.utc)
+
+    pet_stats, health_stats_doc, event_stats, distributions = await asyncio.gather(
+        timed_await("dashboard.pets", _run_facet(Pet, _pet_facets())),
+        timed_await("dashboard.health_records", _run_facet(HealthRecord, _health_record_facets(now))),
+        timed_await("dashboard.events", _run_facet(ScheduledEvent, _event_facets(now))),
+        timed_await("dashboard.counters", counters.get_distributions([
+            counters.PETS_BY_SPECIES,
+            counters.HEALTH_RECORD_TYPE,
+            counters.SERVICES_USAGE,
+        ])),
+    )
+
+    return DashboardData(
+        total_pets=_facet_count(pet_stats["total"]),
+        upcoming_events_count=_facet_count(event_stats["upcoming"]),
+        total_health_records=_facet_count(health_stats_doc["total"]),
+        due_vaccinations_count=_facet_count(health_stats_doc["due_vaccinations"]),
+        pets_by_species=distributions[counters.PETS_BY_SPECIES],
+        latest_pets=_latest_pet_dicts(pet_stats["latest"]),
+        revenue_by_date={item["_id"]: item["total"] for item in health_stats_doc["revenue_by_date"]},
+        services_usage=_top_n(distributions[counters.SERVICES_USAGE], 10),
+        health_stats=distributions[counters.HEALTH_RECORD_TYPE],
+        events_by_month={item["_id"]: item["count"] for item in event_stats["events_by_month"]},
+        # Pet has no status field; kept (empty) for API compatibility
+        pet_status_stats={}
+    )
+
+
+@timed("dashboard")
+async def get_dashboard_data() -> DashboardData:
+    """
+    Giống `compute_dashboard_data` nhưng trả về dashboard rỗng khi có lỗi.
+    """
+    try:
+        return await compute_dashboard_data()
     except Exception as e:
         print(f"Error in get_dashboard_data: {e}")
         import traceback
@@ -210,4 +172,4 @@ async def get_dashboard_data() -> DashboardData:
             health_stats={},
             events_by_month={},
             pet_status_stats={}
-        )
\ No newline at end of file
+        )
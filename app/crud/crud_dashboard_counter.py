@@ -0,0 +1,146 @@
+"""Incrementally maintained counters for the dashboard distributions.
+
+Each (metric, key) pair is one document in `dashboard_counters`. Write paths
+compute the keys a document contributes before and after the change and apply
+the difference with a single unordered bulk of `$inc` upserts, so the
+dashboard reads O(categories) documents instead of scanning every record.
+
+`rebuild_counters()` recomputes everything from the source collections and is
+the repair path if the counters ever drift (e.g. after a failed write or raw
+database edits).
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.db.database import get_collection
+from app.models.dashboard_counter import DashboardCounter
+from app.models.health_record import HealthRecord
+from app.models.pet import Pet
+
+PETS_BY_SPECIES = "pets_by_species"
+HEALTH_RECORD_TYPE = "health_record_type"
+SERVICES_USAGE = "services_usage"
+
+CounterKey = Tuple[str, str]
+
+
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+
+def pet_counter_keys(pet: Optional[Pet]) -> List[CounterKey]:
+    """Counter buckets a pet contributes to."""
+    if pet is None:
+        return []
+    keys = []
+    species = getattr(pet, "species", None)
+    if species:
+        keys.append((PETS_BY_SPECIES, str(species)))
+    return keys
+
+
+def health_record_counter_keys(record: Optional[HealthRecord]) -> List[CounterKey]:
+    """Counter buckets a health record contributes to (one per used service)."""
+    if record is None:
+        return []
+    keys = []
+    record_type = getattr(record, "record_type", None)
+    if record_type is not None:
+        keys.append((HEALTH_RECORD_TYPE, str(_enum_value(record_type))))
+    for us in getattr(record, "used_services", None) or []:
+        name = us.get("name") if isinstance(us, dict) else getattr(us, "name", None)
+        if name:
+            keys.append((SERVICES_USAGE, str(name)))
+    return keys
+
+
+async def apply_change(before: Iterable[CounterKey], after: Iterable[CounterKey]) -> None:
+    """Apply the delta between two key lists with atomic `$inc` upserts.
+
+    Failures are logged and swallowed: the source write already succeeded and
+    `rebuild_counters()` can repair any drift.
+    """
+    deltas: Dict[CounterKey, int] = Counter(after)
+    deltas.subtract(Counter(before))
+    ops = [
+        UpdateOne({"metric": metric, "key": key}, {"$inc": {"value": delta}}, upsert=True)
+        for (metric, key), delta in deltas.items()
+        if delta
+    ]
+    if not ops:
+        return
+    try:
+        await get_collection(DashboardCounter).bulk_write(ops, ordered=False)
+    except Exception as e:
+        print(f"CRITICAL: Failed to update dashboard counters: {e}")
+
+
+async def get_distributions(metrics: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    """Return {metric: {key: count}} for the requested metrics in one query."""
+    metrics = list(metrics)
+    out: Dict[str, Dict[str, int]] = {m: {} for m in metrics}
+    cursor = get_collection(DashboardCounter).find(
+        {"metric": {"$in": metrics}, "value": {"$gt": 0}},
+        projection={"_id": 0, "metric": 1, "key": 1, "value": 1},
+    )
+    async for doc in cursor:
+        out[doc["metric"]][doc["key"]] = int(doc["value"])
+    return out
+
+
+async def _group_counts(model, pipeline: List[dict]) -> Dict[str, int]:
+    rows = await get_collection(model).aggregate(pipeline).to_list(length=None)
+    return {str(r["_id"]): int(r["count"]) for r in rows if r["_id"] is not None and r["_id"] != ""}
+
+
+async def rebuild_counters() -> Dict[str, int]:
+    """Recompute every counter from scratch. Returns number of buckets per metric.
+
+    Writes that land while the rebuild runs may be lost; run it during a quiet
+    period or run it again afterwards.
+    """
+    sources = {
+        PETS_BY_SPECIES: (Pet, [
+            {"$group": {"_id": "$species", "count": {"$sum": 1}}}
+        ]),
+        HEALTH_RECORD_TYPE: (HealthRecord, [
+            {"$group": {"_id": "$record_type", "count": {"$sum": 1}}}
+        ]),
+        SERVICES_USAGE: (HealthRecord, [
+            {"$match": {"used_services": {"$exists": True, "$ne": []}}},
+            {"$unwind": "$used_services"},
+            {"$group": {"_id": "$used_services.name", "count": {"$sum": 1}}}
+        ]),
+    }
+
+    docs = []
+    summary = {}
+    for metric, (model, pipeline) in sources.items():
+        counts = await _group_counts(model, pipeline)
+        summary[metric] = len(counts)
+        docs.extend({"metric": metric, "key": key, "value": count} for key, count in counts.items())
+
+    coll = get_collection(DashboardCounter)
+    await coll.delete_many({})
+    if docs:
+        await coll.insert_many(docs)
+    return summary
+
+
+async def ensure_counters() -> None:
+    """Build the counters on first start (empty collection, existing data).
+
+    Also rebuilds counters written before their field was renamed from
+    `count` to `value`.
+    """
+    coll = get_collection(DashboardCounter)
+    if await coll.find_one({}, projection={"_id": 1}) is not None \
+            and await coll.find_one({"count": {"$exists": True}}, projection={"_id": 1}) is None:
+        return
+    if await get_collection(Pet).find_one({}, projection={"_id": 1}) is None \
+            and await get_collection(HealthRecord).find_one({}, projection={"_id": 1}) is None:
+        return
+    summary = await rebuild_counters()
+    print(f"Dashboard counters built: {summary}")
@@ -0,0 +1,197 @@
+"""Row sources for the admin exports.
+
+Every function here returns an async iterator of flat dict rows read
+straight from a Motor cursor, so callers can stream any number of rows with
+constant memory. Column order is given by the matching `*_COLUMNS` list.
+"""
+import heapq
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from app.crud import crud_pet
+from app.crud.crud_report import (
+    LINE_ORDER_ITEM,
+    LINE_RECORD,
+    _date_range,
+    _health_record_lines,
+    _order_lines,
+)
+from app.db.database import get_collection
+from app.models.health_record import HealthRecord
+from app.models.order import Order
+
+# Rows fetched from MongoDB per round trip
+EXPORT_BATCH_SIZE = 1000
+
+REVENUE_COLUMNS = ["date", "source", "source_id", "kind", "product_id", "service", "quantity", "amount"]
+ORDER_COLUMNS = [
+    "order_id", "created_at", "user_email", "user_name", "status", "order_total",
+    "product_id", "product_name", "unit_price", "quantity", "subtotal",
+]
+HEALTH_RECORD_COLUMNS = [
+    "record_id", "pet_id", "pet_name", "owner_email", "record_type", "date", "description", "notes",
+    "next_due_date", "weight_kg", "used_products", "used_services",
+]
+
+
+# Revenue lines -> REVENUE_COLUMNS; record markers carry no money
+_REVENUE_LINE_STAGES = [
+    {"$unwind": "$lines"},
+    {"$replaceRoot": {"newRoot": "$lines"}},
+    {"$match": {"kind": {"$ne": LINE_RECORD}}},
+    {"$project": {
+        "_id": 0,
+        "date": "$at",
+        "source": 1,
+        "source_id": {"$toString": "$ref"},
+        "kind": 1,
+        "product_id": {"$cond": [{"$in": ["$kind", ["product", LINE_ORDER_ITEM]]}, "$key", None]},
+        "service": {"$cond": [{"$eq": ["$kind", "service"]}, "$key", None]},
+        "quantity": "$qty",
+        "amount": 1,
+    }},
+]
+
+
+def _tag_lines(source: str) -> dict:
+    return {"$set": {"lines": {"$map": {"input": "$lines", "as": "l", "in": {"$mergeObjects": ["$$l", {"source": source}]}}}}}
+
+
+def export_revenue_lines(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    end_exclusive: bool = False,
+) -> AsyncIterator[dict]:
+    """One row per revenue line (product/service use, order total, order item), by date.
+
+    Health records and orders are each read in the order of their date index
+    (`date` / `created_at`) and the two streams are merged here, so no stage
+    has to sort the whole range on the server before the first row arrives.
+    """
+    order_query = _date_range("created_at", start_date, end_date, end_exclusive=end_exclusive)
+    order_query["status"] = {"$ne": "cancelled"}
+    health_records = get_collection(HealthRecord).aggregate([
+        {"$match": _date_range("date", start_date, end_date, end_exclusive=end_exclusive)},
+        {"$sort": {"date": 1}},
+        _health_record_lines(),
+        _tag_lines("health_record"),
+        *_REVENUE_LINE_STAGES,
+    ], allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE)
+    orders = get_collection(Order).aggregate([
+        {"$match": order_query},
+        {"$sort": {"created_at": 1}},
+        _order_lines(),
+        _tag_lines("order"),
+        *_REVENUE_LINE_STAGES,
+    ], allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE)
+    return _merge_by_date(health_records, orders)
+
+
+async def _merge_by_date(*streams) -> AsyncIterator[dict]:
+    """Merge row streams that are each ordered by "date" (missing dates first, as MongoDB sorts them)."""
+    heap = []
+
+    async def pull(i):
+        try:
+            row = await streams[i].__anext__()
+        except StopAsyncIteration:
+            return
+        date = row.get("date")
+        # `i` breaks ties, so rows themselves are never compared
+        heapq.heappush(heap, (date is not None, date if date is not None else 0, i, row))
+
+    for i in range(len(streams)):
+        await pull(i)
+    while heap:
+        *_, i, row = heapq.heappop(heap)
+        yield row
+        await pull(i)
+
+
+def export_orders(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[str] = None,
+) -> AsyncIterator[dict]:
+    """One row per order item (orders without items yield a single row)."""
+    query = _date_range("created_at", start_date, end_date)
+    if status:
+        query["status"] = status
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"created_at": 1}},
+        {"$unwind": {"path": "$items", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 0,
+            "order_id": {"$toString": "$_id"},
+            "created_at": 1,
+            "user_email": 1,
+            "user_name": 1,
+            "status": 1,
+            "order_total": "$total",
+            "product_id": "$items.product_id",
+            "product_name": "$items.name",
+            "unit_price": "$items.unit_price",
+            "quantity": "$items.quantity",
+            "subtotal": "$items.subtotal",
+        }},
+    ]
+    return get_collection(Order).aggregate(
+        pipeline, allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE
+    )
+
+
+def export_health_records(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> AsyncIterator[dict]:
+    """One row per health record; used products/services are kept as lists.
+
+    Pet name / owner are resolved with one `$in` query per batch of records.
+    """
+    cursor = get_collection(HealthRecord).find(
+        _date_range("date", start_date, end_date),
+        projection={
+            "pet": 1, "record_type": 1, "date": 1, "description": 1, "notes": 1,
+            "next_due_date": 1, "weight_kg": 1, "used_products": 1, "used_services": 1,
+        },
+        batch_size=EXPORT_BATCH_SIZE,
+    ).sort("date", 1)
+    return _health_record_rows(cursor)
+
+
+async def _health_record_rows(cursor) -> AsyncIterator[dict]:
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            for row in await _health_record_batch(batch):
+                yield row
+            batch = []
+    if batch:
+        for row in await _health_record_batch(batch):
+            yield row
+
+
+async def _health_record_batch(docs: list) -> list:
+    pets = await crud_pet.get_pets_for(docs, projection={"name": 1, "owner_email": 1})
+    return [_health_record_row(doc, pets) for doc in docs]
+
+
+def _health_record_row(doc: dict, pets: dict) -> dict:
+    pet_id = crud_pet.pet_id_of(doc)
+    pet = pets.get(str(pet_id)) if pet_id else None
+    return {
+        "record_id": str(doc["_id"]),
+        "pet_id": str(pet_id) if pet_id else None,
+        "pet_name": pet.get("name") if pet else None,
+        "owner_email": pet.get("owner_email") if pet else None,
+        "record_type": doc.get("record_type"),
+        "date": doc.get("date"),
+        "description": doc.get("description"),
+        "notes": doc.get("notes"),
+        "next_due_date": doc.get("next_due_date"),
+        "weight_kg": doc.get("weight_kg"),
+        "used_products": doc.get("used_products") or [],
+        "used_services": doc.get("used_services") or [],
+    }
@@ -7,8 +7,9 @@ from app.schemas.health_record import HealthRecordCreate
 from app.schemas.health_record import HealthRecordUpdate
 from app.models.product import Product
 from bson import ObjectId
-from app.core.config import settings
-import motor.motor_asyncio
+from app.services import dashboard_snapshot
+from app.crud import crud_dashboard_counter, crud_pet, crud_revenue_rollup, loaders, pagination
+from app.db.database import get_collection, run_in_transaction
 
 
 async def create_health_record_for_pet(
@@ -19,19 +20,7 @@ async def create_health_record_for_pet(
     Tạo một bản ghi y tế mới cho một thú cưng cụ thể.
     """
     # Nếu có sản phẩm được sử dụng, cố gắng giảm tồn kho trước khi tạo record.
-    # Obtain a motor collection for the Product model. Beanie's API changed across
-    # versions so attempt available helpers then fallback to creating a client.
-    if hasattr(Product, 'get_motor_collection'):
-        motor_coll = Product.get_motor_collection()
-    elif hasattr(Product, 'get_collection'):
-        motor_coll = Product.get_collection()
-    else:
-        client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
-        try:
-            coll_name = Product.Settings.name
-        except Exception:
-            coll_name = Product.__name__.lower() + 's'
-        motor_coll = client[settings.DATABASE_NAME][coll_name]
+    motor_coll = get_collection(Product)
 
     decremented = []  # keep track to rollback if needed
 
@@ -49,13 +38,24 @@ async def create_health_record_for_pet(
                     # Not enough stock or product not found
                     raise ValueError(f"Insufficient stock for product {up.product_id}")
                 decremented.append((pid, q))
+                # stock changed underneath any Product instance of this request
+                loaders.forget(Product, pid)
 
         # Nếu đến đây, các cập nhật tồn kho thành công - tạo HealthRecord
         record = HealthRecord(
             **record_in.dict(),
-            pet=pet
+            pet=pet,
+            **crud_pet.pet_snapshot(pet)
         )
-        await record.insert()
+
+        # Record và revenue rollup được ghi trong cùng một transaction
+        async def _insert(session):
+            await record.insert(session=session)
+            await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.health_record_deltas(record), session=session)
+
+        await run_in_transaction(_insert)
+        await crud_dashboard_counter.apply_change([], crud_dashboard_counter.health_record_counter_keys(record))
+        dashboard_snapshot.mark_dirty()
         return record
     except Exception:
         # rollback any decremented stock
@@ -78,15 +78,23 @@ async def get_health_records_for_pet(pet_id: PydanticObjectId) -> List[HealthRec
     return records 
 
 
-async def get_health_records_for_pet_owner(pet_id: PydanticObjectId, owner_email: str) -> List[HealthRecord]:
+async def get_health_records_for_pet_owner(
+    pet_id: PydanticObjectId,
+    owner_email: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> tuple[List[HealthRecord], Optional[str]]:
     """
-    Lấy health records cho một pet chỉ khi pet thuộc về owner_email.
+    Lấy health records cho một pet chỉ khi pet thuộc về owner_email, theo ngày.
+
+    Quyền sở hữu được kiểm tra bằng `owner_email` sao chép trên record, trong
+    cùng truy vấn. Trả về (records, next_cursor).
     """
-    pet = await Pet.get(pet_id)
-    if not pet or getattr(pet, 'owner_email', None) != owner_email:
-        return []
-    records = await HealthRecord.find({"pet.$id": pet_id}).to_list()
-    return records
+    return await pagination.find_page(
+        HealthRecord, {"owner_email": owner_email, "pet.$id": pet_id}, skip=skip, limit=limit, cursor=cursor,
+        sort_field="date",
+    )
 
 async def get_health_record_by_id(record_id: PydanticObjectId) -> Optional[HealthRecord]:
     """
@@ -102,14 +110,32 @@ async def update_health_record(
     Cập nhật thông tin một bản ghi y tế.
     """
     update_data = record_in.dict(exclude_unset=True)
+    counter_keys_before = crud_dashboard_counter.health_record_counter_keys(record)
+    revenue_before = crud_revenue_rollup.health_record_deltas(record)
     for field, value in update_data.items():
         setattr(record, field, value)
-    await record.save()
+
+    # Changing the date moves the record's revenue to another rollup day
+    revenue_change = crud_revenue_rollup.health_record_deltas(record).merge(revenue_before, sign=-1)
+
+    async def _save(session):
+        await record.save(session=session)
+        await crud_revenue_rollup.apply_deltas(revenue_change, session=session)
+
+    await run_in_transaction(_save)
+    await crud_dashboard_counter.apply_change(counter_keys_before, crud_dashboard_counter.health_record_counter_keys(record))
+    dashboard_snapshot.mark_dirty()
     return record 
 
 async def delete_health_record(record: HealthRecord) -> None:
     """
     Xóa một bản ghi y tế khỏi database.
     """
-    await record.delete()
+    async def _delete(session):
+        await record.delete(session=session)
+        await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.health_record_deltas(record).negated(), session=session)
+
+    await run_in_transaction(_delete)
+    await crud_dashboard_counter.apply_change(crud_dashboard_counter.health_record_counter_keys(record), [])
+    dashboard_snapshot.mark_dirty()
     return None
\ No newline at end of file
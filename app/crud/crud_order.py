@@ -0,0 +1,92 @@
+"""Order status transitions.
+
+A transition is one conditional `find_one_and_update` on the order (e.g.
+"set cancelled where status != cancelled"), so of two concurrent requests
+only the one whose update matched moves the order in / out of the revenue
+rollup and restocks its items. The update, the rollup delta and the restock
+share one transaction (see `run_in_transaction`).
+"""
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.crud import crud_revenue_rollup, loaders
+from app.db.database import get_collection, run_in_transaction
+from app.models.order import Order
+from app.models.product import Product
+
+CANCELLED = "cancelled"
+
+
+def _field(obj, name, default=None):
+    return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+
+async def _restock(order: dict, session=None) -> Tuple[int, List[str]]:
+    """Put the items of `order` back in stock. Returns (units restocked, missing product ids)."""
+    coll = get_collection(Product)
+    restocked = 0
+    missing = []
+    for it in order.get("items") or []:
+        pid = _field(it, "product_id")
+        qty = int(_field(it, "quantity", 0) or 0)
+        if not pid or qty <= 0:
+            continue
+        try:
+            key = ObjectId(str(pid))
+        except Exception:
+            # ids that are not ObjectIds are matched as stored
+            key = pid
+        res = await coll.update_one({"_id": key}, {"$inc": {"stock_quantity": qty}}, session=session)
+        if res.matched_count:
+            restocked += qty
+            loaders.forget(Product, key)
+        else:
+            missing.append(str(pid))
+    return restocked, missing
+
+
+async def cancel_order(order_id, from_status: Optional[str] = None) -> Optional[Tuple[int, List[str]]]:
+    """Cancel an order and restock its items.
+
+    Applies only while the order is not cancelled yet (or, with
+    `from_status`, only while it is in that status). Returns
+    (units restocked, missing product ids), or None when the order was not
+    in a cancellable state (already cancelled, or cancelled concurrently).
+    """
+    condition = {"_id": order_id, "status": from_status if from_status else {"$ne": CANCELLED}}
+
+    async def _cancel(session):
+        before = await get_collection(Order).find_one_and_update(
+            condition, {"$set": {"status": CANCELLED}}, session=session,
+        )
+        if before is None:
+            return None
+        await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.order_deltas(before).negated(), session=session)
+        return await _restock(before, session=session)
+
+    result = await run_in_transaction(_cancel)
+    loaders.forget(Order, order_id)
+    return result
+
+
+async def set_order_status(order_id, status: str) -> bool:
+    """Set an order's status; moves it out of / back into the revenue rollup
+    when it becomes / stops being cancelled. False if it already had `status`."""
+    async def _set(session):
+        before = await get_collection(Order).find_one_and_update(
+            {"_id": order_id, "status": {"$ne": status}}, {"$set": {"status": status}}, session=session,
+        )
+        if before is None:
+            return False
+        was_cancelled = str(before.get("status") or "").lower() == CANCELLED
+        is_cancelled = status.lower() == CANCELLED
+        if is_cancelled and not was_cancelled:
+            await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.order_deltas(before).negated(), session=session)
+        elif was_cancelled and not is_cancelled:
+            await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.order_deltas(before), session=session)
+        return True
+
+    changed = await run_in_transaction(_set)
+    loaders.forget(Order, order_id)
+    return changed
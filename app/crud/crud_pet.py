@@ -1,8 +1,41 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
 import datetime
 import logging
+from bson import ObjectId
+from pymongo import UpdateMany
+from app.core import search_keys
+from app.models.health_record import HealthRecord
 from app.models.pet import Pet
+from app.models.scheduled_event import ScheduledEvent
 from app.schemas.pet import PetCreate, PetUpdate
+from app.services import dashboard_snapshot
+from app.crud import crud_dashboard_counter
+from app.crud import crud_search_keys, loaders, pagination
+from app.db.database import get_collection
+
+# Namespace khóa tìm kiếm -> trường của Pet
+PET_SEARCH_FIELDS = {"o": "owner_name", "s": "species", "n": "name", "b": "breed"}
+# Admin tìm theo chủ nuôi / loài, portal tìm theo tên / giống
+ADMIN_SEARCH_NAMESPACES = ("o", "s")
+OWNER_SEARCH_NAMESPACES = ("n", "b")
+# Trường pet cần cho các danh sách sự kiện / hồ sơ (tên, chủ nuôi)
+PET_SUMMARY_PROJECTION = {"name": 1, "species": 1, "owner_name": 1, "owner_email": 1}
+# Bản sao trên scheduled_events / health_records -> trường của Pet
+PET_SNAPSHOT_FIELDS = {
+    "owner_email": "owner_email",
+    "owner_name": "owner_name",
+    "pet_name": "name",
+    "pet_species": "species",
+}
+PET_SNAPSHOT_MODELS = (ScheduledEvent, HealthRecord)
+PET_SNAPSHOT_BATCH_SIZE = 500
+
+
+def pet_search_keys(pet) -> List[str]:
+    """Search keys of a Pet (or raw pet document)."""
+    return search_keys.document_keys(pet, PET_SEARCH_FIELDS)
+
 
 async def create_pet(pet_in: PetCreate) -> Pet:
     """
@@ -10,9 +43,14 @@ async def create_pet(pet_in: PetCreate) -> Pet:
     """
     # Tạo một đối tượng Pet model từ dữ liệu schema PetCreate
     pet = Pet(**pet_in.dict())
+    pet.search_keys = pet_search_keys(pet)
     
     # Dùng Beanie để lưu vào MongoDB
     await pet.insert()
+    loaders.prime(pet)
+    pagination.invalidate_counts(Pet)
+    await crud_dashboard_counter.apply_change([], crud_dashboard_counter.pet_counter_keys(pet))
+    dashboard_snapshot.mark_dirty()
     return pet
 
 async def get_all_pets(
@@ -27,18 +65,8 @@ async def get_all_pets(
     
     # Nếu có tham số search, thêm điều kiện lọc vào câu truy vấn
     if search:
-        # Sử dụng regex để tìm kiếm không phân biệt hoa thường
-        # Sử dụng regex để tìm kiếm không phân biệt hoa thường
-        # Tìm theo 'owner_name' (tên chủ nuôi) hoặc 'species' (loài)
-        search_regex = {"$regex": search, "$options": "i"}
-        query = Pet.find(
-            {
-                "$or": [
-                    {"owner_name": search_regex},
-                    {"species": search_regex},
-                ]
-            }
-        )
+        # Tìm theo 'owner_name' (tên chủ nuôi) hoặc 'species' (loài) qua search_keys (có index)
+        query = Pet.find(search_keys.search_filter(search, ADMIN_SEARCH_NAMESPACES))
         
     pets = await query.skip(skip).limit(limit).to_list()
     return pets
@@ -46,41 +74,139 @@ async def get_all_pets(
 async def get_all_pets_with_count(
     skip: int = 0, 
     limit: int = 100,
-    search: Optional[str] = None
-) -> tuple[List[Pet], int]:
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[List[Pet], int, Optional[str]]:
     """
     Lấy danh sách thú cưng với tổng số lượng cho phân trang.
+
+    Có `cursor` (lấy từ `next_cursor` của trang trước) thì phân trang theo
+    keyset trên `_id` và bỏ qua `skip`. Trả về (pets, total, next_cursor).
     """
-    query = Pet.find_all()
-    
+    filters = {}
     if search:
-        # Search by owner name or species (loài)
-        search_regex = {"$regex": search, "$options": "i"}
-        query = Pet.find(
-            {
-                "$or": [
-                    {"owner_name": search_regex},
-                    {"species": search_regex},
-                ]
-            }
-        )
-    
-    # Lấy tổng số
-    total = await query.count()
+        # Search by owner name or species (loài), word prefixes via search_keys
+        filters = search_keys.search_filter(search, ADMIN_SEARCH_NAMESPACES)
     
-    # Lấy data với phân trang
-    pets = await query.skip(skip).limit(limit).to_list()
+    # Trang + tổng số trong một lần truy vấn (tổng được cache ngắn hạn)
+    pets, total, next_cursor = await pagination.find_page_with_total(Pet, filters, skip=skip, limit=limit, cursor=cursor)
     
-    return pets, total
+    return pets, total, next_cursor
 
 async def get_pet_by_id(pet_id: str) -> Optional[Pet]:
     """ 
     Lấy thông tin một thú cưng theo ID.
     """
-    pet = await Pet.get(pet_id)
+    pet = await loaders.get(Pet, pet_id)
     return pet
 
 
+def pet_snapshot(pet) -> dict:
+    """Pet fields copied onto its events and health records when they are written."""
+    get = pet.get if isinstance(pet, dict) else (lambda name: getattr(pet, name, None))
+    return {field: get(source) for field, source in PET_SNAPSHOT_FIELDS.items()}
+
+
+async def sync_pet_snapshot(pet_id, snapshot: dict) -> None:
+    """Rewrite the pet copy on every event / health record of `pet_id` (owner change, rename)."""
+    await asyncio.gather(*(
+        get_collection(model).update_many({"pet.$id": pet_id}, {"$set": snapshot})
+        for model in PET_SNAPSHOT_MODELS
+    ))
+
+
+async def rebuild_pet_snapshots(filters: Optional[dict] = None) -> int:
+    """
+    Backfill owner_email / owner_name / pet_name / pet_species trên events và
+    health records của các pet khớp `filters` (mặc định: tất cả). Chỉ ghi các
+    document còn lệch (kể cả thiếu field); trả về số document đã được cập nhật.
+    """
+    projection = {source: 1 for source in PET_SNAPSHOT_FIELDS.values()}
+    updated = 0
+    ops = []
+
+    async def flush():
+        nonlocal ops, updated
+        if ops:
+            results = await asyncio.gather(*(
+                get_collection(model).bulk_write(ops, ordered=False) for model in PET_SNAPSHOT_MODELS
+            ))
+            updated += sum(r.modified_count for r in results)
+            ops = []
+
+    async for doc in get_collection(Pet).find(filters or {}, projection=projection):
+        snapshot = pet_snapshot(doc)
+        # `$ne: None` does not match a missing field, hence the `$exists` clauses
+        stale = {"$or": [{field: {"$ne": value}} for field, value in snapshot.items()]
+                 + [{field: {"$exists": False}} for field in snapshot]}
+        ops.append(UpdateMany({"pet.$id": doc["_id"], **stale}, {"$set": snapshot}))
+        if len(ops) >= PET_SNAPSHOT_BATCH_SIZE:
+            await flush()
+    await flush()
+    return updated
+
+
+async def ensure_pet_snapshots() -> None:
+    """Backfill the pet copies on start when events / health records predate them.
+
+    The owner portal lists events and health records by the copied
+    owner_email only, so documents without it would not be listed.
+    """
+    missing = {"$or": [{field: {"$exists": False}} for field in PET_SNAPSHOT_FIELDS]}
+    for model in PET_SNAPSHOT_MODELS:
+        if await get_collection(model).find_one(missing, projection={"_id": 1}) is not None:
+            break
+    else:
+        return
+    updated = await rebuild_pet_snapshots()
+    print(f"Pet snapshots backfilled: {updated} events / health records")
+
+
+def pet_id_of(doc):
+    """
+    Id của pet mà một event / health record trỏ tới.
+
+    `doc.pet` có thể là Beanie Link, Pet đã fetch, DBRef hoặc dict thô.
+    """
+    ref = doc.get("pet") if isinstance(doc, dict) else getattr(doc, "pet", None)
+    if ref is None:
+        return None
+    if hasattr(ref, "ref"):
+        return getattr(ref.ref, "id", None)
+    if isinstance(ref, dict):
+        return ref.get("$id") or ref.get("_id") or ref.get("id")
+    return getattr(ref, "id", None)
+
+
+async def get_pets_by_ids(pet_ids: Iterable, projection: Optional[dict] = None) -> Dict[str, dict]:
+    """
+    Tải nhiều pet bằng một truy vấn `$in` có projection.
+
+    Trả về {str(pet_id): raw pet document}; id không hợp lệ hoặc pet đã bị
+    xóa thì không có trong kết quả.
+    """
+    ids: Dict[str, ObjectId] = {}
+    for pid in pet_ids:
+        if pid is None or str(pid) in ids:
+            continue
+        try:
+            ids[str(pid)] = ObjectId(str(pid))
+        except Exception:
+            continue
+    if not ids:
+        return {}
+    cursor = get_collection(Pet).find(
+        {"_id": {"$in": list(ids.values())}},
+        projection=projection or PET_SUMMARY_PROJECTION,
+    )
+    return {str(doc["_id"]): doc async for doc in cursor}
+
+
+async def get_pets_for(docs: Iterable, projection: Optional[dict] = None) -> Dict[str, dict]:
+    """Pets referenced by a page of events / health records, keyed like `get_pets_by_ids`."""
+    return await get_pets_by_ids((pet_id_of(doc) for doc in docs), projection)
+
+
 async def get_pets_for_owner(
     owner_email: str,
     skip: int = 0,
@@ -93,8 +219,8 @@ async def get_pets_for_owner(
     """
     query = Pet.find({"owner_email": owner_email})
     if search:
-        search_regex = {"$regex": search, "$options": "i"}
-        query = Pet.find({"owner_email": owner_email, "$or": [{"name": search_regex}, {"breed": search_regex}]})
+        # Tìm theo tên / giống qua search_keys
+        query = Pet.find({"owner_email": owner_email, **search_keys.search_filter(search, OWNER_SEARCH_NAMESPACES)})
     total = await query.count()
     pets = await query.skip(skip).limit(limit).to_list()
     return pets, total
@@ -109,23 +235,75 @@ async def create_pet_for_owner(owner_email: str, owner_name: str, pet_in: PetCre
     pet_data.pop('owner_email', None)
     pet_data.pop('owner_name', None)
     pet = Pet(**pet_data, owner_email=owner_email, owner_name=owner_name)
+    pet.search_keys = pet_search_keys(pet)
     await pet.insert()
+    loaders.prime(pet)
+    pagination.invalidate_counts(Pet)
+    await crud_dashboard_counter.apply_change([], crud_dashboard_counter.pet_counter_keys(pet))
+    dashboard_snapshot.mark_dirty()
     return pet
 
 
+def _object_ids(pet_ids: Iterable) -> List[ObjectId]:
+    ids = []
+    for pid in pet_ids:
+        try:
+            ids.append(ObjectId(str(pid)))
+        except Exception:
+            # invalid ids are simply not owned
+            continue
+    return ids
+
+
+async def owns_pet(pet_id, owner_email: str) -> bool:
+    """
+    Pet có thuộc về owner_email không.
+
+    Chỉ một `find_one({_id, owner_email}, projection={_id: 1})`, không tải và
+    không dựng Pet; dùng khi endpoint chỉ cần kiểm tra quyền sở hữu.
+    """
+    ids = _object_ids([pet_id])
+    if not ids or not owner_email:
+        return False
+    doc = await get_collection(Pet).find_one({"_id": ids[0], "owner_email": owner_email}, projection={"_id": 1})
+    return doc is not None
+
+
+async def owns_pets(pet_ids: Iterable, owner_email: str) -> Set[str]:
+    """
+    Những id (dạng str) trong `pet_ids` thuộc về owner_email, kiểm tra bằng
+    một truy vấn `$in` chỉ lấy `_id`.
+    """
+    ids = _object_ids(pet_ids)
+    if not ids or not owner_email:
+        return set()
+    cursor = get_collection(Pet).find(
+        {"_id": {"$in": ids}, "owner_email": owner_email}, projection={"_id": 1}
+    )
+    return {str(doc["_id"]) async for doc in cursor}
+
+
 async def get_pet_by_id_for_owner(pet_id: str, owner_email: str) -> Optional[Pet]:
-    pet = await Pet.get(pet_id)
-    if not pet:
-        return None
-    if getattr(pet, 'owner_email', None) != owner_email:
+    """
+    Pet theo ID nếu nó thuộc về owner_email, ngược lại None.
+
+    Quyền sở hữu được kiểm tra bằng `owns_pet` (chỉ lấy `_id`), nên pet của
+    người khác không bao giờ được tải về; pet được tải qua identity map của
+    request (`loaders.get`).
+    """
+    if not await owns_pet(pet_id, owner_email):
         return None
-    return pet
+    return await loaders.get(Pet, pet_id)
+
+
 async def update_pet(pet: Pet, pet_in: PetUpdate) -> Pet:
     """
     Cập nhật thông tin một thú cưng.
     """
     # Lấy dữ liệu cần update, chỉ lấy các trường được cung cấp
     update_data = pet_in.dict(exclude_unset=True)
+    counter_keys_before = crud_dashboard_counter.pet_counter_keys(pet)
+    snapshot_before = pet_snapshot(pet)
 
     # Normalize types coming from frontend: convert strings to proper types
     logger = logging.getLogger("app.crud.pet")
@@ -158,6 +336,7 @@ async def update_pet(pet: Pet, pet_in: PetUpdate) -> Pet:
             setattr(pet, field, value.isoformat())
         else:
             setattr(pet, field, value)
+    pet.search_keys = pet_search_keys(pet)
 
     # Lưu lại vào database - catch and log encoding errors for debugging
     try:
@@ -165,6 +344,12 @@ async def update_pet(pet: Pet, pet_in: PetUpdate) -> Pet:
     except Exception as e:
         logger.exception("Failed to save pet %s after update; update_data=%s", getattr(pet, 'id', '<unknown>'), update_data)
         raise
+    await crud_dashboard_counter.apply_change(counter_keys_before, crud_dashboard_counter.pet_counter_keys(pet))
+    snapshot = pet_snapshot(pet)
+    if snapshot != snapshot_before:
+        # Đổi tên / loài / chủ: cập nhật bản sao trên events và health records
+        await sync_pet_snapshot(pet.id, snapshot)
+    dashboard_snapshot.mark_dirty()
     return pet 
 # Hàm xóa pet
 async def delete_pet(pet: Pet) -> None:
@@ -172,6 +357,10 @@ async def delete_pet(pet: Pet) -> None:
     Xóa một hồ sơ thú cưng khỏi database.
     """
     await pet.delete()
+    loaders.forget(Pet, pet.id)
+    pagination.invalidate_counts(Pet)
+    await crud_dashboard_counter.apply_change(crud_dashboard_counter.pet_counter_keys(pet), [])
+    dashboard_snapshot.mark_dirty()
     return None
 
 
@@ -182,7 +371,7 @@ async def cleanup_placeholder_strings() -> dict:
     This is intended as an admin maintenance utility to fix bad seed data.
     """
     # We'll use raw motor collection operations for bulk updates
-    coll = Pet.get_motor_collection()
+    coll = get_collection(Pet)
     # Fields we want to clean and their replacement logic
     fields_to_clean = [
         ('name', ''),
@@ -195,6 +384,13 @@ async def cleanup_placeholder_strings() -> dict:
         ('avatar_url', None),
     ]
 
+    # Pets whose searchable fields are about to change (their search_keys are rebuilt below)
+    cleaned_ids = [
+        doc['_id'] async for doc in coll.find(
+            {'$or': [{field: 'string'} for field in PET_SEARCH_FIELDS.values()]}, projection={'_id': 1}
+        )
+    ]
+
     total_updated = 0
     details = {}
     for field, replacement in fields_to_clean:
@@ -204,4 +400,25 @@ async def cleanup_placeholder_strings() -> dict:
         details[field] = result.modified_count
         total_updated += result.modified_count
 
+    if details.get('species'):
+        # Cleaned species fall out of the 'string' bucket (empty species are not counted)
+        await crud_dashboard_counter.apply_change(
+            [(crud_dashboard_counter.PETS_BY_SPECIES, 'string')] * details['species'], []
+        )
+    if total_updated:
+        # name/species/breed/owner_name may have changed underneath the search keys
+        await rebuild_search_keys({'_id': {'$in': cleaned_ids}})
+        await rebuild_pet_snapshots({'_id': {'$in': cleaned_ids}})
+        for pet_id in cleaned_ids:
+            loaders.forget(Pet, pet_id)
+        dashboard_snapshot.mark_dirty()
     return {'total_updated': total_updated, 'per_field': details}
+
+
+async def rebuild_search_keys(filters: Optional[dict] = None) -> int:
+    """
+    Tính lại search_keys cho các pet khớp `filters` (mặc định: tất cả).
+    Dùng cho backfill (scripts/backfill_search_keys.py) và sau các
+    update_many không đi qua update_pet. Trả về số pet đã được cập nhật.
+    """
+    return await crud_search_keys.rebuild(Pet, PET_SEARCH_FIELDS, filters)
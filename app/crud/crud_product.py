@@ -1,15 +1,106 @@
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
 from beanie import PydanticObjectId
+from bson import ObjectId
+from app.core import search_keys
+from app.core.config import settings
+from app.crud import crud_search_keys, loaders, pagination
+from app.db.database import get_collection
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductUpdate
 
+
+class _ProductNameCache:
+    """Size-bounded LRU of product id (str) -> product name."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._names: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, product_id: str) -> Optional[str]:
+        name = self._names.get(product_id)
+        if name is not None:
+            self._names.move_to_end(product_id)
+        return name
+
+    def put(self, product_id: str, name: str) -> None:
+        self._names[product_id] = name
+        self._names.move_to_end(product_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    def invalidate(self, product_id: str) -> None:
+        self._names.pop(product_id, None)
+
+
+_product_names = _ProductNameCache(max_size=settings.PRODUCT_NAME_CACHE_SIZE)
+
+# Namespace khóa tìm kiếm -> trường của Product
+PRODUCT_SEARCH_FIELDS = {"n": "name"}
+
+
+async def resolve_product_names(product_ids: Iterable) -> Dict[str, str]:
+    """
+    Map product ids to product names.
+
+    Cached names are served from the in-process LRU; all misses are fetched
+    with one projected `$in` query. Ids that are invalid or whose product no
+    longer exists map to the id itself.
+    """
+    names: Dict[str, str] = {}
+    missing: Dict[str, ObjectId] = {}
+    for pid in product_ids:
+        if pid is None:
+            continue
+        key = str(pid)
+        if key in names or key in missing:
+            continue
+        cached = _product_names.get(key)
+        if cached is not None:
+            names[key] = cached
+            continue
+        try:
+            missing[key] = ObjectId(key)
+        except Exception:
+            names[key] = key
+
+    if missing:
+        cursor = get_collection(Product).find(
+            {"_id": {"$in": list(missing.values())}},
+            projection={"name": 1},
+        )
+        async for doc in cursor:
+            key = str(doc["_id"])
+            name = doc.get("name") or key
+            _product_names.put(key, name)
+            names[key] = name
+        for key in missing:
+            names.setdefault(key, key)
+    return names
+
+
+def invalidate_product_name(product_id) -> None:
+    _product_names.invalidate(str(product_id))
+
+
+def product_search_keys(product) -> List[str]:
+    return search_keys.document_keys(product, PRODUCT_SEARCH_FIELDS)
+
+
+async def rebuild_search_keys(filters: Optional[dict] = None) -> int:
+    return await crud_search_keys.rebuild(Product, PRODUCT_SEARCH_FIELDS, filters)
+
+
 async def create_product(product_in: ProductCreate) -> Product:
     product = Product(**product_in.dict())
+    product.search_keys = product_search_keys(product)
     await product.insert()
+    loaders.prime(product)
+    pagination.invalidate_counts(Product)
     return product
 
 async def get_product(product_id: PydanticObjectId) -> Optional[Product]:
-    return await Product.get(product_id)
+    return await loaders.get(Product, product_id)
 
 async def get_multi_products(skip: int = 0, limit: int = 100) -> List[Product]:
     return await Product.find_all().skip(skip).limit(limit).to_list()
@@ -17,32 +108,36 @@ async def get_multi_products(skip: int = 0, limit: int = 100) -> List[Product]:
 async def get_all_products_with_count(
     skip: int = 0, 
     limit: int = 100,
-    search: Optional[str] = None
-) -> tuple[List[Product], int]:
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[List[Product], int, Optional[str]]:
     """
     Lấy danh sách sản phẩm với tổng số lượng cho phân trang.
+
+    `cursor` bật phân trang keyset (xem `pagination.find_page`).
+    Trả về (products, total, next_cursor).
     """
-    query = Product.find_all()
-    
+    filters = {}
     if search:
-        # Tìm kiếm không phân biệt hoa thường trong tên sản phẩm
-        search_regex = {"$regex": search, "$options": "i"}
-        query = Product.find({"name": search_regex})
+        # Tìm theo tiền tố các từ trong tên, không phân biệt hoa thường / dấu
+        filters = search_keys.search_filter(search, PRODUCT_SEARCH_FIELDS)
         
-    # Lấy tổng số
-    total = await query.count()
-    
-    # Lấy data với phân trang
-    products = await query.skip(skip).limit(limit).to_list()
+    # Trang + tổng số trong một lần truy vấn (tổng được cache ngắn hạn)
+    products, total, next_cursor = await pagination.find_page_with_total(Product, filters, skip=skip, limit=limit, cursor=cursor)
     
-    return products, total
+    return products, total, next_cursor
 
 async def update_product(product: Product, product_in: ProductUpdate) -> Product:
     update_data = product_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
+    product.search_keys = product_search_keys(product)
     await product.save()
+    invalidate_product_name(product.id)
     return product
 
 async def delete_product(product: Product) -> None:
-    await product.delete()
\ No newline at end of file
+    await product.delete()
+    loaders.forget(Product, product.id)
+    pagination.invalidate_counts(Product)
+    invalidate_product_name(product.id)
\ No newline at end of file
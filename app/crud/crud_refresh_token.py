@@ -0,0 +1,82 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.db.database import get_collection
+from app.models.refresh_token import RefreshToken
+
+
+def _hash(raw_token: str) -> str:
+    # Refresh tokens are 256-bit random values, a fast hash is enough
+    return hashlib.sha256(raw_token.encode("utf-8")).hexdigest()
+
+
+async def issue(user_email: str, family: Optional[str] = None) -> str:
+    """
+    Tạo refresh token mới cho user, trả về giá trị gốc (chỉ lưu hash).
+    """
+    raw = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await RefreshToken(
+        token_hash=_hash(raw),
+        user_email=user_email,
+        family=family or secrets.token_hex(8),
+        created_at=now,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ).insert()
+    return raw
+
+
+async def rotate(raw_token: str) -> Optional[Tuple[str, str]]:
+    """
+    Đổi refresh token lấy token mới.
+
+    Trả về (user_email, new_raw_token), hoặc None nếu token không hợp lệ,
+    đã hết hạn hoặc đã bị dùng. Token đã dùng mà bị gửi lại => thu hồi cả
+    family.
+    """
+    now = datetime.now(timezone.utc)
+    token_hash = _hash(raw_token)
+    coll = get_collection(RefreshToken)
+    # Atomically consume the token: only one concurrent refresh can win
+    doc = await coll.find_one_and_update(
+        {"token_hash": token_hash, "revoked_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"revoked_at": now}},
+        projection={"user_email": 1, "family": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if doc is None:
+        reused = await coll.find_one(
+            {"token_hash": token_hash, "revoked_at": {"$ne": None}},
+            projection={"family": 1},
+        )
+        if reused is not None:
+            print(f"[refresh_token] reuse detected, revoking family {reused['family']}")
+            await coll.update_many(
+                {"family": reused["family"], "revoked_at": None},
+                {"$set": {"revoked_at": now}},
+            )
+        return None
+    new_raw = await issue(doc["user_email"], family=doc["family"])
+    return doc["user_email"], new_raw
+
+
+async def revoke(raw_token: str) -> None:
+    await get_collection(RefreshToken).update_one(
+        {"token_hash": _hash(raw_token), "revoked_at": None},
+        {"$set": {"revoked_at": datetime.now(timezone.utc)}},
+    )
+
+
+async def revoke_user(user_email: str) -> None:
+    """
+    Thu hồi mọi refresh token của user (khi đổi mật khẩu, đổi quyền, bị khóa hoặc bị xóa).
+    """
+    await get_collection(RefreshToken).update_many(
+        {"user_email": user_email, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.now(timezone.utc)}},
+    )
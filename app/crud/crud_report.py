@@ -0,0 +1,310 @@
+"""Report computations executed inside MongoDB.
+
+The revenue report is answered from the `revenue_daily` rollup for every
+whole day in the requested range. Partial days at the edges of the range
+(and ranges shorter than a day) use the raw aggregation: one pipeline over
+`health_records` that pulls in `orders` with `$unionWith`, flattens every
+document into "revenue lines" and computes totals, breakdowns and the time
+series with one `$facet`.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from app.crud import crud_product
+from app.core.singleflight import single_flight
+from app.core.timing import timed, timed_await
+from app.db.database import get_collection
+from app.models.health_record import HealthRecord
+from app.models.order import Order
+from app.models.revenue_daily import RevenueDaily
+
+# Line kinds produced by the flattening stages
+LINE_RECORD = "record"          # one per health record, used for records_count
+LINE_PRODUCT = "product"        # used_products entry of a health record
+LINE_SERVICE = "service"        # used_services entry of a health record
+LINE_ORDER = "order"            # order total (counts towards revenue)
+LINE_ORDER_ITEM = "order_item"  # order item (product breakdown only)
+
+REVENUE_LINES = [LINE_PRODUCT, LINE_SERVICE, LINE_ORDER]
+PRODUCT_LINES = [LINE_PRODUCT, LINE_ORDER_ITEM]
+
+# group_by -> ($dateTrunc unit, $dateToString format of the period label)
+PERIODS = {
+    "day": ("day", "%Y-%m-%d"),
+    "week": ("week", "%G-W%V"),  # ISO week: YYYY-Www
+    "month": ("month", "%Y-%m"),
+    "year": ("year", "%Y"),
+}
+
+
+def _date_range(
+    field: str,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    end_exclusive: bool = False,
+) -> dict:
+    query = {}
+    if start_date:
+        query[field] = {"$gte": start_date}
+    if end_date:
+        query.setdefault(field, {})["$lt" if end_exclusive else "$lte"] = end_date
+    return query
+
+
+def _line(kind: str, key, qty, amount, at: str) -> dict:
+    # `ref` is the id of the source document (health record or order)
+    return {"kind": kind, "key": key, "qty": qty, "amount": amount, "at": at, "ref": "$_id"}
+
+
+def _health_record_lines() -> dict:
+    """$project stage turning a health record into its revenue lines."""
+    return {"$project": {"_id": 0, "lines": {"$concatArrays": [
+        [_line(LINE_RECORD, None, 0, 0, "$date")],
+        {"$map": {
+            "input": {"$ifNull": ["$used_products", []]},
+            "as": "up",
+            "in": _line(
+                LINE_PRODUCT,
+                {"$toString": "$$up.product_id"},
+                "$$up.quantity",
+                {"$multiply": ["$$up.quantity", "$$up.unit_price"]},
+                "$date",
+            ),
+        }},
+        {"$map": {
+            "input": {"$ifNull": ["$used_services", []]},
+            "as": "us",
+            "in": _line(LINE_SERVICE, "$$us.name", 1, "$$us.price", "$date"),
+        }},
+    ]}}}
+
+
+def _order_lines() -> dict:
+    """$project stage turning an order into its revenue lines."""
+    return {"$project": {"_id": 0, "lines": {"$concatArrays": [
+        [_line(LINE_ORDER, None, 0, {"$ifNull": ["$total", 0]}, "$created_at")],
+        {"$map": {
+            "input": {"$ifNull": ["$items", []]},
+            "as": "it",
+            "in": _line(
+                LINE_ORDER_ITEM,
+                {"$toString": "$$it.product_id"},
+                "$$it.quantity",
+                "$$it.subtotal",
+                "$created_at",
+            ),
+        }},
+    ]}}}
+
+
+def _period_stages(group_by: str, date_field: str) -> List[dict]:
+    """$group/$sort/$project stages bucketing `revenue` by period label."""
+    # Unknown group_by values fall back to daily buckets
+    unit, fmt = PERIODS.get(group_by, PERIODS["day"])
+    trunc = {"date": date_field, "unit": unit}
+    if unit == "week":
+        trunc["startOfWeek"] = "monday"
+    return [
+        {"$group": {"_id": {"$dateTrunc": trunc}, "revenue": {"$sum": "$revenue"}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "period": {"$dateToString": {"format": fmt, "date": "$_id"}}, "revenue": 1}},
+    ]
+
+
+def _series_facet(group_by: str) -> List[dict]:
+    return [
+        {"$match": {"kind": {"$in": REVENUE_LINES}, "at": {"$ne": None}}},
+        {"$set": {"revenue": "$amount"}},
+        *_period_stages(group_by, "$at"),
+    ]
+
+
+def build_revenue_pipeline(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    group_by: Optional[str] = None,
+    end_exclusive: bool = False,
+) -> List[dict]:
+    """Aggregation over health_records (+ orders via $unionWith) for the revenue report."""
+    order_query = _date_range("created_at", start_date, end_date, end_exclusive)
+    # exclude cancelled orders
+    order_query["status"] = {"$ne": "cancelled"}
+
+    facets = {
+        "totals": [
+            {"$group": {
+                "_id": None,
+                "revenue": {"$sum": {"$cond": [{"$in": ["$kind", REVENUE_LINES]}, "$amount", 0]}},
+                "records": {"$sum": {"$cond": [{"$eq": ["$kind", LINE_RECORD]}, 1, 0]}},
+            }},
+        ],
+        "by_product": [
+            {"$match": {"kind": {"$in": PRODUCT_LINES}, "key": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$key", "quantity": {"$sum": "$qty"}, "revenue": {"$sum": "$amount"}}},
+        ],
+        "by_service": [
+            {"$match": {"kind": LINE_SERVICE, "key": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$key", "count": {"$sum": 1}, "revenue": {"$sum": "$amount"}}},
+        ],
+    }
+    if group_by:
+        facets["series"] = _series_facet(group_by)
+
+    return [
+        {"$match": _date_range("date", start_date, end_date, end_exclusive)},
+        _health_record_lines(),
+        {"$unionWith": {"coll": Order.Settings.name, "pipeline": [
+            {"$match": order_query},
+            _order_lines(),
+        ]}},
+        {"$unwind": "$lines"},
+        {"$replaceRoot": {"newRoot": "$lines"}},
+        {"$facet": facets},
+    ]
+
+
+def build_rollup_pipeline(
+    first_day: Optional[datetime] = None,
+    end_day: Optional[datetime] = None,
+    group_by: Optional[str] = None,
+) -> List[dict]:
+    """Aggregation over revenue_daily for the days in [first_day, end_day)."""
+    total_rows = {"product_id": "", "service": ""}
+    facets = {
+        "totals": [
+            {"$match": total_rows},
+            {"$group": {"_id": None, "revenue": {"$sum": "$revenue"}, "records": {"$sum": "$records"}}},
+        ],
+        "by_product": [
+            {"$match": {"product_id": {"$ne": ""}}},
+            {"$group": {"_id": "$product_id", "quantity": {"$sum": "$quantity"}, "revenue": {"$sum": "$revenue"}}},
+        ],
+        "by_service": [
+            {"$match": {"service": {"$ne": ""}}},
+            {"$group": {"_id": "$service", "count": {"$sum": "$uses"}, "revenue": {"$sum": "$revenue"}}},
+        ],
+    }
+    if group_by:
+        facets["series"] = [{"$match": total_rows}, *_period_stages(group_by, "$day")]
+    return [
+        {"$match": _date_range("day", first_day, end_day, end_exclusive=True)},
+        {"$facet": facets},
+    ]
+
+
+def _to_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """Normalize to naive UTC, matching how dates are stored."""
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _floor_day(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _split_range(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Tuple[Optional[Tuple[Optional[datetime], Optional[datetime]]], List[Tuple[datetime, datetime, bool]]]:
+    """Split [start_date, end_date] into whole rollup days and raw edge segments.
+
+    Returns ((first_day, end_day) or None, [(start, end, end_exclusive), ...]).
+    """
+    first_day = None
+    if start_date is not None:
+        first_day = _floor_day(start_date)
+        if first_day < start_date:
+            first_day += timedelta(days=1)
+    end_day = None
+    if end_date is not None:
+        # A day is whole if its last millisecond is still <= end_date
+        end_day = _floor_day(end_date + timedelta(milliseconds=1))
+
+    if first_day is not None and end_day is not None and first_day >= end_day:
+        return None, [(start_date, end_date, False)]
+
+    edges = []
+    if start_date is not None and start_date < first_day:
+        edges.append((start_date, first_day, True))
+    if end_date is not None and end_day <= end_date:
+        edges.append((end_day, end_date, False))
+    return (first_day, end_day), edges
+
+
+def _partial_from_facets(result: dict) -> dict:
+    totals = (result.get("totals") or [{}])[0]
+    return {
+        "revenue": float(totals.get("revenue") or 0.0),
+        "records": int(totals.get("records") or 0),
+        "by_product": {
+            r["_id"]: {"quantity": int(r.get("quantity") or 0), "revenue": float(r.get("revenue") or 0.0)}
+            for r in result.get("by_product", [])
+        },
+        "by_service": {
+            r["_id"]: {"count": int(r.get("count") or 0), "revenue": float(r.get("revenue") or 0.0)}
+            for r in result.get("by_service", [])
+        },
+        "series": {r["period"]: float(r.get("revenue") or 0.0) for r in result.get("series", [])},
+    }
+
+
+async def _aggregate_partial(model, pipeline: List[dict]) -> dict:
+    rows = await get_collection(model).aggregate(pipeline).to_list(length=1)
+    return _partial_from_facets(rows[0] if rows else {})
+
+
+def _merge_partials(partials: List[dict]) -> dict:
+    merged = {"revenue": 0.0, "records": 0, "by_product": {}, "by_service": {}, "series": {}}
+    for part in partials:
+        merged["revenue"] += part["revenue"]
+        merged["records"] += part["records"]
+        for section in ("by_product", "by_service"):
+            for key, values in part[section].items():
+                target = merged[section].setdefault(key, {name: 0 for name in values})
+                for name, value in values.items():
+                    target[name] += value
+        for period, revenue in part["series"].items():
+            merged["series"][period] = merged["series"].get(period, 0.0) + revenue
+    return merged
+
+
+@single_flight()
+@timed("revenue")
+async def compute_revenue_report(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    group_by: Optional[str] = None,
+) -> dict:
+    """Revenue summary from used_products, used_services and non-cancelled orders."""
+    start_date, end_date = _to_utc(start_date), _to_utc(end_date)
+    whole_days, edges = _split_range(start_date, end_date)
+
+    tasks = []
+    if whole_days is not None:
+        tasks.append(timed_await("revenue.rollup", _aggregate_partial(
+            RevenueDaily, build_rollup_pipeline(*whole_days, group_by=group_by),
+        )))
+    for seg_start, seg_end, end_exclusive in edges:
+        tasks.append(timed_await("revenue.raw", _aggregate_partial(
+            HealthRecord,
+            build_revenue_pipeline(seg_start, seg_end, group_by, end_exclusive=end_exclusive),
+        )))
+    merged = _merge_partials(await asyncio.gather(*tasks))
+
+    series = None
+    if group_by:
+        # Period labels are zero-padded, so lexical order is chronological
+        series = [{"period": k, "revenue": merged["series"][k]} for k in sorted(merged["series"])]
+
+    with timed("revenue.names"):
+        products = await crud_product.resolve_product_names(merged["by_product"].keys())
+
+    return {
+        "total_revenue": merged["revenue"],
+        "by_product": {products.get(k, k): v for k, v in merged["by_product"].items()},
+        "by_service": merged["by_service"],
+        "records_count": merged["records"],
+        "series": series,
+    }
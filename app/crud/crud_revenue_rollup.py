@@ -0,0 +1,216 @@
+"""Maintenance of the `revenue_daily` rollup collection.
+
+Write paths that change revenue (health records, orders and their
+cancellation) turn the document into rollup deltas with
+`health_record_deltas` / `order_deltas` and apply them with `apply_deltas`,
+inside the same transaction as the source write (see
+`app.db.database.run_in_transaction`).
+
+`rebuild_rollup()` recomputes the collection from the raw history with the
+same line-flattening stages the live revenue report uses, so both paths
+agree on what counts as revenue.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.crud.crud_report import (
+    LINE_ORDER,
+    LINE_RECORD,
+    LINE_SERVICE,
+    PRODUCT_LINES,
+    REVENUE_LINES,
+    _health_record_lines,
+    _order_lines,
+)
+from app.db.database import get_collection
+from app.models.health_record import HealthRecord
+from app.models.order import Order
+from app.models.revenue_daily import RevenueDaily
+
+RollupKey = Tuple[datetime, str, str]  # (day, product_id, service)
+METRICS = ("quantity", "uses", "revenue", "records", "orders")
+
+
+def day_of(dt: Optional[datetime]) -> Optional[datetime]:
+    """UTC midnight of `dt` as a naive datetime (how pymongo returns dates)."""
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _field(obj, name, default=None):
+    return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+
+class RollupDeltas:
+    """Accumulates per-row metric increments before they are written."""
+
+    def __init__(self):
+        self.rows: Dict[RollupKey, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def add(self, key: RollupKey, **metrics) -> None:
+        for name, value in metrics.items():
+            self.rows[key][name] += value or 0
+
+    def merge(self, other: "RollupDeltas", sign: int = 1) -> "RollupDeltas":
+        for key, metrics in other.rows.items():
+            self.add(key, **{name: sign * value for name, value in metrics.items()})
+        return self
+
+    def negated(self) -> "RollupDeltas":
+        return RollupDeltas().merge(self, sign=-1)
+
+    def updates(self) -> Iterable[UpdateOne]:
+        for (day, product_id, service), metrics in self.rows.items():
+            inc = {}
+            for name, value in metrics.items():
+                if not value:
+                    continue
+                inc[name] = float(value) if name == "revenue" else int(value)
+            if inc:
+                yield UpdateOne(
+                    {"day": day, "product_id": product_id, "service": service},
+                    {"$inc": inc},
+                    upsert=True,
+                )
+
+
+def health_record_deltas(record: HealthRecord) -> RollupDeltas:
+    deltas = RollupDeltas()
+    day = day_of(getattr(record, "date", None))
+    if day is None:
+        return deltas
+    deltas.add((day, "", ""), records=1)
+    for up in getattr(record, "used_products", None) or []:
+        qty = int(_field(up, "quantity", 0) or 0)
+        amount = qty * float(_field(up, "unit_price", 0.0) or 0.0)
+        deltas.add((day, "", ""), revenue=amount)
+        pid = str(_field(up, "product_id", "") or "")
+        if pid:
+            deltas.add((day, pid, ""), quantity=qty, revenue=amount)
+    for us in getattr(record, "used_services", None) or []:
+        price = float(_field(us, "price", 0.0) or 0.0)
+        deltas.add((day, "", ""), revenue=price)
+        name = str(_field(us, "name", "") or "")
+        if name:
+            deltas.add((day, "", name), uses=1, revenue=price)
+    return deltas
+
+
+def order_deltas(order) -> RollupDeltas:
+    """Rollup contribution of an order (model instance or raw document)."""
+    deltas = RollupDeltas()
+    day = day_of(_field(order, "created_at"))
+    if day is None:
+        return deltas
+    deltas.add((day, "", ""), orders=1, revenue=float(_field(order, "total", 0.0) or 0.0))
+    for it in _field(order, "items") or []:
+        pid = str(_field(it, "product_id", "") or "")
+        if pid:
+            deltas.add(
+                (day, pid, ""),
+                quantity=int(_field(it, "quantity", 0) or 0),
+                revenue=float(_field(it, "subtotal", 0.0) or 0.0),
+            )
+    return deltas
+
+
+async def apply_deltas(deltas: RollupDeltas, session=None) -> None:
+    ops = list(deltas.updates())
+    if ops:
+        await get_collection(RevenueDaily).bulk_write(ops, ordered=False, session=session)
+
+
+def _rollup_rows_stages() -> list:
+    """Stages turning flattened revenue lines into revenue_daily rows."""
+    # Lines without a key only count towards the day total row
+    has_key = {"$gt": [{"$strLenCP": {"$ifNull": ["$key", ""]}}, 0]}
+    is_product = {"$and": [{"$in": ["$kind", PRODUCT_LINES]}, has_key]}
+    is_service = {"$and": [{"$eq": ["$kind", LINE_SERVICE]}, has_key]}
+    return [
+        {"$unwind": "$lines"},
+        {"$replaceRoot": {"newRoot": "$lines"}},
+        {"$match": {"at": {"$ne": None}}},
+        {"$set": {"day": {"$dateTrunc": {"date": "$at", "unit": "day"}}}},
+        # Every line feeds the day total row and (if any) its product/service row
+        {"$project": {"rows": [
+            {
+                "day": "$day", "product_id": "", "service": "",
+                "quantity": 0, "uses": 0,
+                "revenue": {"$cond": [{"$in": ["$kind", REVENUE_LINES]}, "$amount", 0]},
+                "records": {"$cond": [{"$eq": ["$kind", LINE_RECORD]}, 1, 0]},
+                "orders": {"$cond": [{"$eq": ["$kind", LINE_ORDER]}, 1, 0]},
+            },
+            {
+                "day": "$day",
+                "product_id": {"$cond": [is_product, "$key", ""]},
+                "service": {"$cond": [is_service, "$key", ""]},
+                "quantity": {"$cond": [is_product, "$qty", 0]},
+                "uses": {"$cond": [is_service, 1, 0]},
+                "revenue": {"$cond": [{"$or": [is_product, is_service]}, "$amount", 0]},
+                "records": 0,
+                "orders": 0,
+            },
+        ]}},
+        {"$unwind": "$rows"},
+        {"$replaceRoot": {"newRoot": "$rows"}},
+        {"$group": {
+            "_id": {"day": "$day", "product_id": "$product_id", "service": "$service"},
+            **{name: {"$sum": f"${name}"} for name in METRICS},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "product_id": "$_id.product_id",
+            "service": "$_id.service",
+            **{name: 1 for name in METRICS},
+        }},
+        {"$merge": {
+            "into": RevenueDaily.Settings.name,
+            "on": ["day", "product_id", "service"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def rebuild_rollup() -> int:
+    """Recompute revenue_daily from all health records and non-cancelled orders.
+
+    Returns the number of rollup rows. Revenue written while the rebuild runs
+    may be counted twice or not at all; run it during a quiet period.
+    """
+    coll = get_collection(RevenueDaily)
+    await coll.delete_many({})
+    pipeline = [
+        _health_record_lines(),
+        {"$unionWith": {"coll": Order.Settings.name, "pipeline": [
+            {"$match": {"status": {"$ne": "cancelled"}}},
+            _order_lines(),
+        ]}},
+        *_rollup_rows_stages(),
+    ]
+    await get_collection(HealthRecord).aggregate(pipeline).to_list(length=None)
+    return await coll.count_documents({})
+
+
+async def ensure_rollup() -> None:
+    """Backfill the rollup on first start (empty collection, existing history).
+
+    Also rebuilds a rollup written before the service `count` metric was
+    renamed to `uses`.
+    """
+    coll = get_collection(RevenueDaily)
+    if await coll.find_one({}, projection={"_id": 1}) is not None \
+            and await coll.find_one({"count": {"$exists": True}}, projection={"_id": 1}) is None:
+        return
+    if await get_collection(HealthRecord).find_one({}, projection={"_id": 1}) is None \
+            and await get_collection(Order).find_one({}, projection={"_id": 1}) is None:
+        return
+    rows = await rebuild_rollup()
+    print(f"Revenue rollup built: {rows} rows")
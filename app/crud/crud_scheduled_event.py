@@ -5,6 +5,8 @@ from app.models.pet import Pet
 from app.models.scheduled_event import ScheduledEvent
 from app.schemas.scheduled_event import ScheduledEventCreate
 import pytz
+from app.services import dashboard_snapshot
+from app.crud import crud_pet, loaders, pagination
 
 
 async def create_event_for_pet(
@@ -16,18 +18,43 @@ async def create_event_for_pet(
     """
     event = ScheduledEvent(
         **event_in.dict(),
-        pet=pet
+        pet=pet,
+        **crud_pet.pet_snapshot(pet)
     )
     await event.insert()
+    pagination.invalidate_counts(ScheduledEvent)
+    dashboard_snapshot.mark_dirty()
     return event
 
 
+async def update_event(event: ScheduledEvent, event_in: ScheduledEventCreate) -> ScheduledEvent:
+    """
+    Cập nhật toàn bộ các trường của một sự kiện.
+    """
+    for field, value in event_in.dict().items():
+        setattr(event, field, value)
+    await event.save()
+    dashboard_snapshot.mark_dirty()
+    return event
+
+
+async def delete_event(event: ScheduledEvent) -> None:
+    """
+    Xóa một sự kiện khỏi database.
+    """
+    await event.delete()
+    pagination.invalidate_counts(ScheduledEvent)
+    dashboard_snapshot.mark_dirty()
+    return None
+
+
 async def create_event_for_pet_owner(pet_id, owner_email: str, event_in: ScheduledEventCreate) -> ScheduledEvent:
     """
     Convenience wrapper that ensures the pet belongs to owner_email then creates the event.
     Applies portal-specific business rules: lead time, business hours, no-sunday, and conflict checks.
     """
-    pet = await Pet.get(pet_id)
+    # Same instance the endpoint (or an earlier step of the request) loaded
+    pet = await loaders.get(Pet, pet_id)
     if not pet or getattr(pet, 'owner_email', None) != owner_email:
         raise ValueError("Pet not found or does not belong to owner")
 
@@ -48,67 +75,73 @@ async def create_event_for_pet_owner(pet_id, owner_email: str, event_in: Schedul
     return await create_event_for_pet(pet=pet, event_in=event_in)
 
 
-async def get_events_for_owner(owner_email: str) -> List[ScheduledEvent]:
+async def get_events_for_owner(
+    owner_email: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> tuple[List[ScheduledEvent], Optional[str]]:
     """
-    Lấy tất cả sự kiện liên quan đến các thú cưng thuộc owner_email.
+    Lấy sự kiện của các thú cưng thuộc owner_email, theo thời gian.
+
+    Một truy vấn trên `owner_email` (được sao chép lên event) thay vì tải
+    danh sách pet trước. Trả về (events, next_cursor).
     """
-    pets = await Pet.find({"owner_email": owner_email}).to_list()
-    pet_ids = [p.id for p in pets]
-    if not pet_ids:
-        return []
-    events = await ScheduledEvent.find({"pet.$id": {"$in": pet_ids}}).to_list()
-    return events
+    return await pagination.find_page(
+        ScheduledEvent, {"owner_email": owner_email}, skip=skip, limit=limit, cursor=cursor,
+        sort_field="event_datetime",
+    )
 
 async def get_upcoming_events_with_count(
     skip: int = 0, 
     limit: int = 100,
-    search: Optional[str] = None
-) -> tuple[List[ScheduledEvent], int]:
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[List[ScheduledEvent], int, Optional[str]]:
     """
     Lấy danh sách tất cả các sự kiện chưa hoàn thành và sắp diễn ra trong tương lai,
-    sắp xếp theo thời gian gần nhất trước. Trả về (events, total_count)
+    sắp xếp theo thời gian gần nhất trước. Trả về (events, total_count, next_cursor);
+    `cursor` bật phân trang keyset trên (event_datetime, _id).
     """
     # Lấy thời gian hiện tại theo múi giờ UTC để so sánh
     now = datetime.now(timezone.utc)
     
     # Query cơ bản
-    query = ScheduledEvent.find(
-        ScheduledEvent.is_completed == False,
-        ScheduledEvent.event_datetime >= now
-    )
+    filters = {"is_completed": False, "event_datetime": {"$gte": now}}
     
     # Thêm điều kiện search nếu có
     if search:
-        query = query.find({"title": {"$regex": search, "$options": "i"}})
+        filters["title"] = {"$regex": search, "$options": "i"}
     
-    # Đếm tổng số events thỏa mãn điều kiện
-    total = await query.count()
-    
-    # Lấy events với pagination
-    events = await query.sort(+ScheduledEvent.event_datetime).skip(skip).limit(limit).to_list()
+    # Lấy events với pagination + tổng số (filter chứa `now` nên cache theo search)
+    events, total, next_cursor = await pagination.find_page_with_total(
+        ScheduledEvent, filters, skip=skip, limit=limit, cursor=cursor, sort_field="event_datetime",
+        count_key=("upcoming", search),
+    )
     
-    return events, total
+    return events, total, next_cursor
 
 
 async def get_past_events_with_count(
     skip: int = 0,
     limit: int = 100,
-    search: Optional[str] = None
-) -> tuple[List[ScheduledEvent], int]:
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[List[ScheduledEvent], int, Optional[str]]:
     """
-    Lấy danh sách các sự kiện đã diễn ra (event_datetime < now).
-    Trả về (events, total_count)
+    Lấy danh sách các sự kiện đã diễn ra (event_datetime < now), mới nhất trước.
+    Trả về (events, total_count, next_cursor)
     """
     now = datetime.now(timezone.utc)
 
     # Query events strictly in the past
-    query = ScheduledEvent.find(
-        ScheduledEvent.event_datetime < now
-    )
+    filters = {"event_datetime": {"$lt": now}}
 
     if search:
-        query = query.find({"title": {"$regex": search, "$options": "i"}})
+        filters["title"] = {"$regex": search, "$options": "i"}
 
-    total = await query.count()
-    events = await query.sort(-ScheduledEvent.event_datetime).skip(skip).limit(limit).to_list()
-    return events, total
\ No newline at end of file
+    events, total, next_cursor = await pagination.find_page_with_total(
+        ScheduledEvent, filters, skip=skip, limit=limit, cursor=cursor,
+        sort_field="event_datetime", descending=True, count_key=("past", search),
+    )
+    return events, total, next_cursor
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""Backfill / repair of the `search_keys` field (see app.core.search_keys).
+
+Regular writes set the keys in the model's CRUD create/update functions;
+`rebuild` recomputes them for documents written some other way (bulk
+`update_many`, data imported before the field existed, a changed folding
+rule). `ensure_search_keys` runs on start and fills in documents that have
+no keys at all.
+"""
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+from app.core import search_keys
+from app.db.database import get_collection
+
+REBUILD_BATCH_SIZE = 500
+
+
+async def rebuild(model, fields: Dict[str, str], filters: Optional[dict] = None) -> int:
+    """Recompute search_keys of the `model` documents matching `filters` (default: all).
+
+    `fields` maps namespace -> field name as used by the model's CRUD module.
+    Only documents whose keys changed are written; returns their number.
+    """
+    coll = get_collection(model)
+    projection = {field: 1 for field in fields.values()}
+    projection[search_keys.SEARCH_KEYS_FIELD] = 1
+    updated = 0
+    ops = []
+    async for doc in coll.find(filters or {}, projection=projection):
+        keys = search_keys.document_keys(doc, fields)
+        if doc.get(search_keys.SEARCH_KEYS_FIELD) != keys:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {search_keys.SEARCH_KEYS_FIELD: keys}}))
+        if len(ops) >= REBUILD_BATCH_SIZE:
+            updated += (await coll.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await coll.bulk_write(ops, ordered=False)).modified_count
+    return updated
+
+
+async def ensure_search_keys() -> None:
+    """Compute search_keys on start for documents that predate the field.
+
+    Searches match on search_keys only, so such documents would never be
+    found. Documents that already have keys are left alone (use
+    scripts/backfill_search_keys.py after changing the key format).
+    """
+    # Imported lazily: these CRUD modules import this one
+    from app.crud import crud_pet, crud_product, crud_service, crud_user
+
+    missing = {search_keys.SEARCH_KEYS_FIELD: {"$exists": False}}
+    for label, rebuild_keys in (
+        ("pets", crud_pet.rebuild_search_keys),
+        ("users", crud_user.rebuild_search_keys),
+        ("products", crud_product.rebuild_search_keys),
+        ("services", crud_service.rebuild_search_keys),
+    ):
+        updated = await rebuild_keys(missing)
+        if updated:
+            print(f"search_keys backfilled for {updated} {label}")
@@ -1,17 +1,33 @@
 from typing import List, Optional
 from beanie import PydanticObjectId
+from app.core import search_keys
 from app.models.service import Service
+from app.crud import crud_search_keys, loaders, pagination
 from app.schemas.service import ServiceCreate, ServiceUpdate
 
+# Namespace khóa tìm kiếm -> trường của Service
+SERVICE_SEARCH_FIELDS = {"n": "name"}
+
+
+def service_search_keys(service) -> List[str]:
+    return search_keys.document_keys(service, SERVICE_SEARCH_FIELDS)
+
+
+async def rebuild_search_keys(filters: Optional[dict] = None) -> int:
+    return await crud_search_keys.rebuild(Service, SERVICE_SEARCH_FIELDS, filters)
+
 
 async def create_service(service_in: ServiceCreate) -> Service:
     svc = Service(**service_in.dict())
+    svc.search_keys = service_search_keys(svc)
     await svc.insert()
+    loaders.prime(svc)
+    pagination.invalidate_counts(Service)
     return svc
 
 
 async def get_service(service_id: PydanticObjectId) -> Optional[Service]:
-    return await Service.get(service_id)
+    return await loaders.get(Service, service_id)
 
 
 async def get_multi_services(skip: int = 0, limit: int = 100) -> List[Service]:
@@ -20,35 +36,37 @@ async def get_multi_services(skip: int = 0, limit: int = 100) -> List[Service]:
 async def get_all_services_with_count(
     skip: int = 0, 
     limit: int = 100,
-    search: Optional[str] = None
-) -> tuple[List[Service], int]:
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
+) -> tuple[List[Service], int, Optional[str]]:
     """
     Lấy danh sách dịch vụ với tổng số lượng cho phân trang.
+
+    `cursor` bật phân trang keyset (xem `pagination.find_page`).
+    Trả về (services, total, next_cursor).
     """
-    query = Service.find_all()
-    
+    filters = {}
     if search:
-        # Tìm kiếm không phân biệt hoa thường trong tên dịch vụ
-        search_regex = {"$regex": search, "$options": "i"}
-        query = Service.find({"name": search_regex})
+        # Tìm theo tiền tố các từ trong tên, không phân biệt hoa thường / dấu
+        filters = search_keys.search_filter(search, SERVICE_SEARCH_FIELDS)
         
-    # Lấy tổng số
-    total = await query.count()
-    
-    # Lấy data với phân trang
-    services = await query.skip(skip).limit(limit).to_list()
+    # Trang + tổng số trong một lần truy vấn (tổng được cache ngắn hạn)
+    services, total, next_cursor = await pagination.find_page_with_total(Service, filters, skip=skip, limit=limit, cursor=cursor)
     
-    return services, total
+    return services, total, next_cursor
 
 
 async def update_service(service: Service, service_in: ServiceUpdate) -> Service:
     update_data = service_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(service, field, value)
+    service.search_keys = service_search_keys(service)
     await service.save()
     return service
 
 
 async def delete_service(service: Service) -> None:
     await service.delete()
+    loaders.forget(Service, service.id)
+    pagination.invalidate_counts(Service)
     return None
@@ -1,8 +1,101 @@
-from typing import Optional
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from app.core import search_keys
+from app.core.config import settings
+from app.crud import crud_search_keys
 # Import thêm UserRole từ model
 from app.models.user import User, UserRole
 from app.schemas.user import UserCreate
-from app.services.security import get_password_hash
+from app.services.security import get_password_hash_async
+
+class _UserCache:
+    """Size-bounded LRU of email -> User with a per-entry TTL.
+
+    Used by the auth path so a bearer token does not cost one `users` query
+    per request. Entries are dropped by `invalidate_user` whenever a user
+    is changed or deleted; the TTL bounds staleness for any other writer.
+
+    The cache keeps its own copy and hands out a fresh copy on every hit:
+    endpoints mutate `current_user` before saving it, and a change that is
+    never saved (or fails to save) must not leak into other requests.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._users: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, email: str) -> Optional[User]:
+        entry = self._users.get(email)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._users[email]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._users.move_to_end(email)
+        self.hits += 1
+        return user.model_copy(deep=True)
+
+    def put(self, email: str, user: User) -> None:
+        self._users[email] = (time.monotonic() + self.ttl_seconds, user.model_copy(deep=True))
+        self._users.move_to_end(email)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, email: str) -> None:
+        self._users.pop(email, None)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+_user_cache = _UserCache(
+    max_size=settings.USER_CACHE_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
+
+# Namespace khóa tìm kiếm -> trường của User
+USER_SEARCH_FIELDS = {"e": "email", "n": "full_name"}
+
+
+def user_search_keys(user) -> List[str]:
+    """Khóa tìm kiếm; gọi lại trước khi lưu mỗi khi email / full_name đổi."""
+    return search_keys.document_keys(user, USER_SEARCH_FIELDS)
+
+
+async def rebuild_search_keys(filters: Optional[dict] = None) -> int:
+    return await crud_search_keys.rebuild(User, USER_SEARCH_FIELDS, filters)
+
+
+def search_users_filter(search: Optional[str]) -> dict:
+    """Filter cho tìm kiếm user theo email / họ tên (không phân biệt dấu)."""
+    return search_keys.search_filter(search, USER_SEARCH_FIELDS)
+
 
 async def create_user(user_in: UserCreate, role: UserRole = UserRole.USER) -> User:
     """
@@ -14,12 +107,43 @@ async def create_user(user_in: UserCreate, role: UserRole = UserRole.USER) -> Us
     user = User(
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await get_password_hash_async(user_in.password),
         role=role
     )
+    user.search_keys = user_search_keys(user)
     await user.insert()
     return user
 
 async def get_user_by_email(email: str) -> Optional[User]:
     # ... (giữ nguyên không đổi)
-    return await User.find_one(User.email == email)
\ No newline at end of file
+    return await User.find_one(User.email == email)
+
+async def get_user_by_email_cached(email: str) -> Optional[User]:
+    """
+    Như `get_user_by_email` nhưng đọc qua cache (dùng cho xác thực token).
+
+    Không cache kết quả None để user vừa đăng ký dùng được ngay.
+    """
+    user = _user_cache.get(email)
+    if user is not None:
+        return user
+    user = await get_user_by_email(email)
+    if user is not None:
+        _user_cache.put(email, user)
+    return user
+
+def bump_token_version(user: User) -> None:
+    """
+    Thu hồi các access token đã cấp cho user (gọi trước khi `save()`).
+    """
+    user.token_version = (user.token_version or 0) + 1
+    user.token_version_changed_at = datetime.now(timezone.utc)
+
+
+def invalidate_user(email: Optional[str]) -> None:
+    """Gọi sau khi user bị sửa / đổi quyền / khóa / xóa."""
+    if email:
+        _user_cache.invalidate(email)
+
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
\ No newline at end of file
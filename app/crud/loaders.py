@@ -0,0 +1,72 @@
+"""Request-scoped identity map for documents fetched by id.
+
+    pet = await loaders.get(Pet, pet_id)
+
+Inside a request, every `get` of the same id returns the same instance, and
+gets issued concurrently (e.g. under `asyncio.gather`, or `get_many`) are
+answered by one `{_id: {$in: [...]}}` query (see app.core.dataloader).
+Outside a request it is a plain `Model.get`.
+
+Instances are shared within the request, so a document changed and saved
+by one code path is seen changed by the next. Writes that bypass the
+instance (`update_many`, raw Motor updates) or delete it should call
+`forget`.
+"""
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+
+from app.core import dataloader
+
+
+async def _fetch_many(model, keys) -> Dict[str, object]:
+    ids = []
+    for key in keys:
+        try:
+            ids.append(ObjectId(key))
+        except Exception:
+            # invalid ids simply load as None
+            continue
+    if not ids:
+        return {}
+    docs = await model.find({"_id": {"$in": ids}}).to_list()
+    return {str(doc.id): doc for doc in docs}
+
+
+def _loader(model) -> Optional[dataloader.DataLoader]:
+    return dataloader.request_loader(model, lambda keys: _fetch_many(model, keys))
+
+
+async def get(model, doc_id):
+    """`model.get(doc_id)` through the request's identity map; None if missing or invalid."""
+    if doc_id is None:
+        return None
+    loader = _loader(model)
+    if loader is None:
+        return await model.get(doc_id)
+    return await loader.load(str(doc_id))
+
+
+async def get_many(model, doc_ids: Iterable) -> Dict[str, object]:
+    """{str(id): document or None} for `doc_ids`, fetched with at most one query."""
+    keys = [str(doc_id) for doc_id in doc_ids if doc_id is not None]
+    loader = _loader(model)
+    if loader is None:
+        found = await _fetch_many(model, list(dict.fromkeys(keys)))
+        return {key: found.get(key) for key in keys}
+    return await loader.load_many(keys)
+
+
+def prime(doc) -> None:
+    """Make a document that was just inserted / loaded elsewhere the request's instance."""
+    if doc is None or getattr(doc, "id", None) is None:
+        return
+    loader = _loader(type(doc))
+    if loader is not None:
+        loader.prime(str(doc.id), doc)
+
+
+def forget(model, doc_id) -> None:
+    loader = _loader(model)
+    if loader is not None and doc_id is not None:
+        loader.clear(str(doc_id))
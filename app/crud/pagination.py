@@ -0,0 +1,209 @@
+"""Pagination helpers.
+
+Keyset (cursor) pagination: a page is read with
+`{sort_field: {$gt: last_value}}` (or `$lt` for descending) plus `_id` as
+tie-breaker instead of `skip`, so the server only walks the index from the
+last returned document: page N costs the same as page 1. The position is
+handed to clients as an opaque cursor string.
+
+Totals (`find_page_with_total`): unfiltered listings use the collection
+metadata count; filtered ones get page and total from one `$facet`
+aggregation, and the total is then cached for a few seconds per filter so
+paging through the same result set does not recount it.
+"""
+import asyncio
+import base64
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from bson import json_util
+
+from app.core.config import settings
+
+
+class InvalidCursor(ValueError):
+    """Malformed cursor from the client (answered with 400, see app.main)."""
+
+
+def encode_cursor(sort_value: Any, last_id: Any) -> str:
+    raw = json_util.dumps({"v": sort_value, "id": last_id}, json_options=json_util.CANONICAL_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Return (sort_value, last_id); raises InvalidCursor for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        return data["v"], data["id"]
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def sort_spec(sort_field: str = "_id", descending: bool = False) -> List[Tuple[str, int]]:
+    direction = -1 if descending else 1
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def keyset_filter(cursor: Optional[str], sort_field: str = "_id", descending: bool = False) -> dict:
+    """Filter selecting the documents after `cursor` in `sort_spec` order."""
+    if not cursor:
+        return {}
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}},
+    ]}
+
+
+def and_filters(*filters: dict) -> dict:
+    parts = [f for f in filters if f]
+    if not parts:
+        return {}
+    return parts[0] if len(parts) == 1 else {"$and": parts}
+
+
+def next_cursor(items: list, limit: int, sort_field: str = "_id") -> Optional[str]:
+    """Cursor for the page after `items`, or None when this was the last page.
+
+    `items` must have been fetched with `limit + 1`; the extra item (only used
+    to detect that more pages exist) is removed in place.
+    """
+    if limit <= 0 or len(items) <= limit:
+        return None
+    del items[limit:]
+    last = items[-1]
+    value = None if sort_field == "_id" else _value(last, sort_field)
+    return encode_cursor(value, _value(last, "_id"))
+
+
+async def find_page(
+    model,
+    filters: dict,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_field: str = "_id",
+    descending: bool = False,
+) -> Tuple[list, Optional[str]]:
+    """One page of `model` documents matching `filters`, plus the next cursor.
+
+    With a cursor the page starts after it (keyset); without one `skip` is
+    applied as before, in the same order, so both modes can be mixed: the
+    `next_cursor` of a skip-based page continues from that page.
+    """
+    query = model.find(and_filters(filters, keyset_filter(cursor, sort_field, descending)))
+    query = query.sort(sort_spec(sort_field, descending))
+    if not cursor and skip:
+        query = query.skip(skip)
+    # one extra document tells whether another page exists
+    items = await query.limit(limit + 1).to_list()
+    return items, next_cursor(items, limit, sort_field)
+
+
+def _value(item, field: str):
+    if isinstance(item, dict):
+        return item.get(field)
+    if field == "_id":
+        return item.id
+    return getattr(item, field, None)
+
+
+class _CountCache:
+    """Short-lived cache of (collection, filter key) -> total."""
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._totals: Dict[Hashable, Tuple[float, int]] = {}
+
+    def get(self, key: Hashable) -> Optional[int]:
+        entry = self._totals.get(key)
+        if entry is None:
+            return None
+        expires_at, total = entry
+        if expires_at < time.monotonic():
+            self._totals.pop(key, None)
+            return None
+        return total
+
+    def put(self, key: Hashable, total: int) -> None:
+        now = time.monotonic()
+        if len(self._totals) >= self.max_size:
+            self._totals = {k: v for k, v in self._totals.items() if v[0] >= now}
+            if len(self._totals) >= self.max_size:
+                self._totals.clear()
+        self._totals[key] = (now + self.ttl_seconds, total)
+
+    def invalidate(self, collection: str) -> None:
+        for key in [k for k in self._totals if k[0] == collection]:
+            del self._totals[key]
+
+
+_counts = _CountCache(ttl_seconds=settings.LIST_COUNT_CACHE_TTL_SECONDS)
+
+
+def invalidate_counts(model) -> None:
+    """Drop cached totals of a collection (call after inserts / deletes)."""
+    _counts.invalidate(model.Settings.name)
+
+
+async def find_page_with_total(
+    model,
+    filters: dict,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_field: str = "_id",
+    descending: bool = False,
+    count_key: Optional[Hashable] = None,
+) -> Tuple[list, int, Optional[str]]:
+    """`find_page` plus the total number of documents matching `filters`.
+
+    `count_key` identifies the filter in the count cache; pass it when
+    `filters` contains values that change on every call (e.g. `now`).
+    Returns (items, total, next_cursor).
+    """
+    # Imported lazily: app.db.database imports the models, this module must stay light
+    from app.db.database import get_collection
+
+    coll = get_collection(model)
+    if not filters:
+        items, total = await asyncio.gather(
+            find_page(model, filters, skip=skip, limit=limit, cursor=cursor,
+                      sort_field=sort_field, descending=descending),
+            coll.estimated_document_count(),
+        )
+        page, next_page = items
+        return page, total, next_page
+
+    key = (model.Settings.name, count_key if count_key is not None else json_util.dumps(filters, sort_keys=True))
+    total = _counts.get(key)
+    if total is not None:
+        page, next_page = await find_page(model, filters, skip=skip, limit=limit, cursor=cursor,
+                                          sort_field=sort_field, descending=descending)
+        return page, total, next_page
+
+    page_stages: List[dict] = []
+    if cursor:
+        page_stages.append({"$match": keyset_filter(cursor, sort_field, descending)})
+    elif skip:
+        page_stages.append({"$skip": skip})
+    page_stages.append({"$limit": limit + 1})
+    pipeline = [
+        {"$match": filters},
+        # sorting before $facet lets the sort use an index
+        {"$sort": dict(sort_spec(sort_field, descending))},
+        {"$facet": {"page": page_stages, "total": [{"$count": "n"}]}},
+    ]
+    rows = await coll.aggregate(pipeline).to_list(length=1)
+    result = rows[0] if rows else {}
+    total = result["total"][0]["n"] if result.get("total") else 0
+    _counts.put(key, total)
+    page = [model.model_validate(doc) for doc in result.get("page", [])]
+    return page, total, next_cursor(page, limit, sort_field)
@@ -9,7 +9,34 @@ from app.models.product import Product
 from app.models.service import Service
 from app.models.order import Order
 from app.models.cart import Cart
-async def init_db():
+from app.models.dashboard_counter import DashboardCounter
+from app.models.revenue_daily import RevenueDaily
+from app.models.revoked_subject import RevokedSubject
+from app.models.refresh_token import RefreshToken
+
+# Tất cả Document models; init_beanie tạo các index khai báo trong Settings.indexes
+DOCUMENT_MODELS = [
+    User,
+    Pet,
+    HealthRecord,
+    ScheduledEvent,
+    Product,
+    Service,
+    Order,
+    Cart,
+    DashboardCounter,
+    RevenueDaily,
+    RevokedSubject,
+    RefreshToken,
+]
+
+# Client dùng chung, được gán trong init_db()
+client = None
+_supports_transactions = None
+
+
+async def init_db(skip_indexes: bool = False):
+    global client
     # Tạo client kết nối tới MongoDB
     client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
 
@@ -17,14 +44,43 @@ async def init_db():
     # Beanie sẽ dùng các model này để tạo collection trong DB
     await init_beanie(
         database=client[settings.DATABASE_NAME],
-        document_models=[
-            User,
-            Pet,
-            HealthRecord,
-            ScheduledEvent,
-            Product,
-            Service
-            ,Order,
-            Cart
-        ]
-    )
\ No newline at end of file
+        document_models=DOCUMENT_MODELS,
+        skip_indexes=skip_indexes
+    )
+
+
+def get_collection(model):
+    """Collection of a Document model on the shared client.
+
+    This is the client `run_in_transaction` starts its sessions on, so
+    `session=` can be passed to any operation on the returned collection.
+    Beanie 2.0 exposes the collection it was initialised with as
+    `get_pymongo_collection()`.
+    """
+    if hasattr(model, "get_pymongo_collection"):
+        return model.get_pymongo_collection()
+    if client is None:
+        raise RuntimeError("Database is not initialised; call init_db() first")
+    return client[settings.DATABASE_NAME][model.Settings.name]
+
+
+async def supports_transactions() -> bool:
+    """Transactions need a replica set or a sharded cluster (mongos)."""
+    global _supports_transactions
+    if _supports_transactions is None:
+        hello = await client.admin.command("hello")
+        _supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _supports_transactions
+
+
+async def run_in_transaction(callback):
+    """Run `await callback(session)` inside a MongoDB transaction.
+
+    On a standalone server (local development) transactions are not
+    available; the callback then runs with `session=None`.
+    """
+    if not await supports_transactions():
+        return await callback(None)
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            return await callback(session)
\ No newline at end of file
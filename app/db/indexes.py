@@ -0,0 +1,67 @@
+"""Compare declared `Settings.indexes` with the indexes present in MongoDB.
+
+Used by `scripts/index_drift_report.py`. For every registered Document model
+the report lists:
+
+- missing: declared but not present (init_db has not run, or creation failed)
+- undeclared: present in MongoDB but not declared on the model
+- unused: present but with zero accesses in `$indexStats` since the
+  mongod started (counters reset on restart, so read this on a server that
+  has been up for a while)
+"""
+from typing import Dict, List, Tuple
+
+from app.db.database import get_collection
+
+IndexKey = Tuple[Tuple[str, object], ...]
+
+
+def _key(spec) -> IndexKey:
+    if not isinstance(spec, dict):
+        spec = dict(spec)
+    # the server may report 1.0 for an index created with 1
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in spec.items()
+    )
+
+
+def declared_indexes(model) -> Dict[IndexKey, str]:
+    """Declared index key -> name for a model (`_id` is implicit)."""
+    declared = {}
+    for index in getattr(model.Settings, "indexes", None) or []:
+        document = index.document
+        declared[_key(document["key"])] = document["name"]
+    return declared
+
+
+async def collection_drift(model) -> dict:
+    coll = get_collection(model)
+    existing = {
+        _key(info["key"]): name
+        for name, info in (await coll.index_information()).items()
+        if name != "_id_"
+    }
+    accesses = {}
+    try:
+        async for stat in coll.aggregate([{"$indexStats": {}}]):
+            accesses[stat["name"]] = int(stat.get("accesses", {}).get("ops", 0))
+    except Exception as e:
+        # $indexStats needs the clusterMonitor role on managed clusters
+        print(f"[index drift] $indexStats unavailable for {model.Settings.name}: {e}")
+
+    declared = declared_indexes(model)
+    return {
+        "missing": sorted(name for key, name in declared.items() if key not in existing),
+        "undeclared": sorted(name for key, name in existing.items() if key not in declared),
+        "unused": sorted(name for name in existing.values() if accesses.get(name) == 0),
+        "accesses": {name: accesses.get(name) for name in sorted(existing.values())},
+    }
+
+
+async def index_drift_report(models: List = None) -> Dict[str, dict]:
+    """Drift per collection name for `models` (default: all registered models)."""
+    if models is None:
+        from app.db.database import DOCUMENT_MODELS
+        models = DOCUMENT_MODELS
+    return {model.Settings.name: await collection_drift(model) for model in models}
@@ -9,10 +9,18 @@ from app.api.endpoints import order
 from app.api.endpoints import debug
 from app.api.endpoints import meta
 from app.services.scheduler_jobs import check_upcoming_events, check_low_stock_and_notify
+from app.crud.crud_dashboard_counter import ensure_counters
+from app.crud.crud_pet import ensure_pet_snapshots
+from app.crud.crud_revenue_rollup import ensure_rollup
+from app.crud.crud_search_keys import ensure_search_keys
+from app.services.token_revocation import refresh_revocations
+from app.services.security import PasswordHashBusy
+from app.crud.pagination import InvalidCursor
+from app.core.config import settings
 from apscheduler.schedulers.asyncio import AsyncIOScheduler 
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
-from app.api.middleware import AuthMiddleware
+from app.api.middleware import AuthMiddleware, DataLoaderMiddleware, TimingMiddleware
 import shutil
 import uuid
 import os
@@ -21,11 +29,22 @@ scheduler = AsyncIOScheduler()
 async def lifespan(app: FastAPI):
     # Khởi tạo DB
     await init_db()
+    # Build dashboard distribution counters on first start
+    await ensure_counters()
+    # Backfill the daily revenue rollup on first start
+    await ensure_rollup()
+    # Copy owner / pet fields onto events and health records created before they existed
+    await ensure_pet_snapshots()
+    # Search matches on search_keys only: fill them in for older documents
+    await ensure_search_keys()
+    # Load revoked / deactivated token subjects before serving requests
+    await refresh_revocations()
     
     # Thêm job vào scheduler và bắt đầu
     scheduler.add_job(check_upcoming_events, "interval", minutes=1) # Chạy job mỗi 1 phút
     # Low-stock check once per day
     scheduler.add_job(check_low_stock_and_notify, "interval", hours=24)
+    scheduler.add_job(refresh_revocations, "interval", seconds=settings.TOKEN_REVOCATION_REFRESH_SECONDS)
     scheduler.start()
     print("Database connection established and scheduler started.")
     
@@ -36,8 +55,12 @@ async def lifespan(app: FastAPI):
     print("Closing database connection and shutting down scheduler.")
 
 app = FastAPI(lifespan=lifespan)
-# Add authentication middleware to populate `request.state.user` from Bearer tokens
+# Add authentication middleware: exposes a lazy user resolver as `request.state.auth`
 app.add_middleware(AuthMiddleware)
+# Request-scoped identity map / batching loaders (app.crud.loaders)
+app.add_middleware(DataLoaderMiddleware)
+# Per-stage timings in the Server-Timing header (wraps auth too)
+app.add_middleware(TimingMiddleware)
 api_router_v1 = APIRouter(prefix="/api/v1")
 
 # Create uploads directory if it doesn't exist
@@ -91,6 +114,7 @@ app.add_middleware(
     allow_credentials=True,      # Cho phép gửi cookie/authorization headers
     allow_methods=["*"],         # Cho phép tất cả các phương thức (GET, POST, etc.)
     allow_headers=["*"],         # Cho phép tất cả các header
+    expose_headers=["X-Next-Cursor"],  # keyset cursor of GET /orders
 )
 
 # Ensure unhandled exceptions still return a JSON response with CORS headers so the
@@ -99,6 +123,21 @@ from fastapi.responses import JSONResponse
 import traceback
 
 
+@app.exception_handler(PasswordHashBusy)
+async def password_hash_busy_handler(request, exc: PasswordHashBusy):
+    # register / password change while the Argon2 pool is saturated
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(request, exc):
     # Log full traceback to console for debugging
@@ -3,6 +3,7 @@ from pydantic import Field
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from pymongo import ASCENDING, IndexModel
 
 
 class CartItem(BaseModel):
@@ -20,3 +21,6 @@ class Cart(Document):
 
     class Settings:
         name = "carts"
+        indexes = [
+            IndexModel([("user_id", ASCENDING)]),
+        ]
@@ -0,0 +1,22 @@
+# /app/models/dashboard_counter.py
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class DashboardCounter(Document):
+    """One bucket of a dashboard distribution (e.g. metric="pets_by_species", key="Dog").
+
+    Maintained with atomic `$inc` deltas by the CRUD write paths; see
+    `app.crud.crud_dashboard_counter`.
+    """
+    metric: str
+    key: str
+    # not `count`: that would shadow Document.count()
+    value: int = Field(default=0)
+
+    class Settings:
+        name = "dashboard_counters"
+        indexes = [
+            IndexModel([("metric", ASCENDING), ("key", ASCENDING)], unique=True),
+        ]
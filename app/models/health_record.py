@@ -5,6 +5,7 @@ from pydantic import Field, BaseModel
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+from pymongo import ASCENDING, IndexModel
 from .pet import Pet # Import model Pet
 
 
@@ -27,6 +28,11 @@ class RecordType(str, Enum):
 class HealthRecord(Document):
     # Liên kết tới document Pet tương ứng
     pet: Link[Pet]
+    # Bản sao từ Pet (đồng bộ bởi crud_pet khi pet đổi tên / đổi chủ)
+    owner_email: Optional[str] = None
+    owner_name: Optional[str] = None
+    pet_name: Optional[str] = None
+    pet_species: Optional[str] = None
     
     record_type: RecordType
     date: datetime
@@ -42,4 +48,14 @@ class HealthRecord(Document):
     used_services: Optional[List[UsedService]] = None
     
     class Settings:
-        name = "health_records"
\ No newline at end of file
+        name = "health_records"
+        indexes = [
+            # records of a pet, ordered by date
+            IndexModel([("pet.$id", ASCENDING), ("date", ASCENDING)]),
+            # portal: records of one pet, restricted to the logged-in owner
+            IndexModel([("owner_email", ASCENDING), ("pet.$id", ASCENDING), ("date", ASCENDING)]),
+            # revenue report / export date ranges
+            IndexModel([("date", ASCENDING)]),
+            # dashboard: vaccinations coming due
+            IndexModel([("record_type", ASCENDING), ("next_due_date", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -4,6 +4,7 @@ from beanie import Document
 from pydantic import Field, BaseModel
 from typing import List, Optional
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class OrderItem(BaseModel):
@@ -42,3 +43,11 @@ class Order(Document):
 
     class Settings:
         name = "orders"
+        indexes = [
+            # portal: my orders, newest first
+            IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING)]),
+            # revenue report / export date ranges
+            IndexModel([("created_at", ASCENDING)]),
+            # admin list filtered by status
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        ]
@@ -1,8 +1,9 @@
 from beanie import Document
 from pydantic import Field
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 from enum import Enum # <-- Import thêm Enum
+from pymongo import ASCENDING, IndexModel
 
 # Định nghĩa Enum cho giới tính
 class PetGender(str, Enum):
@@ -26,6 +27,15 @@ class Pet(Document):
     owner_name: str = Field(..., max_length=100)
     owner_email: Optional[str] = Field(None, max_length=100)
     owner_phone: Optional[str] = Field(None, max_length=15)
+
+    # Khóa tìm kiếm (tiền tố đã chuẩn hóa), do crud_pet duy trì
+    search_keys: List[str] = Field(default_factory=list)
     
     class Settings:
-        name = "pets"
\ No newline at end of file
+        name = "pets"
+        indexes = [
+            # portal: pets of the logged-in owner
+            IndexModel([("owner_email", ASCENDING)]),
+            # admin/portal search (multikey, see app.core.search_keys)
+            IndexModel([("search_keys", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -1,7 +1,8 @@
 # /app/models/product.py
 from beanie import Document
 from pydantic import Field
-from typing import Optional
+from typing import List, Optional
+from pymongo import ASCENDING, IndexModel
 
 class Product(Document):
     name: str = Field(..., max_length=100)
@@ -10,6 +11,14 @@ class Product(Document):
     stock_quantity: int = Field(default=0) # Số lượng tồn kho
     category: Optional[str] = None # Danh mục sản phẩm
     image_url: Optional[str] = Field(None) # URL ảnh sản phẩm
+    search_keys: List[str] = Field(default_factory=list) # Khóa tìm kiếm tên (không dấu), do crud_product duy trì
 
     class Settings:
-        name = "products"
\ No newline at end of file
+        name = "products"
+        indexes = [
+            IndexModel([("name", ASCENDING)]),
+            # low-stock job and endpoint
+            IndexModel([("stock_quantity", ASCENDING)]),
+            # name search (multikey, see app.core.search_keys)
+            IndexModel([("search_keys", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -0,0 +1,31 @@
+# /app/models/refresh_token.py
+from datetime import datetime
+from typing import Optional
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+
+class RefreshToken(Document):
+    """A refresh token, stored as the SHA-256 of the raw value.
+
+    Tokens are single-use: `/login/refresh` revokes the presented token and
+    issues a new one in the same `family`. Presenting an already rotated
+    token revokes the whole family (the token was likely stolen).
+    """
+    token_hash: str
+    user_email: str
+    family: str
+    created_at: datetime
+    expires_at: datetime
+    revoked_at: Optional[datetime] = None
+
+    class Settings:
+        name = "refresh_tokens"
+        indexes = [
+            IndexModel([("token_hash", ASCENDING)], unique=True),
+            IndexModel([("user_email", ASCENDING)]),
+            IndexModel([("family", ASCENDING)]),
+            # MongoDB removes tokens once expired
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ]
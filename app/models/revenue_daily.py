@@ -0,0 +1,30 @@
+# /app/models/revenue_daily.py
+from datetime import datetime
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class RevenueDaily(Document):
+    """Daily revenue rollup row.
+
+    Keyed by (day, product_id, service); an empty string means "not broken
+    down by this dimension". Per day there is:
+    - one total row (product_id="", service=""): revenue, records, orders
+    - one row per product: quantity, revenue (health records + order items)
+    - one row per service name: uses, revenue
+    """
+    day: datetime  # UTC midnight
+    product_id: str = ""
+    service: str = ""
+    quantity: int = Field(default=0)
+    uses: int = Field(default=0)  # service rows: times used (not `count`, that shadows Document.count())
+    revenue: float = Field(default=0.0)
+    records: int = Field(default=0)
+    orders: int = Field(default=0)
+
+    class Settings:
+        name = "revenue_daily"
+        indexes = [
+            IndexModel([("day", ASCENDING), ("product_id", ASCENDING), ("service", ASCENDING)], unique=True),
+        ]
@@ -0,0 +1,24 @@
+# /app/models/revoked_subject.py
+from datetime import datetime
+
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+
+class RevokedSubject(Document):
+    """Token subject (email) whose tokens issued before `revoked_at` are invalid.
+
+    Written when a user is deleted (there is no user document left to carry a
+    bumped `token_version`). MongoDB drops the entry once `expires_at` has
+    passed, i.e. when every token it could match has expired anyway.
+    """
+    email: str
+    revoked_at: datetime
+    expires_at: datetime
+
+    class Settings:
+        name = "revoked_subjects"
+        indexes = [
+            IndexModel([("email", ASCENDING)]),
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ]
@@ -3,6 +3,7 @@ from pydantic import Field
 from typing import Optional
 from datetime import datetime # Dùng datetime để lưu cả ngày và giờ
 from enum import Enum
+from pymongo import ASCENDING, IndexModel
 from .pet import Pet
 
 # Định nghĩa các loại sự kiện
@@ -15,6 +16,12 @@ class EventType(str, Enum):
 class ScheduledEvent(Document):
     # Liên kết tới document Pet tương ứng
     pet: Link[Pet]
+    # Bản sao từ Pet (đồng bộ bởi crud_pet khi pet đổi tên / đổi chủ), để portal
+    # truy vấn theo chủ nuôi mà không cần tải pet
+    owner_email: Optional[str] = None
+    owner_name: Optional[str] = None
+    pet_name: Optional[str] = None
+    pet_species: Optional[str] = None
     
     title: str = Field(..., max_length=100)
     event_datetime: datetime # Thời gian diễn ra sự kiện
@@ -27,4 +34,14 @@ class ScheduledEvent(Document):
     service_id: Optional[PydanticObjectId] = None
     product_id: Optional[PydanticObjectId] = None
     class Settings:
-        name = "scheduled_events"
\ No newline at end of file
+        name = "scheduled_events"
+        indexes = [
+            # events of a pet (portal, conflict check), ordered by time
+            IndexModel([("pet.$id", ASCENDING), ("event_datetime", ASCENDING)]),
+            # portal: events of the logged-in owner, ordered by time
+            IndexModel([("owner_email", ASCENDING), ("event_datetime", ASCENDING)]),
+            # upcoming events list and the reminder job
+            IndexModel([("is_completed", ASCENDING), ("event_datetime", ASCENDING)]),
+            # past events list, dashboard upcoming / per-month counts
+            IndexModel([("event_datetime", ASCENDING)]),
+        ]
\ No newline at end of file
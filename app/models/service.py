@@ -1,7 +1,8 @@
 # /app/models/service.py
 from beanie import Document
 from pydantic import Field
-from typing import Optional
+from typing import List, Optional
+from pymongo import ASCENDING, IndexModel
 
 class Service(Document):
     name: str = Field(..., max_length=100)
@@ -10,6 +11,12 @@ class Service(Document):
     duration_minutes: int = Field(default=30) # Thời gian thực hiện (phút)
     category: Optional[str] = None # Danh mục dịch vụ
     image_url: Optional[str] = Field(None) # URL ảnh dịch vụ
+    search_keys: List[str] = Field(default_factory=list) # Khóa tìm kiếm tên (không dấu), do crud_service duy trì
 
     class Settings:
-        name = "services"
\ No newline at end of file
+        name = "services"
+        indexes = [
+            IndexModel([("name", ASCENDING)]),
+            # name search (multikey, see app.core.search_keys)
+            IndexModel([("search_keys", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -1,7 +1,9 @@
 from beanie import Document
 from pydantic import Field, EmailStr
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 from enum import Enum  # <-- 1. Import Enum
+from pymongo import ASCENDING, IndexModel
 
 # 2. Định nghĩa các vai trò người dùng bằng Enum
 # Kế thừa từ str giúp Enum tương thích tốt hơn với Pydantic và JSON
@@ -19,6 +21,21 @@ class User(Document):
     role: UserRole = Field(default=UserRole.USER)
     # Optional avatar URL (served from /uploads)
     avatar_url: Optional[str] = None
+    # Bumped when password / role / is_active change; older access tokens are revoked
+    token_version: int = 0
+    # When token_version was last bumped (token_revocation only loads recent bumps)
+    token_version_changed_at: Optional[datetime] = None
+    # Khóa tìm kiếm email / họ tên (không dấu), do crud_user duy trì
+    search_keys: List[str] = Field(default_factory=list)
 
     class Settings:
-        name = "users"
\ No newline at end of file
+        name = "users"
+        indexes = [
+            # registration relies on DuplicateKeyError from this index
+            IndexModel([("email", ASCENDING)], unique=True),
+            IndexModel([("role", ASCENDING)]),
+            # token revocation refresh: versions bumped within the token lifetime
+            IndexModel([("token_version_changed_at", ASCENDING)], sparse=True),
+            # admin user search (multikey, see app.core.search_keys)
+            IndexModel([("search_keys", ASCENDING)]),
+        ]
\ No newline at end of file
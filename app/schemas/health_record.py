@@ -11,6 +11,8 @@ from typing import List
 
 class UsedProductSchema(BaseModel):
     product_id: PydanticObjectId
+    # Tên sản phẩm, chỉ có trong response (resolve từ product_id)
+    name: Optional[str] = None
     quantity: int = Field(..., gt=0)
     unit_price: float = Field(..., gt=0)
 
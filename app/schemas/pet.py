@@ -55,4 +55,6 @@ class PetPaginatedResponse(BaseModel):
     data: list[PetRead]
     total: int
     skip: int
-    limit: int
\ No newline at end of file
+    limit: int
+    # Opaque keyset cursor of the next page (None on the last page)
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -64,4 +64,6 @@ class ScheduledEventPaginatedResponse(BaseModel):
     data: List[ScheduledEventRead]
     total: int
     skip: int
-    limit: int
\ No newline at end of file
+    limit: int
+    # Opaque keyset cursor of the next page (None on the last page)
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -1,9 +1,30 @@
+from datetime import datetime, timezone
 from pydantic import BaseModel
 from typing import Optional
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
-    email: Optional[str] = None
\ No newline at end of file
+    """Claims of an access token (see `security.user_claims`)."""
+    email: Optional[str] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    token_version: int = 0
+    issued_at: Optional[datetime] = None
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "TokenData":
+        iat = payload.get("iat")
+        return cls(
+            email=payload.get("sub"),
+            role=payload.get("role"),
+            is_active=payload.get("active"),
+            token_version=int(payload.get("ver") or 0),
+            issued_at=datetime.fromtimestamp(iat, tz=timezone.utc) if iat is not None else None,
+        )
\ No newline at end of file
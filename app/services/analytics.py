@@ -0,0 +1,240 @@
+"""Revenue analytics computed with polars.
+
+Whole days come from the daily rollup (`revenue_daily`: one total row and
+one row per product per day); only the partial days at the edges of the
+range are read as raw revenue lines (see `crud_export.export_revenue_lines`),
+the same split `crud_report.compute_revenue_report` uses. Both are loaded
+into one polars DataFrame; bucketing, moving averages, period-over-period
+changes and top-N rankings are then vectorized group-bys instead of
+per-record Python loops. The CPU-bound part runs in a worker thread so the
+event loop keeps serving requests.
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+import polars as pl
+
+from app.core.singleflight import single_flight
+from app.crud import crud_product
+from app.crud.crud_export import export_revenue_lines
+from app.crud.crud_report import PRODUCT_LINES, REVENUE_LINES, _date_range, _split_range, _to_utc
+from app.db.database import get_collection
+from app.models.revenue_daily import RevenueDaily
+
+# Rows accumulated in Python before they are turned into a DataFrame chunk
+FRAME_BATCH_SIZE = 5000
+
+LINE_SCHEMA = {
+    "date": pl.Datetime("us"),
+    "kind": pl.Utf8,
+    "product_id": pl.Utf8,
+    "service": pl.Utf8,
+    "quantity": pl.Float64,
+    "amount": pl.Float64,
+}
+
+# Frame rows read from revenue_daily: a day's total revenue / a day's product totals
+LINE_DAY_TOTAL = "day_total"
+LINE_DAY_PRODUCT = "day_product"
+SERIES_LINES = REVENUE_LINES + [LINE_DAY_TOTAL]
+RANKING_LINES = PRODUCT_LINES + [LINE_DAY_PRODUCT]
+
+# revenue_daily fields read; rows lack the metrics that were never incremented
+ROLLUP_ROW_SCHEMA = {
+    "day": pl.Datetime("us"),
+    "product_id": pl.Utf8,
+    "quantity": pl.Float64,
+    "revenue": pl.Float64,
+}
+
+# group_by -> (polars truncate interval, label format); labels match crud_report.PERIODS
+INTERVALS = {
+    "day": ("1d", "%Y-%m-%d"),
+    "week": ("1w", "%G-W%V"),
+    "month": ("1mo", "%Y-%m"),
+    "year": ("1y", "%Y"),
+}
+
+
+async def _rollup_frame(first_day: Optional[datetime], end_day: Optional[datetime]) -> pl.DataFrame:
+    """Days in [first_day, end_day) from revenue_daily, with LINE_SCHEMA columns."""
+    query = _date_range("day", first_day, end_day, end_exclusive=True)
+    # total rows and product rows; per-service rows are not used here
+    query["service"] = ""
+    rows = await get_collection(RevenueDaily).find(
+        query, projection={"_id": 0, "day": 1, "product_id": 1, "quantity": 1, "revenue": 1},
+    ).to_list(length=None)
+    return rollup_rows_frame(rows)
+
+
+def rollup_rows_frame(rows: List[dict]) -> pl.DataFrame:
+    """revenue_daily rows (total / product rows) with LINE_SCHEMA columns.
+
+    Metrics that are zero are never `$inc`-ed, so a row may lack `quantity`
+    or `revenue` altogether; those read as 0.
+    """
+    if not rows:
+        return pl.DataFrame(schema=LINE_SCHEMA)
+    is_total = pl.col("product_id") == ""
+    return pl.from_dicts(rows, schema=ROLLUP_ROW_SCHEMA).with_columns(
+        pl.col("product_id").fill_null(""),
+        pl.col("quantity").fill_null(0.0),
+        pl.col("revenue").fill_null(0.0),
+    ).select(
+        pl.col("day").alias("date"),
+        pl.when(is_total).then(pl.lit(LINE_DAY_TOTAL)).otherwise(pl.lit(LINE_DAY_PRODUCT)).alias("kind"),
+        pl.when(is_total).then(pl.lit(None, dtype=pl.Utf8)).otherwise(pl.col("product_id")).alias("product_id"),
+        pl.lit(None, dtype=pl.Utf8).alias("service"),
+        "quantity",
+        pl.col("revenue").alias("amount"),
+    )
+
+
+async def _lines_frame(start: datetime, end: datetime, end_exclusive: bool) -> pl.DataFrame:
+    """Raw revenue lines of a (partial-day) segment, with LINE_SCHEMA columns."""
+    frames: List[pl.DataFrame] = []
+    batch = {name: [] for name in LINE_SCHEMA}
+    rows = 0
+    async for line in export_revenue_lines(start, end, end_exclusive=end_exclusive):
+        for name, values in batch.items():
+            values.append(line.get(name))
+        rows += 1
+        if rows >= FRAME_BATCH_SIZE:
+            frames.append(pl.DataFrame(batch, schema=LINE_SCHEMA))
+            batch = {name: [] for name in LINE_SCHEMA}
+            rows = 0
+    if rows or not frames:
+        frames.append(pl.DataFrame(batch, schema=LINE_SCHEMA))
+    return pl.concat(frames, rechunk=True)
+
+
+async def load_revenue_frame(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> pl.DataFrame:
+    """Revenue between dates as a DataFrame with LINE_SCHEMA columns.
+
+    Whole days are rollup rows (kinds LINE_DAY_TOTAL / LINE_DAY_PRODUCT),
+    partial days at either end are raw revenue lines.
+    """
+    whole_days, edges = _split_range(_to_utc(start_date), _to_utc(end_date))
+    parts = []
+    if whole_days is not None:
+        parts.append(_rollup_frame(*whole_days))
+    for seg_start, seg_end, end_exclusive in edges:
+        parts.append(_lines_frame(seg_start, seg_end, end_exclusive))
+    frames = await asyncio.gather(*parts)
+    return pl.concat(frames, rechunk=True)
+
+
+def revenue_series(df: pl.DataFrame, group_by: str = "day", window: int = 7) -> pl.DataFrame:
+    """Revenue per period with a moving average and period-over-period change.
+
+    Periods without revenue are filled with 0 so the moving average and the
+    comparison are taken over consecutive periods.
+    """
+    every, fmt = INTERVALS.get(group_by, INTERVALS["day"])
+    buckets = (
+        df.lazy()
+        .filter(pl.col("kind").is_in(SERIES_LINES) & pl.col("date").is_not_null())
+        .group_by(pl.col("date").dt.truncate(every).alias("bucket"))
+        .agg(pl.col("amount").fill_null(0).sum().alias("revenue"))
+        .sort("bucket")
+        .collect()
+    )
+    if buckets.is_empty():
+        return pl.DataFrame(schema={
+            "period": pl.Utf8, "revenue": pl.Float64, "moving_avg": pl.Float64,
+            "previous": pl.Float64, "change": pl.Float64, "change_pct": pl.Float64,
+        })
+
+    full = pl.DataFrame({"bucket": pl.datetime_range(
+        buckets["bucket"].min(), buckets["bucket"].max(), interval=every, eager=True, time_unit="us",
+    )})
+    return (
+        full.lazy()
+        .join(buckets.lazy(), on="bucket", how="left")
+        .with_columns(pl.col("revenue").fill_null(0.0))
+        .with_columns(
+            pl.col("revenue").rolling_mean(window_size=max(window, 1), min_samples=1).alias("moving_avg"),
+            pl.col("revenue").shift(1).alias("previous"),
+        )
+        .with_columns(
+            (pl.col("revenue") - pl.col("previous")).alias("change"),
+            pl.when(pl.col("previous") > 0)
+            .then((pl.col("revenue") - pl.col("previous")) / pl.col("previous") * 100)
+            .otherwise(None)
+            .alias("change_pct"),
+        )
+        .select(
+            pl.col("bucket").dt.strftime(fmt).alias("period"),
+            "revenue", "moving_avg", "previous", "change", "change_pct",
+        )
+        .collect()
+    )
+
+
+def top_products(df: pl.DataFrame, n: int = 10, by: str = "revenue") -> pl.DataFrame:
+    """Top `n` products by revenue (or quantity), with their share of product revenue."""
+    sort_col = "quantity" if by == "quantity" else "revenue"
+    return (
+        df.lazy()
+        .filter(pl.col("kind").is_in(RANKING_LINES) & pl.col("product_id").is_not_null())
+        .group_by("product_id")
+        .agg(
+            pl.col("quantity").fill_null(0).sum().cast(pl.Int64).alias("quantity"),
+            pl.col("amount").fill_null(0).sum().alias("revenue"),
+        )
+        .with_columns((pl.col("revenue") / pl.col("revenue").sum() * 100).alias("share_pct"))
+        .sort(sort_col, descending=True)
+        .head(n)
+        .collect()
+    )
+
+
+async def _with_product_names(ranking: List[dict]) -> List[dict]:
+    names = await crud_product.resolve_product_names(r["product_id"] for r in ranking)
+    for row in ranking:
+        row["name"] = names.get(row["product_id"], row["product_id"])
+    return ranking
+
+
+@single_flight()
+async def revenue_analytics(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    group_by: str = "day",
+    window: int = 7,
+    top: int = 10,
+) -> dict:
+    """Series, summary and top products for the /reports/analytics endpoint."""
+    df = await load_revenue_frame(start_date, end_date)
+
+    def _compute():
+        series = revenue_series(df, group_by, window)
+        ranking = top_products(df, top)
+        revenue = series["revenue"]
+        summary = {
+            "total_revenue": float(revenue.sum() or 0.0),
+            "periods": series.height,
+            "mean": float(revenue.mean() or 0.0) if series.height else 0.0,
+            "max": float(revenue.max() or 0.0) if series.height else 0.0,
+        }
+        return series.to_dicts(), ranking.to_dicts(), summary
+
+    series, ranking, summary = await asyncio.to_thread(_compute)
+    await _with_product_names(ranking)
+    return {"group_by": group_by, "window": window, "summary": summary, "series": series, "top_products": ranking}
+
+
+@single_flight()
+async def top_products_report(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    n: int = 10,
+    by: str = "revenue",
+) -> List[dict]:
+    df = await load_revenue_frame(start_date, end_date)
+    ranking = (await asyncio.to_thread(top_products, df, n, by)).to_dicts()
+    return await _with_product_names(ranking)
@@ -0,0 +1,105 @@
+"""Materialized dashboard snapshot.
+
+Keeps the last successfully computed `DashboardData` in memory. Write paths
+(pets, health records, scheduled events) call `mark_dirty()`; the snapshot is
+then rebuilt in the background while readers keep getting the last good copy.
+The snapshot is also refreshed once it is older than
+`settings.DASHBOARD_SNAPSHOT_TTL_SECONDS` so time-based counters (upcoming
+events, due vaccinations) do not drift.
+"""
+import asyncio
+import time
+import traceback
+from typing import Optional
+
+from app.core import dataloader, timing
+from app.core.config import settings
+from app.crud.crud_dashboard import compute_dashboard_data, get_dashboard_data
+from app.schemas.dashboard import DashboardData
+
+
+class DashboardSnapshot:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._data: Optional[DashboardData] = None
+        self._built_at: float = 0.0
+        self._dirty = True
+        self._task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        if self._data is None or self._dirty:
+            return True
+        return (time.monotonic() - self._built_at) > self.ttl_seconds
+
+    def mark_dirty(self) -> None:
+        """Flag the snapshot as outdated and schedule a background rebuild.
+
+        Nothing is scheduled until the dashboard has been read at least once,
+        so writes do not trigger aggregations nobody is looking at.
+        """
+        self._dirty = True
+        if self._data is not None:
+            self._schedule_rebuild()
+
+    @timing.timed("dashboard.snapshot")
+    async def get(self) -> DashboardData:
+        """Return the current snapshot, rebuilding it in the background if stale.
+
+        Only the very first call (no snapshot yet) waits for the aggregation.
+        """
+        if self._data is None:
+            task = self._schedule_rebuild()
+            if task is not None:
+                await asyncio.shield(task)
+            if self._data is None:
+                # First build failed: fall back to the safe direct computation
+                return await get_dashboard_data()
+            return self._data
+
+        if self.is_stale():
+            self._schedule_rebuild()
+        return self._data
+
+    def _schedule_rebuild(self) -> Optional[asyncio.Task]:
+        if self._task is not None and not self._task.done():
+            # The running rebuild loops again while the dirty flag is set
+            return self._task
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        self._task = loop.create_task(self._rebuild())
+        return self._task
+
+    async def _rebuild(self) -> None:
+        # Runs past the request that scheduled it; don't record into its timings
+        # or keep its loaders alive
+        timing.detach()
+        dataloader.detach()
+        # Mark clean before computing so writes that land mid-build trigger another pass
+        while True:
+            self._dirty = False
+            try:
+                data = await compute_dashboard_data()
+            except Exception as e:
+                # Keep serving the last good snapshot; retry on a later read
+                print(f"Error rebuilding dashboard snapshot: {e}")
+                traceback.print_exc()
+                self._dirty = True
+                return
+            self._data = data
+            self._built_at = time.monotonic()
+            if not self._dirty:
+                return
+
+
+dashboard_snapshot = DashboardSnapshot(ttl_seconds=settings.DASHBOARD_SNAPSHOT_TTL_SECONDS)
+
+
+def mark_dirty() -> None:
+    """Shortcut used by CRUD write paths."""
+    dashboard_snapshot.mark_dirty()
+
+
+async def get_dashboard_snapshot() -> DashboardData:
+    return await dashboard_snapshot.get()
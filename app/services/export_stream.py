@@ -0,0 +1,88 @@
+"""Encode async row iterators as streamed CSV or NDJSON (optionally gzipped).
+
+Rows are written into small text buffers that are flushed every
+`FLUSH_ROWS` rows, so memory use does not depend on the export size.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import AsyncIterator, List
+
+from bson import ObjectId
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+FLUSH_ROWS = 500
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+    return value
+
+
+async def _encode(rows: AsyncIterator[dict], columns: List[str], fmt: str) -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+    pending = 0
+    async for row in rows:
+        if writer is not None:
+            writer.writerow([_csv_cell(row.get(c)) for c in columns])
+        else:
+            buf.write(json.dumps({c: row.get(c) for c in columns}, default=_json_default, ensure_ascii=False))
+            buf.write("\n")
+        pending += 1
+        if pending >= FLUSH_ROWS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+            pending = 0
+    tail = buf.getvalue()
+    if tail:
+        yield tail
+
+
+async def stream_rows(
+    rows: AsyncIterator[dict],
+    columns: List[str],
+    fmt: str = "csv",
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Yield the encoded export as byte chunks."""
+    # wbits=31 produces a gzip container instead of a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    async for text in _encode(rows, columns, fmt):
+        data = text.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def export_filename(name: str, fmt: str, gzip: bool) -> str:
+    return f"{name}.{FORMATS[fmt][1]}" + (".gz" if gzip else "")
+
+
+def export_media_type(fmt: str, gzip: bool) -> str:
+    return "application/gzip" if gzip else FORMATS[fmt][0]
@@ -3,8 +3,9 @@ from email.message import EmailMessage
 from datetime import datetime, timedelta, timezone
 
 from app.models.scheduled_event import ScheduledEvent
-from app.models.pet import Pet
+from app.crud import crud_pet
 from app.core.config import settings
+from app.services import dashboard_snapshot
 from app.models.product import Product
 from app.models.user import User
 import smtplib
@@ -28,9 +29,15 @@ async def check_upcoming_events():
     
     print(f"Found {len(upcoming_events)} events to remind.")
 
+    # Events carry pet name / owner email; only older events (not backfilled) need their pet, in one query
+    pets = await crud_pet.get_pets_for([e for e in upcoming_events if not e.pet_name])
+
     for event in upcoming_events:
-        pet = await Pet.get(event.pet.ref.id)
-        if not pet:
+        pet_id = crud_pet.pet_id_of(event)
+        pet = pets.get(str(pet_id)) if pet_id else None
+        pet_name = event.pet_name or (pet.get('name') if pet else None)
+        owner_email = event.owner_email or (pet.get('owner_email') if pet else None)
+        if not pet_name:
             print(f"WARNING: Pet not found for event '{event.title}'.")
             continue
 
@@ -44,17 +51,17 @@ async def check_upcoming_events():
             
             Đây là thông báo nhắc nhở cho một sự kiện sắp diễn ra:
             
-            - Thú cưng: {pet.name}
+            - Thú cưng: {pet_name}
             - Sự kiện: {event.title}
             - Thời gian: {event.event_datetime.strftime('%Y-%m-%d %H:%M')}
             - Mô tả: {event.description or 'Không có mô tả'}
             """
             
             msg.set_content(body)
-            msg['Subject'] = f"Nhắc nhở sự kiện: {event.title} cho thú cưng {pet.name}"
+            msg['Subject'] = f"Nhắc nhở sự kiện: {event.title} cho thú cưng {pet_name}"
             msg['From'] = settings.MAIL_FROM
             # Prefer sending reminder to pet owner if available, otherwise fallback to configured admin address
-            recipient = pet.owner_email or settings.MAIL_TO_ADMIN
+            recipient = owner_email or settings.MAIL_TO_ADMIN
             msg['To'] = recipient
             print(f"Sending reminder to: {recipient}")
 
@@ -70,6 +77,7 @@ async def check_upcoming_events():
             
             event.reminder_sent = True
             await event.save()
+            dashboard_snapshot.mark_dirty()
         except Exception as e:
             # Lỗi này sẽ cho chúng ta biết chính xác vấn đề (sai pass, sai config...)
             print(f"!!! ERROR: Failed to send email for event '{event.title}'. Error: {e}")
@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from typing import Tuple
 from datetime import datetime, timedelta, timezone
@@ -6,6 +10,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 # Import settings from your configuration module
 from app.core.config import settings
+from app.schemas.token import TokenData
 # Use bcrypt_sha256 which pre-hashes with SHA-256 before applying bcrypt,
 # avoiding bcrypt's 72-byte input limit while remaining compatible.
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
@@ -29,6 +34,96 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password) 
 
+
+class PasswordHashBusy(Exception):
+    """Raised when the password hashing pool's queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+class _PasswordHashPool:
+    """
+    Bounded thread pool for Argon2 (argon2-cffi releases the GIL while hashing).
+
+    At most `max_workers` hashes run at once and at most `max_queue` more may
+    wait; beyond that `PasswordHashBusy` is raised so callers can answer 503
+    instead of piling up work behind the event loop.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.in_flight = 0  # running + queued
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms_total = 0.0
+        self.run_ms_total = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="argon2")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashBusy(retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)
+        self.in_flight += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.running += 1
+                self.wait_ms_total += (started - submitted) * 1000
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.run_ms_total += (time.perf_counter() - started) * 1000
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), job)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": max(0, self.in_flight - self.running),
+            "utilisation": round(self.running / self.max_workers, 3),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_ms_total / done, 2),
+            "avg_run_ms": round(self.run_ms_total / done, 2),
+        }
+
+
+password_hash_pool = _PasswordHashPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """`get_password_hash` off the event loop; may raise PasswordHashBusy."""
+    return await password_hash_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """`verify_password` off the event loop; may raise PasswordHashBusy."""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
 # HÀM MỚI ĐỂ TẠO TOKEN
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -38,6 +133,25 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         # Mặc định token hết hạn sau 60 phút
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.now(timezone.utc)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+
+def user_claims(user) -> dict:
+    """Authorization claims embedded in access tokens so dependencies can
+    authorize without loading the user (see app.services.token_revocation)."""
+    role = getattr(user, "role", None)
+    return {
+        "sub": user.email,
+        "role": getattr(role, "value", role),
+        "active": bool(getattr(user, "is_active", True)),
+        "ver": int(getattr(user, "token_version", 0) or 0),
+    }
+
+
+def decode_access_token(token: str) -> TokenData:
+    """Decode and verify an access token; raises JWTError when invalid."""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    return TokenData.from_payload(payload)
+
@@ -0,0 +1,120 @@
+"""In-memory revocation set for stateless access tokens.
+
+Access tokens carry `role`, `active` and `ver` (the user's `token_version`)
+claims, so dependencies can authorize without loading the user. A token is
+rejected when:
+
+- its subject is deactivated, or its `ver` is older than the user's current
+  `token_version` (bumped on password / role / active changes), or
+- its subject was deleted after the token was issued.
+
+The set is rebuilt from MongoDB every `TOKEN_REVOCATION_REFRESH_SECONDS` by a
+scheduler job; the worker that makes a change also updates it immediately.
+Only users whose `token_version` was bumped within the access-token lifetime
+are loaded (indexed on `token_version_changed_at`): tokens issued before an
+older bump have expired anyway. So the set stays small and entries age out.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.db.database import get_collection
+from app.models.revoked_subject import RevokedSubject
+from app.models.user import User
+from app.schemas.token import TokenData
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+class RevocationSet:
+    def __init__(self):
+        # email -> (token_version, is_active)
+        self._users: Dict[str, Tuple[int, bool]] = {}
+        # email -> tokens issued before this instant are revoked
+        self._deleted: Dict[str, datetime] = {}
+        self.refreshed_at: Optional[datetime] = None
+
+    def is_revoked(self, claims: TokenData) -> bool:
+        if claims.is_active is False:
+            return True
+        revoked_at = self._deleted.get(claims.email)
+        if revoked_at is not None and (claims.issued_at is None or claims.issued_at <= revoked_at):
+            return True
+        state = self._users.get(claims.email)
+        if state is None:
+            return False
+        version, active = state
+        return not active or (claims.token_version or 0) < version
+
+    def note_user(self, user: User) -> None:
+        """Apply a user change on this worker right away."""
+        version = int(getattr(user, "token_version", 0) or 0)
+        active = bool(getattr(user, "is_active", True))
+        if version > 0 or not active:
+            self._users[user.email] = (version, active)
+        else:
+            self._users.pop(user.email, None)
+
+    def note_deleted(self, email: str, revoked_at: datetime) -> None:
+        self._deleted[email] = _utc(revoked_at)
+
+    async def refresh(self) -> None:
+        now = datetime.now(timezone.utc)
+        users: Dict[str, Tuple[int, bool]] = {}
+        cursor = get_collection(User).find(
+            {"token_version_changed_at": {"$gte": now - timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)}},
+            projection={"email": 1, "token_version": 1, "is_active": 1},
+        )
+        async for doc in cursor:
+            users[doc["email"]] = (int(doc.get("token_version") or 0), bool(doc.get("is_active", True)))
+
+        deleted: Dict[str, datetime] = {}
+        async for doc in get_collection(RevokedSubject).find(
+            {"expires_at": {"$gt": now}}, projection={"email": 1, "revoked_at": 1},
+        ):
+            revoked_at = _utc(doc["revoked_at"])
+            if doc["email"] not in deleted or deleted[doc["email"]] < revoked_at:
+                deleted[doc["email"]] = revoked_at
+
+        self._users, self._deleted = users, deleted
+        self.refreshed_at = now
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "deleted": len(self._deleted),
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+revocations = RevocationSet()
+
+
+def is_revoked(claims: TokenData) -> bool:
+    return revocations.is_revoked(claims)
+
+
+def note_user(user: User) -> None:
+    revocations.note_user(user)
+
+
+async def revoke_deleted_user(email: str) -> None:
+    """Revoke every token issued so far for a deleted user."""
+    now = datetime.now(timezone.utc)
+    await RevokedSubject(
+        email=email,
+        revoked_at=now,
+        expires_at=now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    ).insert()
+    revocations.note_deleted(email, now)
+
+
+async def refresh_revocations() -> None:
+    """Scheduler job: reload the revocation set from MongoDB."""
+    try:
+        await revocations.refresh()
+    except Exception as e:
+        # keep the previous set; the next run retries
+        print(f"Error refreshing token revocations: {e}")
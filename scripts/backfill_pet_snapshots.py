@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `from app...` imports work when running scripts
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+from app.db.database import init_db
+
+
+async def main():
+    """Copy owner_email / owner_name / pet_name / pet_species from pets onto their events and health records.
+
+    The API does this on start for documents that lack the fields
+    (`ensure_pet_snapshots`); this script re-syncs everything on demand.
+    """
+    await init_db()
+    from app.crud.crud_pet import rebuild_pet_snapshots
+
+    updated = await rebuild_pet_snapshots()
+    print(f'events / health records updated: {updated}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `from app...` imports work when running scripts
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+from app.db.database import init_db
+
+
+async def main():
+    """Rebuild the revenue_daily rollup from all health records and orders."""
+    await init_db()
+    from app.crud.crud_revenue_rollup import rebuild_rollup
+
+    rows = await rebuild_rollup()
+    print(f'revenue_daily rebuilt: {rows} rows')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `from app...` imports work when running scripts
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+from app.db.database import init_db
+
+
+async def main():
+    """Compute search_keys for documents written before the field existed (or out of sync).
+
+    Run after deploying a change to the key format or folding rules too.
+    """
+    await init_db()
+    from app.crud import crud_pet, crud_product, crud_service, crud_user
+
+    for label, rebuild in (
+        ('pets', crud_pet.rebuild_search_keys),
+        ('users', crud_user.rebuild_search_keys),
+        ('products', crud_product.rebuild_search_keys),
+        ('services', crud_service.rebuild_search_keys),
+    ):
+        updated = await rebuild()
+        print(f'{label} search_keys updated: {updated}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
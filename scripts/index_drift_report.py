@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `from app...` imports work when running scripts
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+from app.db.database import init_db
+
+
+async def main():
+    """Print missing / undeclared / unused indexes for every model.
+
+    Indexes are not created here, so "missing" shows what the next app
+    start would have to build (or what failed, e.g. duplicate emails
+    blocking the unique users index).
+    """
+    await init_db(skip_indexes=True)
+    from app.db.indexes import index_drift_report
+
+    report = await index_drift_report()
+    clean = True
+    for collection, drift in report.items():
+        problems = {k: drift[k] for k in ('missing', 'undeclared', 'unused') if drift[k]}
+        if not problems:
+            print(f'{collection}: ok')
+            continue
+        clean = False
+        print(f'{collection}:')
+        for kind, names in problems.items():
+            print(f'  {kind}: {", ".join(names)}')
+    sys.exit(0 if clean else 1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `from app...` imports work when running scripts
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+from app.db.database import init_db
+
+
+async def main():
+    """Recompute the dashboard_counters collection from pets and health records."""
+    await init_db()
+    from app.crud.crud_dashboard_counter import rebuild_counters
+
+    summary = await rebuild_counters()
+    for metric, buckets in summary.items():
+        print(f'{metric}: {buckets} buckets')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -68,6 +68,15 @@ async def main():
 
     print(f'Inserted {len(recs)} health records.')
 
+    # The documents above bypass the CRUD layer: rebuild what its write paths maintain
+    from app.crud import crud_dashboard_counter, crud_pet, crud_product, crud_revenue_rollup
+
+    await crud_product.rebuild_search_keys()
+    await crud_pet.rebuild_search_keys()
+    await crud_pet.rebuild_pet_snapshots()
+    print(f'Dashboard counters rebuilt: {await crud_dashboard_counter.rebuild_counters()}')
+    print(f'Revenue rollup rebuilt: {await crud_revenue_rollup.rebuild_rollup()} rows')
+
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,54 @@
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("polars")
+pytest.importorskip("motor")
+pytest.importorskip("beanie")
+
+# app.core.config requires these; the values are irrelevant for the tests
+for _name, _value in {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "petcare_analytics_test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "MAIL_TO_ADMIN": "admin@example.com",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.services import analytics
+
+
+def test_rollup_rows_missing_metrics_read_as_zero():
+    day1, day2 = datetime(2024, 1, 1), datetime(2024, 1, 2)
+    rows = [
+        # total rows never get `quantity`; zero-revenue rows never get `revenue`
+        {"day": day1, "product_id": "", "revenue": 50},
+        {"day": day1, "product_id": "p1", "quantity": 2, "revenue": 20.5},
+        {"day": day2, "product_id": "p1", "quantity": 1},
+        {"day": day2, "product_id": ""},
+    ]
+    df = analytics.rollup_rows_frame(rows)
+    assert df.schema == analytics.pl.Schema(analytics.LINE_SCHEMA)
+
+    series = analytics.revenue_series(df, "day").to_dicts()
+    assert [(row["period"], row["revenue"]) for row in series] == [("2024-01-01", 50.0), ("2024-01-02", 0.0)]
+
+    ranking = analytics.top_products(df).to_dicts()
+    assert ranking[0]["product_id"] == "p1"
+    assert (ranking[0]["quantity"], ranking[0]["revenue"]) == (3, 20.5)
+
+
+def test_rollup_rows_of_only_totals():
+    df = analytics.rollup_rows_frame([{"day": datetime(2024, 1, 1), "product_id": ""}])
+    assert analytics.top_products(df).is_empty()
+    assert analytics.rollup_rows_frame([]).is_empty()
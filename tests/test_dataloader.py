@@ -0,0 +1,62 @@
+import asyncio
+
+from app.core import dataloader
+from app.core.dataloader import DataLoader
+
+
+def test_concurrent_loads_share_one_batch_and_are_memoized():
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(sorted(keys))
+        return {key: {"id": key} for key in keys if key != "missing"}
+
+    async def run():
+        loader = DataLoader(fetch_many)
+        a, b, again, missing = await asyncio.gather(
+            loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"),
+        )
+        assert a is again and b["id"] == "b" and missing is None
+        assert await loader.load("a") is a
+        assert (await loader.load_many(["b", "c"]))["c"] == {"id": "c"}
+
+    asyncio.run(run())
+    assert calls == [["a", "b", "missing"], ["c"]]
+
+
+def test_errors_are_not_memoized():
+    attempts = []
+
+    async def fetch_many(keys):
+        attempts.append(keys)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+        return {key: key for key in keys}
+
+    async def run():
+        loader = DataLoader(fetch_many)
+        try:
+            await loader.load("a")
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("expected the fetch error")
+        assert await loader.load("a") == "a"
+
+    asyncio.run(run())
+    assert len(attempts) == 2
+
+
+def test_request_loader_is_scoped_to_the_request():
+    async def fetch_many(keys):
+        return {}
+
+    assert dataloader.request_loader("pets", fetch_many) is None
+    token = dataloader.start_request()
+    try:
+        loader = dataloader.request_loader("pets", fetch_many)
+        assert loader is not None
+        assert dataloader.request_loader("pets", fetch_many) is loader
+    finally:
+        dataloader.end_request(token)
+    assert dataloader.request_loader("pets", fetch_many) is None
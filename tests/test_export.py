@@ -0,0 +1,67 @@
+"""Merging of the per-source revenue line streams."""
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("beanie")
+
+# app.core.config requires these; the values are irrelevant for the tests
+for _name, _value in {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "petcare_export_test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "MAIL_TO_ADMIN": "admin@example.com",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.crud.crud_export import _merge_by_date
+
+
+async def _stream(rows):
+    for row in rows:
+        yield row
+
+
+def _collect(*streams):
+    async def run():
+        return [row async for row in _merge_by_date(*streams)]
+
+    return asyncio.run(run())
+
+
+def test_merge_keeps_date_order_across_sources():
+    records = [
+        {"date": datetime(2024, 1, 1), "source": "health_record"},
+        {"date": datetime(2024, 1, 3), "source": "health_record"},
+        {"date": datetime(2024, 1, 3), "source": "health_record"},
+    ]
+    orders = [
+        {"date": datetime(2024, 1, 2), "source": "order"},
+        {"date": datetime(2024, 1, 3), "source": "order"},
+        {"date": datetime(2024, 1, 4), "source": "order"},
+    ]
+    rows = _collect(_stream(records), _stream(orders))
+    assert [row["date"] for row in rows] == sorted(row["date"] for row in records + orders)
+    # equal dates keep the stream order: health records first
+    assert [row["source"] for row in rows[2:5]] == ["health_record", "health_record", "order"]
+
+
+def test_merge_puts_missing_dates_first_and_handles_empty_streams():
+    rows = _collect(
+        _stream([{"date": None}, {"date": datetime(2024, 1, 2)}]),
+        _stream([]),
+        _stream([{"date": None}, {"date": datetime(2024, 1, 1)}]),
+    )
+    assert [row["date"] for row in rows] == [None, None, datetime(2024, 1, 1), datetime(2024, 1, 2)]
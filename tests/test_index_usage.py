@@ -0,0 +1,398 @@
+"""Index-usage regression tests.
+
+Runs the real queries issued by the CRUD helpers, the portal order list and
+the report pipelines against a local mongod, captures every command they
+send (pymongo command monitoring) and explains it. A test fails when a hot
+query falls back to COLLSCAN or examines far more documents / index keys
+than it returns.
+
+Skipped when no mongod answers on MONGODB_TEST_URL
+(default mongodb://localhost:27017). The tests use their own throwaway
+database and drop it afterwards.
+"""
+import asyncio
+import copy
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("beanie")
+
+# app.core.config requires these; the values are irrelevant for the tests
+for _name, _value in {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "petcare_index_usage_test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "MAIL_TO_ADMIN": "admin@example.com",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import motor.motor_asyncio
+from beanie import init_beanie
+from pymongo import monitoring
+
+MONGODB_TEST_URL = os.environ.get("MONGODB_TEST_URL", "mongodb://localhost:27017")
+TEST_DB = "petcare_index_usage_test"
+
+# examined <= returned * EXAMINED_RATIO + EXAMINED_SLACK
+EXAMINED_RATIO = 2
+EXAMINED_SLACK = 10
+
+OWNERS = 30
+PETS_PER_OWNER = 5
+EVENTS_PER_PET = 4
+RECORDS_PER_PET = 3
+ORDERS_PER_OWNER = 4
+
+# Command fields that cannot be sent inside an `explain`
+_SESSION_FIELDS = ("$db", "lsid", "$clusterTime", "txnNumber", "$readPreference", "autocommit", "startTransaction")
+
+
+class _CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+        self.recording = False
+
+    def started(self, event):
+        if self.recording and event.database_name == TEST_DB and event.command_name in ("find", "aggregate"):
+            self.commands.append(copy.deepcopy(dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+recorder = _CommandRecorder()
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def db(loop):
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        MONGODB_TEST_URL, serverSelectionTimeoutMS=500, event_listeners=[recorder],
+    )
+    try:
+        loop.run_until_complete(client.admin.command("ping"))
+    except Exception:
+        pytest.skip(f"no mongod reachable at {MONGODB_TEST_URL}")
+
+    from app.db.database import DOCUMENT_MODELS
+
+    database = client[TEST_DB]
+    loop.run_until_complete(client.drop_database(TEST_DB))
+    loop.run_until_complete(init_beanie(database=database, document_models=DOCUMENT_MODELS))
+    loop.run_until_complete(_seed())
+    yield database
+    loop.run_until_complete(client.drop_database(TEST_DB))
+    client.close()
+
+
+async def _seed():
+    from app.models.health_record import HealthRecord, RecordType, UsedProduct, UsedService
+    from app.models.order import Order, OrderItem, ShippingInfo
+    from app.models.pet import Pet
+    from app.models.scheduled_event import EventType, ScheduledEvent
+    from app.models.user import User
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    users, pets, events, records, orders = [], [], [], [], []
+    for o in range(OWNERS):
+        email = f"owner{o}@example.com"
+        users.append(User(email=email, full_name=f"Nguyễn Owner {o}", hashed_password="x"))
+        for p in range(PETS_PER_OWNER):
+            pets.append(Pet(name=f"Pet {o}-{p}", species="Dog" if p % 2 else "Cat", owner_name=f"Owner {o}", owner_email=email))
+        for n in range(ORDERS_PER_OWNER):
+            orders.append(Order(
+                user_email=email,
+                items=[OrderItem(product_id="000000000000000000000001", name="Food", unit_price=10.0, quantity=1, subtotal=10.0)],
+                shipping=ShippingInfo(name=f"Owner {o}", address="Somewhere"),
+                total=10.0,
+                status="cancelled" if n == 0 else "pending",
+                created_at=(now - timedelta(days=n * 30 + o)).replace(tzinfo=None),
+            ))
+    await User.insert_many(users)
+    await Pet.insert_many(pets)
+    pets = await Pet.find_all().to_list()
+
+    for i, pet in enumerate(pets):
+        for e in range(EVENTS_PER_PET):
+            events.append(ScheduledEvent(
+                pet=pet,
+                title=f"Event {e}",
+                event_datetime=now + timedelta(days=(e - EVENTS_PER_PET // 2) * 20, hours=i),
+                event_type=EventType.APPOINTMENT,
+                is_completed=e == 0,
+            ))
+        for r in range(RECORDS_PER_PET):
+            records.append(HealthRecord(
+                pet=pet,
+                record_type=RecordType.VACCINATION if r == 0 else RecordType.VET_VISIT,
+                date=now - timedelta(days=r * 60 + i % 30),
+                description="Check",
+                next_due_date=now + timedelta(days=r * 10) if r == 0 else None,
+                used_products=[UsedProduct(product_id="000000000000000000000001", quantity=1, unit_price=5.0)],
+                used_services=[UsedService(name="Exam", price=20.0)],
+            ))
+    await ScheduledEvent.insert_many(events)
+    await HealthRecord.insert_many(records)
+    await Order.insert_many(orders)
+
+    from app.crud import crud_pet, crud_user
+    from app.crud.crud_revenue_rollup import rebuild_rollup
+    await crud_pet.rebuild_search_keys()
+    await crud_pet.rebuild_pet_snapshots()
+    await crud_user.rebuild_search_keys()
+    await rebuild_rollup()
+
+
+def _queries(command: dict):
+    """(collection, find-command) pairs to explain for a captured command.
+
+    Aggregations are judged by their leading $match (and $sort), which is the
+    part that can use an index; $unionWith sub-pipelines are followed too.
+    """
+    command = {k: v for k, v in command.items() if k not in _SESSION_FIELDS}
+    if "find" in command:
+        find = {k: v for k, v in command.items() if k not in ("batchSize", "singleBatch", "allowDiskUse")}
+        yield command["find"], find
+        return
+    yield from _pipeline_queries(command["aggregate"], command.get("pipeline", []))
+
+
+def _pipeline_queries(collection: str, pipeline: list):
+    if pipeline and "$match" in pipeline[0]:
+        find = {"find": collection, "filter": pipeline[0]["$match"]}
+        if len(pipeline) > 1 and "$sort" in pipeline[1]:
+            find["sort"] = pipeline[1]["$sort"]
+        yield collection, find
+    for stage in pipeline:
+        if "$unionWith" in stage:
+            union = stage["$unionWith"]
+            yield from _pipeline_queries(union["coll"], union.get("pipeline", []))
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+async def _explain_all(database, commands):
+    results = []
+    for command in commands:
+        for collection, find in _queries(command):
+            explain = await database.command({"explain": find, "verbosity": "executionStats"})
+            results.append((collection, find, explain))
+    return results
+
+
+def _check_plans(explained):
+    assert explained, "no query was captured"
+    for collection, find, explain in explained:
+        stages = set(_stages(explain["queryPlanner"]["winningPlan"]))
+        assert "COLLSCAN" not in stages, f"COLLSCAN on {collection}: {find}"
+        stats = explain["executionStats"]
+        returned = stats["nReturned"]
+        budget = returned * EXAMINED_RATIO + EXAMINED_SLACK
+        assert stats["totalDocsExamined"] <= budget, (
+            f"{collection}: {stats['totalDocsExamined']} docs examined for {returned} returned: {find}"
+        )
+        assert stats["totalKeysExamined"] <= budget, (
+            f"{collection}: {stats['totalKeysExamined']} keys examined for {returned} returned: {find}"
+        )
+
+
+def _run_captured(loop, database, coro_factory):
+    recorder.commands = []
+    recorder.recording = True
+    try:
+        loop.run_until_complete(coro_factory())
+    finally:
+        recorder.recording = False
+    return loop.run_until_complete(_explain_all(database, recorder.commands))
+
+
+def test_pets_for_owner(loop, db):
+    from app.crud import crud_pet
+
+    explained = _run_captured(loop, db, lambda: crud_pet.get_pets_for_owner("owner3@example.com"))
+    _check_plans(explained)
+
+
+def test_pet_search(loop, db):
+    from app.crud import crud_pet
+
+    async def run():
+        pets, total, _ = await crud_pet.get_all_pets_with_count(limit=20, search="12")
+        assert total == PETS_PER_OWNER
+        pets, total = await crud_pet.get_pets_for_owner("owner3@example.com", search="pet 3-1")
+        assert [p.name for p in pets] == ["Pet 3-1"]
+
+    _check_plans(_run_captured(loop, db, run))
+
+
+def test_user_search(loop, db):
+    from app.crud import crud_user
+    from app.models.user import User
+
+    async def run():
+        users = await User.find(crud_user.search_users_filter("nguyen owner 7")).to_list()
+        assert [u.email for u in users] == ["owner7@example.com"]
+
+    _check_plans(_run_captured(loop, db, run))
+
+
+def test_events_for_owner(loop, db):
+    from app.crud import crud_scheduled_event
+
+    events, _ = loop.run_until_complete(crud_scheduled_event.get_events_for_owner("owner4@example.com"))
+    assert len(events) == PETS_PER_OWNER * EVENTS_PER_PET
+    assert {e.owner_email for e in events} == {"owner4@example.com"}
+    explained = _run_captured(loop, db, lambda: crud_scheduled_event.get_events_for_owner("owner4@example.com"))
+    _check_plans(explained)
+
+
+def test_upcoming_and_past_events(loop, db):
+    from app.crud import crud_scheduled_event
+
+    async def run():
+        await crud_scheduled_event.get_upcoming_events_with_count(limit=20)
+        await crud_scheduled_event.get_past_events_with_count(limit=20)
+
+    _check_plans(_run_captured(loop, db, run))
+
+
+def test_event_pages_by_cursor(loop, db):
+    from app.crud import crud_scheduled_event
+
+    _, _, cursor = loop.run_until_complete(crud_scheduled_event.get_past_events_with_count(limit=10))
+    assert cursor is not None
+    explained = _run_captured(loop, db, lambda: crud_scheduled_event.get_past_events_with_count(limit=10, cursor=cursor))
+    _check_plans(explained)
+
+
+def test_user_pages_by_cursor(loop, db):
+    from starlette.responses import Response
+    from app.api.endpoints.users import list_users
+
+    first = Response()
+    loop.run_until_complete(list_users(first, limit=5, current_user=None))
+    cursor = first.headers.get("X-Next-Cursor")
+    assert cursor is not None
+    explained = _run_captured(loop, db, lambda: list_users(Response(), limit=5, cursor=cursor, current_user=None))
+    _check_plans(explained)
+
+
+def test_health_records_for_pet(loop, db):
+    from app.crud import crud_health_record
+    from app.models.pet import Pet
+
+    pet = loop.run_until_complete(Pet.find_one({"owner_email": "owner5@example.com"}))
+    records, _ = loop.run_until_complete(crud_health_record.get_health_records_for_pet_owner(pet.id, "owner6@example.com"))
+    assert records == []
+    explained = _run_captured(loop, db, lambda: crud_health_record.get_health_records_for_pet_owner(pet.id, pet.owner_email))
+    _check_plans(explained)
+
+
+def test_ownership_checks(loop, db):
+    from app.crud import crud_pet
+    from app.models.pet import Pet
+
+    pets = loop.run_until_complete(Pet.find({"owner_email": "owner7@example.com"}).to_list())
+    other = loop.run_until_complete(Pet.find_one({"owner_email": "owner8@example.com"}))
+
+    async def run():
+        assert await crud_pet.owns_pet(pets[0].id, "owner7@example.com")
+        assert not await crud_pet.owns_pet(other.id, "owner7@example.com")
+        assert not await crud_pet.owns_pet("not-an-id", "owner7@example.com")
+        owned = await crud_pet.owns_pets([p.id for p in pets] + [other.id, "not-an-id"], "owner7@example.com")
+        assert owned == {str(p.id) for p in pets}
+        assert (await crud_pet.get_pet_by_id_for_owner(str(pets[0].id), "owner7@example.com")).id == pets[0].id
+        assert await crud_pet.get_pet_by_id_for_owner(str(other.id), "owner7@example.com") is None
+
+    _check_plans(_run_captured(loop, db, run))
+
+
+def test_token_revocation_refresh(loop, db):
+    from app.crud import crud_user
+    from app.models.user import User
+    from app.services.token_revocation import RevocationSet
+
+    users = loop.run_until_complete(User.find_all().limit(2).to_list())
+    for user in users:
+        crud_user.bump_token_version(user)
+        loop.run_until_complete(user.save())
+
+    revocations = RevocationSet()
+    _check_plans(_run_captured(loop, db, revocations.refresh))
+    assert revocations.stats()["users"] == len(users)
+
+
+def test_list_my_orders(loop, db):
+    from starlette.requests import Request
+
+    from app.api.endpoints.order import list_my_orders
+    from app.models.user import User
+
+    user = loop.run_until_complete(User.find_one({"email": "owner6@example.com"}))
+
+    class _Auth:
+        async def resolve(self):
+            return user
+
+    request = Request({"type": "http", "state": {"auth": _Auth()}})
+    _check_plans(_run_captured(loop, db, lambda: list_my_orders(request)))
+
+
+def test_revenue_report_pipelines(loop, db):
+    from app.crud.crud_report import build_revenue_pipeline, build_rollup_pipeline
+    from app.models.health_record import HealthRecord
+    from app.db.database import get_collection
+    from app.models.revenue_daily import RevenueDaily
+
+    end = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = end - timedelta(days=10)
+
+    async def run():
+        await get_collection(HealthRecord).aggregate(build_revenue_pipeline(start, end, "day")).to_list(length=None)
+        await get_collection(RevenueDaily).aggregate(build_rollup_pipeline(start, end, "day")).to_list(length=None)
+
+    _check_plans(_run_captured(loop, db, run))
+
+
+def test_revenue_export_streams(loop, db):
+    from app.crud.crud_export import export_revenue_lines
+
+    end = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = end - timedelta(days=10)
+
+    async def run():
+        dates = [row["date"] async for row in export_revenue_lines(start, end)]
+        assert dates == sorted(dates)
+
+    _check_plans(_run_captured(loop, db, run))
@@ -0,0 +1,148 @@
+"""Rollup writes inside a transaction.
+
+`run_in_transaction` starts its session on `app.db.database.client`; the
+rollup collection must come from that same client or MongoDB rejects the
+session. The session test is only meaningful on a replica set, so it is
+skipped unless the mongod on MONGODB_TEST_URL (default
+mongodb://localhost:27017) reports a setName; the order-cancel test only
+needs a reachable mongod.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("beanie")
+
+# app.core.config requires these; the values are irrelevant for the tests
+for _name, _value in {
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "petcare_rollup_transaction_test",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "MAIL_TO_ADMIN": "admin@example.com",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import motor.motor_asyncio
+from beanie import init_beanie
+
+MONGODB_TEST_URL = os.environ.get("MONGODB_TEST_URL", "mongodb://localhost:27017")
+TEST_DB = "petcare_rollup_transaction_test"
+
+
+class _Abort(Exception):
+    pass
+
+
+def test_apply_deltas_joins_the_transaction_session():
+    from app.crud import crud_revenue_rollup
+    from app.db import database
+    from app.models.revenue_daily import RevenueDaily
+
+    async def run():
+        client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=500)
+        try:
+            hello = await client.admin.command("hello")
+        except Exception:
+            pytest.skip(f"no mongod reachable at {MONGODB_TEST_URL}")
+        if not hello.get("setName"):
+            pytest.skip("transactions need a replica set")
+
+        saved_client, saved_flag = database.client, database._supports_transactions
+        database.client, database._supports_transactions = client, None
+        try:
+            await client.drop_database(TEST_DB)
+            await init_beanie(database=client[TEST_DB], document_models=[RevenueDaily])
+            # created up front: collection creation inside a transaction needs MongoDB 4.4+
+            await client[TEST_DB].create_collection(RevenueDaily.Settings.name)
+
+            day = datetime(2024, 1, 2)
+            deltas = crud_revenue_rollup.RollupDeltas()
+            deltas.add((day, "", ""), revenue=100.0, orders=1)
+
+            async def commit(session):
+                assert session is not None
+                await crud_revenue_rollup.apply_deltas(deltas, session=session)
+
+            await database.run_in_transaction(commit)
+
+            async def rollback(session):
+                await crud_revenue_rollup.apply_deltas(deltas, session=session)
+                raise _Abort()
+
+            with pytest.raises(_Abort):
+                await database.run_in_transaction(rollback)
+
+            rows = await RevenueDaily.find({"day": day}).to_list()
+            assert [(row.revenue, row.orders) for row in rows] == [(100.0, 1)]
+        finally:
+            await client.drop_database(TEST_DB)
+            database.client, database._supports_transactions = saved_client, saved_flag
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_concurrent_cancels_apply_once():
+    from app.crud import crud_order, crud_revenue_rollup
+    from app.db import database
+    from app.models.order import Order, OrderItem, ShippingInfo
+    from app.models.product import Product
+    from app.models.revenue_daily import RevenueDaily
+
+    async def run():
+        client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_TEST_URL, serverSelectionTimeoutMS=500)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            pytest.skip(f"no mongod reachable at {MONGODB_TEST_URL}")
+
+        saved_client, saved_flag = database.client, database._supports_transactions
+        database.client, database._supports_transactions = client, None
+        try:
+            await client.drop_database(TEST_DB)
+            await init_beanie(database=client[TEST_DB], document_models=[Order, Product, RevenueDaily])
+            product = Product(name="Food", price=10.0, stock_quantity=5)
+            await product.insert()
+            order = Order(
+                user_email="owner@example.com",
+                items=[OrderItem(product_id=str(product.id), name="Food", unit_price=10.0, quantity=2, subtotal=20.0)],
+                shipping=ShippingInfo(name="Owner", address="Somewhere"),
+                total=20.0,
+            )
+            await order.insert()
+            await crud_revenue_rollup.apply_deltas(crud_revenue_rollup.order_deltas(order))
+
+            results = await asyncio.gather(
+                crud_order.cancel_order(order.id),
+                crud_order.cancel_order(order.id, from_status="pending"),
+                crud_order.set_order_status(order.id, "cancelled"),
+            )
+            assert sum(r is not None and r is not False for r in results) == 1
+
+            assert (await Product.get(product.id)).stock_quantity in (5, 7)
+            total = await RevenueDaily.find_one({"product_id": "", "service": ""})
+            assert (total.revenue, total.orders) == (0.0, 0)
+
+            # reopening moves it back into the rollup exactly once
+            assert await crud_order.set_order_status(order.id, "pending")
+            assert not await crud_order.set_order_status(order.id, "pending")
+            total = await RevenueDaily.find_one({"product_id": "", "service": ""})
+            assert (total.revenue, total.orders) == (20.0, 1)
+        finally:
+            await client.drop_database(TEST_DB)
+            database.client, database._supports_transactions = saved_client, saved_flag
+            client.close()
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+from app.core.search_keys import MAX_PREFIX_LENGTH, build_keys, search_filter
+
+
+def test_build_keys_indexes_every_word_prefix_per_namespace():
+    keys = build_keys({"o": "Tran  Binh", "s": "Dog", "b": None})
+    assert keys == sorted([
+        "o:t", "o:tr", "o:tra", "o:tran",
+        "o:b", "o:bi", "o:bin", "o:binh",
+        "s:d", "s:do", "s:dog",
+    ])
+
+
+def test_keys_and_searches_ignore_vietnamese_diacritics():
+    keys = build_keys({"n": "Nguyễn Đức"})
+    assert "n:nguyen" in keys and "n:duc" in keys
+    assert search_filter("nguyen", ["n"]) == search_filter("NGUYỄN", ["n"]) == {"search_keys": "n:nguyen"}
+
+
+def test_long_words_are_capped():
+    word = "x" * (MAX_PREFIX_LENGTH + 5)
+    keys = build_keys({"n": word})
+    assert len(keys) == MAX_PREFIX_LENGTH
+    assert search_filter(word, ["n"]) == {"search_keys": "n:" + "x" * MAX_PREFIX_LENGTH}
+
+
+def test_search_filter_requires_every_word():
+    assert search_filter("  ", ["o", "s"]) == {}
+    assert search_filter("Dog", ["o", "s"]) == {"search_keys": {"$in": ["o:dog", "s:dog"]}}
+    assert search_filter("tran BI tran", ["o"]) == {"$and": [
+        {"search_keys": "o:tran"},
+        {"search_keys": "o:bi"},
+    ]}
@@ -0,0 +1,41 @@
+import asyncio
+
+from app.core.singleflight import single_flight
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    runs = []
+
+    @single_flight()
+    async def compute(start=None, group_by="day"):
+        runs.append((start, group_by))
+        await asyncio.sleep(0.01)
+        return {"start": start, "group_by": group_by}
+
+    async def run():
+        return await asyncio.gather(
+            compute(1), compute(start=1), compute(1, "day"), compute(2),
+        )
+
+    results = asyncio.run(run())
+    assert sorted(runs) == [(1, "day"), (2, "day")]
+    assert results[0] is results[1] is results[2]
+    assert compute.single_flight.stats()["shared"] == 2
+    assert compute.single_flight.stats()["in_flight"] == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    calls = []
+
+    @single_flight()
+    async def boom():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError("nope")
+
+    async def run():
+        return await asyncio.gather(boom(), boom(), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(run()))
+    asyncio.run(run())
+    assert len(calls) == 2
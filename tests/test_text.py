@@ -0,0 +1,12 @@
+from app.core.text import fold
+
+
+def test_fold_vietnamese():
+    assert fold("Nguyễn Thị Đào") == "nguyen thi dao"
+    assert fold("TRẦN Quốc Bảo") == "tran quoc bao"
+    assert fold("Nguyen") == fold("nguyễn")
+
+
+def test_fold_keeps_plain_text():
+    assert fold(None) == ""
+    assert fold("owner3@example.com") == "owner3@example.com"
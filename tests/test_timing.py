@@ -0,0 +1,36 @@
+import asyncio
+
+from app.core import timing
+
+
+def test_timed_records_stages_into_current_request():
+    async def run():
+        timings = timing.start_request()
+
+        @timing.timed("work")
+        async def work():
+            await asyncio.sleep(0)
+
+        await work()
+        await work()
+        with timing.timed("sync step"):
+            pass
+        return timings
+
+    timings = asyncio.run(run())
+    assert timings.stages["work"][1] == 2
+    header = timings.header_value(total_ms=1.0)
+    # stage names are sanitized to header tokens
+    assert header.startswith("work;dur=")
+    assert "sync_step;dur=" in header
+    assert header.endswith("total;dur=1.0")
+
+
+def test_timed_without_request_is_noop():
+    async def run():
+        timing.detach()
+        with timing.timed("outside"):
+            pass
+        return timing.current_timings()
+
+    assert asyncio.run(run()) is None